@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the offline analysis of per-station trial results journals:
+a cold run
+in a single process, a cold run in a pool of processes and a re-run in
+which only one of the files changed.
+"""
+
+from bench_utils import setup_headless
+
+setup_headless()
+
+import csv
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from cohort_stats import RESULTS_FILE, span_statistics
+from results_writer import SCHEMA
+from station_analysis import analyze
+
+
+def write_stations(directory, stations, rows, rng):
+    """
+    Write trial results journals in the format of the results writer.
+    :return: list of paths of the journal files
+    """
+
+    paths = []
+    for station in range(stations):
+        station_dir = os.path.join(directory, 'station{}'.format(station))
+        os.makedirs(station_dir)
+        path = os.path.join(station_dir, RESULTS_FILE)
+        with open(path, 'w', newline='') as journal:
+            writer = csv.writer(journal)
+            writer.writerow(SCHEMA['trials'])
+            for participant_id in range(rows):
+                spans = [rng.randint(2, 9) for _ in range(3)]
+                for trial in range(1, len(spans) + 1):
+                    writer.writerow([participant_id, trial, spans[trial - 1],
+                                     *span_statistics(spans[:trial]),
+                                     1792000000.0 + participant_id])
+        paths.append(path)
+
+    return paths
+
+
+def timed(function):
+    start = perf_counter()
+    function()
+    return (perf_counter() - start) * 1000.0
+
+
+def run(stations=8, rows=5000, workers=None, seed=0):
+    """
+    Time the analysis of a set of result files.
+    :param stations: int | number of journal files
+    :param rows: int | number of participants per file
+    :param workers: int | number of processes of the pool, None for one per
+    CPU
+    :param seed: int | seed of the results
+    :return: dict with durations in ms
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = write_stations(directory, stations, rows,
+                               random.Random(seed))
+        cache = os.path.join(directory, 'cache.pickle')
+
+        serial_ms = timed(lambda: analyze([directory], 1, None))
+        pool_ms = timed(lambda: analyze([directory], workers, cache))
+
+        # Change a single file, all others come from the cache
+        with open(paths[0], 'a') as journal:
+            journal.write('{},1,4,4.0,0.0,1792000000.0\n'.format(rows))
+        rerun_ms = timed(lambda: analyze([directory], workers, cache))
+
+    return {'serial_ms': serial_ms, 'pool_ms': pool_ms,
+            'rerun_one_changed_ms': rerun_ms}
+
+
+if __name__ == '__main__':
+    for case, duration in run().items():
+        print('{}: {:.1f} ms'.format(case, duration))
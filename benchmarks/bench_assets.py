@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for blitting the instruction image as loaded from disk and as
+prepared by the asset manager.
+"""
+
+from bench_utils import setup_headless, time_call
+
+setup_headless()
+
+import os
+
+import pygame
+
+import Final_Corsi_OOP as corsi
+from assets import AssetManager
+
+
+def run(repeat=500):
+    """
+    Time blitting of the raw and the prepared instruction image.
+    :param repeat: int | number of blits per case
+    :return: dict with mean blit durations in ms
+    """
+
+    pygame.display.init()
+    screen = pygame.display.set_mode(corsi.SCREEN_SIZE)
+
+    raw = pygame.image.load(os.path.join(corsi.ASSET_DIR,
+                                         corsi.INSTRUCTION_IMAGE))
+    prepared = AssetManager(corsi.ASSET_DIR).image(corsi.INSTRUCTION_IMAGE,
+                                                   corsi.SCREEN_SIZE)
+
+    raw_ms = time_call(lambda: screen.blit(raw, (0, 0)), repeat)
+    prepared_ms = time_call(lambda: screen.blit(prepared, (0, 0)), repeat)
+
+    return {'raw_ms': sum(raw_ms) / repeat,
+            'prepared_ms': sum(prepared_ms) / repeat}
+
+
+if __name__ == '__main__':
+    for case, duration in run().items():
+        print('{}: {:.4f}'.format(case, duration))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for scanning the corsi spans of a large number of participants:
+parsing the CSV journal of the trials against mapping the binary trials file,
+which holds the same records, and reducing its columns with NumPy. Also
+reports the size of corsi.csv, from which the binary file is converted.
+"""
+
+from bench_utils import setup_headless
+
+setup_headless()
+
+import csv
+import os
+import random
+import tempfile
+from time import perf_counter
+
+from binary_reader import csv_to_binary, span_summary
+from cohort_stats import span_statistics
+from results_binary import binary_path
+from results_writer import SCHEMA
+from station_analysis import parse_file
+
+
+def timed(function, repeat):
+    """
+    Best time of repeated calls of a function in ms.
+    """
+
+    durations = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        durations.append((perf_counter() - start) * 1000.0)
+
+    return min(durations)
+
+
+def run(participants=20000, repeat=3, seed=0):
+    """
+    Time a scan over all corsi spans in both formats.
+    :param participants: int | number of participants
+    :param repeat: int | number of scans, the fastest one is reported
+    :param seed: int | seed of the results
+    :return: dict with scan durations in ms and file sizes in bytes
+    """
+
+    rng = random.Random(seed)
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, 'corsi.csv')
+        journal_path = os.path.join(directory, 'corsi_trials.csv')
+        with open(csv_path, 'w', newline='') as results_file, \
+                open(journal_path, 'w', newline='') as journal:
+            writer = csv.writer(results_file)
+            journal_writer = csv.writer(journal)
+            journal_writer.writerow(SCHEMA['trials'])
+            for participant_id in range(participants):
+                spans = [rng.randint(2, 9) for _ in range(3)]
+                writer.writerow([participant_id, spans,
+                                 *span_statistics(spans)])
+                for trial in range(1, len(spans) + 1):
+                    journal_writer.writerow(
+                        [participant_id, trial, spans[trial - 1],
+                         *span_statistics(spans[:trial]),
+                         1792000000.0 + participant_id])
+        csv_to_binary(csv_path, directory)
+
+        # Both scans have to see the same spans
+        assert span_summary(directory)['overall']['histogram'] == \
+            dict(parse_file(journal_path).overall.histogram)
+
+        return {'csv_scan_ms': timed(lambda: parse_file(journal_path),
+                                     repeat),
+                'binary_scan_ms': timed(lambda: span_summary(directory),
+                                        repeat),
+                'csv_bytes': os.path.getsize(csv_path),
+                'journal_bytes': os.path.getsize(journal_path),
+                'binary_bytes': os.path.getsize(
+                    binary_path(directory, 'trials'))}
+
+
+if __name__ == '__main__':
+    result = run()
+    print('CSV journal: {:.1f} ms ({} bytes), binary: {:.1f} ms ({} '
+          'bytes), corsi.csv: {} bytes'.format(
+              result['csv_scan_ms'], result['journal_bytes'],
+              result['binary_scan_ms'], result['binary_bytes'],
+              result['csv_bytes']))
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the memory footprint of a box layout and for clearing the
+clicked flag of all boxes, with one Python object per box and with the
+struct-of-arrays board, for boards with an increasing number of boxes.
+"""
+
+from bench_utils import setup_headless, time_call
+
+setup_headless()
+
+import random
+import tracemalloc
+
+import pygame
+
+from board import CLICKED, Board
+
+BOX_SIZE = 20
+
+
+class ObjectBox:
+    """
+    Box stored as a Python object with one attribute per property, as
+    before the board was introduced.
+    """
+
+    def __init__(self, pos, size):
+        self.rend = None
+        self.pos = pos
+        self.size = size
+        self.rect = pygame.Rect(0, 0, size, size)
+        self.rect.center = pos
+        self.highlight = False
+        self.clicked = False
+        self.correct = False
+
+
+def measure(function, repeat):
+    """
+    Measure the memory allocated by a function that creates a layout.
+    :param function: callable without arguments returning the layout
+    :param repeat: int | number of layouts kept alive during the measurement
+    :return: float | allocated bytes per layout
+    """
+
+    tracemalloc.start()
+    try:
+        start = tracemalloc.get_traced_memory()[0]
+        layouts = [function() for _ in range(repeat)]
+        allocated = tracemalloc.get_traced_memory()[0] - start
+    finally:
+        tracemalloc.stop()
+
+    del layouts
+    return allocated / repeat
+
+
+def run(box_counts=(9, 100, 1000), repeat=200, seed=0):
+    """
+    Measure memory and flag resets of boards with random box centers.
+    :param box_counts: list of numbers of boxes
+    :param repeat: int | number of layouts and flag resets per board
+    :param seed: int | seed of the box centers
+    :return: dict with bytes per layout and mean time per reset in ms by
+    number of boxes
+    """
+
+    rng = random.Random(seed)
+    results = {}
+
+    for n_boxes in box_counts:
+        positions = [(rng.randrange(1000), rng.randrange(1000))
+                     for _ in range(n_boxes)]
+
+        objects = [ObjectBox(pos, BOX_SIZE) for pos in positions]
+        board = Board(positions, BOX_SIZE)
+
+        def clear_objects():
+            for box in objects:
+                box.clicked = False
+
+        object_reset = time_call(clear_objects, repeat)
+        board_reset = time_call(lambda: board.clear_flag(CLICKED), repeat)
+
+        results[n_boxes] = {
+            'object_bytes': measure(
+                lambda: [ObjectBox(pos, BOX_SIZE) for pos in positions],
+                max(repeat // n_boxes, 10)),
+            'board_bytes': measure(lambda: Board(positions, BOX_SIZE),
+                                   max(repeat // n_boxes, 10)),
+            'object_reset_ms': sum(object_reset) / repeat,
+            'board_reset_ms': sum(board_reset) / repeat,
+        }
+
+    return results
+
+
+if __name__ == '__main__':
+    for n_boxes, result in run().items():
+        print('{} boxes: objects {:.0f} B, board {:.0f} B per layout; '
+              'reset objects {:.5f} ms, board {:.5f} ms'.format(
+                  n_boxes, result['object_bytes'], result['board_bytes'],
+                  result['object_reset_ms'], result['board_reset_ms']))
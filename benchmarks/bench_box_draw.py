@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for drawing the boxes of a sequence. Counts the number of PyGame
+surfaces allocated per frame in the states ShowSequence and UserInput.
+"""
+
+from bench_utils import setup_headless, time_call
+
+setup_headless()
+
+import pygame
+
+import Final_Corsi_OOP as corsi
+
+
+class CountingSurface(pygame.Surface):
+    """
+    PyGame surface that counts its instantiations.
+    """
+
+    allocations = 0
+
+    def __init__(self, *args, **kwargs):
+        CountingSurface.allocations += 1
+        super().__init__(*args, **kwargs)
+
+
+def run(frames=1000):
+    """
+    Draw the boxes of a sequence for a number of frames in both states that
+    display boxes.
+    :param frames: int | number of frames per state
+    :return: dict with allocations and mean frame time per state
+    """
+
+    pygame.display.init()
+    screen = pygame.display.set_mode(corsi.SCREEN_SIZE)
+
+    # Clock that is moved past the presentation for state UserInput
+    now = [0.0]
+    sequence = corsi.Sequence(corsi.SCREEN_SIZE, corsi.BOX_PARAMS,
+                              lambda: now[0])
+    sequence.generate(corsi.N_BOXES)
+
+    # Replace surface class to count allocations during drawing
+    original_surface = pygame.Surface
+    pygame.Surface = CountingSurface
+
+    results = {}
+    try:
+        for state in (corsi.State.SHOW_SEQUENCE, corsi.State.USER_INPUT):
+            # Highlight first box in ShowSequence, no highlighting otherwise
+            if state is corsi.State.USER_INPUT:
+                for _ in range(corsi.N_BOXES + 1):
+                    now[0] += corsi.HIGHLIGHT_TIME
+                    sequence.show(0, 0, screen)
+
+            # Warm up the surface cache
+            assert sequence.show(0, 0, screen) == state
+
+            CountingSurface.allocations = 0
+            durations = time_call(lambda: sequence.show(0, 0, screen), frames)
+            results[state.value] = {
+                'allocations_per_frame': CountingSurface.allocations / frames,
+                'mean_frame_ms': sum(durations) / frames,
+            }
+    finally:
+        pygame.Surface = original_surface
+
+    return results
+
+
+if __name__ == '__main__':
+    for state, result in run().items():
+        print('{}: {:.2f} allocations/frame, {:.4f} ms/frame'.format(
+            state, result['allocations_per_frame'], result['mean_frame_ms']))
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for Application.draw_text with cached and uncached text and for
+one frame of the participant ID text input.
+"""
+
+from bench_utils import setup_headless, time_call
+
+setup_headless()
+
+import Final_Corsi_OOP as corsi
+
+
+def run(repeat=2000):
+    """
+    Time drawing of a fixed message and of text that has to be rendered.
+    :param repeat: int | number of calls per case
+    :return: dict with mean call durations in ms
+    """
+
+    app = corsi.Application(corsi.SCREEN_SIZE, corsi.BOX_PARAMS,
+                            corsi.START_DELAY, corsi.MAX_PARTICIPANTS,
+                            corsi.MAX_TRIALS, vsync=False, results_dir=None)
+
+    def draw_cached():
+        app.draw_text("Press space bar to continue", app.font_small,
+                      app.BLACK, app.BACKGROUND_COLOR, 100)
+
+    def draw_uncached():
+        app.text_cache.clear()
+        draw_cached()
+
+    def text_input_frame():
+        app.update_text_input()
+        app.text_input.get_surface()
+
+    for digit in '12':
+        app.text_input.process_key(ord(digit), digit)
+
+    cached = time_call(draw_cached, repeat)
+    uncached = time_call(draw_uncached, repeat)
+    text_input = time_call(text_input_frame, repeat)
+
+    return {'cached_ms': sum(cached) / repeat,
+            'uncached_ms': sum(uncached) / repeat,
+            'text_input_ms': sum(text_input) / repeat}
+
+
+if __name__ == '__main__':
+    for case, duration in run().items():
+        print('{}: {:.4f}'.format(case, duration))
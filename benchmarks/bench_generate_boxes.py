@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the box layout generation. Scales the screen with the number
+of boxes so that the box density stays the same as in the default
+configuration, and compares against the former rejection sampling loop.
+"""
+
+from bench_utils import setup_headless, time_call
+
+setup_headless()
+
+import random
+from math import sqrt
+
+import Final_Corsi_OOP as corsi
+from box_layout import generate_layout
+
+BOX_COUNTS = (9, 25, 50, 100, 250, 500)
+
+# Grid of box parameters timed at the default screen size
+GRID_N_BOXES = (5, 9, 12)
+GRID_MIN_DIST = (1.5 * corsi.BOX_SIZE, 2.0 * corsi.BOX_SIZE,
+                 2.5 * corsi.BOX_SIZE)
+
+
+def rejection_layout(screen_size, n_boxes, min_dist, margin, max_tries):
+    """
+    Former layout generation: sample random points until enough of them
+    don't collide with any accepted point.
+    :return: list of box centers or None if max_tries was exceeded
+    """
+
+    positions = []
+    for _ in range(max_tries):
+        x = random.randint(int(margin), int(screen_size[0] - margin))
+        y = random.randint(int(margin), int(screen_size[1] - margin))
+        if not any(sqrt((x - u) ** 2 + (y - v) ** 2) < min_dist
+                   for u, v in positions):
+            positions.append((x, y))
+            if len(positions) == n_boxes:
+                return positions
+    return None
+
+
+def scaled_screen(n_boxes):
+    """
+    Screen size with the same free area per box as the default settings.
+    """
+
+    scale = sqrt(n_boxes / corsi.N_BOXES)
+    margin = corsi.MARGIN
+    return (int((corsi.SCREEN_SIZE[0] - 2 * margin) * scale + 2 * margin),
+            int((corsi.SCREEN_SIZE[1] - 2 * margin) * scale + 2 * margin))
+
+
+def run(box_counts=BOX_COUNTS, repeat=20, max_tries=100000):
+    """
+    Time layout generation for different numbers of boxes.
+    :param box_counts: iterable of int | numbers of boxes
+    :param repeat: int | number of layouts per box count
+    :param max_tries: int | sample limit of the rejection loop
+    :return: dict with mean generation times in ms per box count
+    """
+
+    results = {}
+    for n_boxes in box_counts:
+        screen_size = scaled_screen(n_boxes)
+        args = (screen_size, n_boxes, corsi.MIN_DIST, corsi.MARGIN)
+
+        layout = time_call(lambda: generate_layout(*args), repeat)
+        rejection = time_call(lambda: rejection_layout(*args, max_tries),
+                              repeat)
+
+        results[n_boxes] = {'screen_size': screen_size,
+                            'layout_ms': sum(layout) / repeat,
+                            'rejection_ms': sum(rejection) / repeat}
+
+    return results
+
+
+def run_grid(n_boxes_grid=GRID_N_BOXES, min_dist_grid=GRID_MIN_DIST,
+             repeat=20):
+    """
+    Time Sequence.generate_boxes for a grid of box parameters.
+    :param n_boxes_grid: iterable of int | numbers of boxes
+    :param min_dist_grid: iterable of float | minimum distances of boxes
+    :param repeat: int | number of layouts per parameter combination
+    :return: dict with mean generation times in ms per (n_boxes, min_dist),
+    infeasible combinations are left out
+    """
+
+    results = {}
+    for n_boxes in n_boxes_grid:
+        for min_dist in min_dist_grid:
+            box_parameters = dict(corsi.BOX_PARAMS, n_boxes=n_boxes,
+                                  min_dist=min_dist)
+            try:
+                sequence = corsi.Sequence(corsi.SCREEN_SIZE, box_parameters)
+                durations = time_call(sequence.generate_boxes, repeat)
+            except ValueError:
+                continue
+            results[(n_boxes, min_dist)] = sum(durations) / repeat
+
+    return results
+
+
+if __name__ == '__main__':
+    print('{:>6} {:>12} {:>14} {:>14}'.format('boxes', 'screen', 'layout ms',
+                                              'rejection ms'))
+    for n_boxes, result in run().items():
+        print('{:>6} {:>12} {:>14.3f} {:>14.3f}'.format(
+            n_boxes, '{}x{}'.format(*result['screen_size']),
+            result['layout_ms'], result['rejection_ms']))
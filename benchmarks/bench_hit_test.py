@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for finding the clicked box with a linear scan over all boxes and
+with the spatial index, for boards with an increasing number of boxes.
+"""
+
+from bench_utils import setup_headless, time_call
+
+setup_headless()
+
+import random
+from math import ceil, sqrt
+
+import pygame
+
+from box_index import BoxIndex
+from box_layout import generate_layout
+
+BOX_SIZE = 20
+MIN_DIST = 40
+
+
+def make_board(n_boxes, rng):
+    """
+    Generate a board that fits the given number of boxes.
+    :return: list of PyGame rect objects of the boxes and board size
+    """
+
+    side = int(ceil(sqrt(n_boxes))) * 2 * MIN_DIST + 2 * MIN_DIST
+    positions = generate_layout((side, side), n_boxes, MIN_DIST, MIN_DIST,
+                                rng)
+
+    rects = []
+    for pos in positions:
+        rect = pygame.Rect(0, 0, BOX_SIZE, BOX_SIZE)
+        rect.center = pos
+        rects.append(rect)
+
+    return rects, side
+
+
+def linear_find(rects, pos):
+    """
+    Find the box at a position by testing all boxes.
+    """
+
+    for i, rect in enumerate(rects):
+        if rect.collidepoint(pos):
+            return i
+    return -1
+
+
+def run(box_counts=(9, 100, 400, 1000), clicks=2000, seed=0):
+    """
+    Time hit-testing of random clicks, half of them on boxes.
+    :param box_counts: list of numbers of boxes
+    :param clicks: int | number of clicks per board
+    :param seed: int | seed of boards and clicks
+    :return: dict with mean time per click in ms by number of boxes
+    """
+
+    rng = random.Random(seed)
+    results = {}
+
+    for n_boxes in box_counts:
+        rects, side = make_board(n_boxes, rng)
+        index = BoxIndex(rects, BOX_SIZE)
+
+        points = [rng.choice(rects).center if i % 2 else
+                  (rng.randrange(side), rng.randrange(side))
+                  for i in range(clicks)]
+        assert all(index.find(p) == linear_find(rects, p) for p in points)
+
+        points = iter(points * 2)
+        linear = time_call(lambda: linear_find(rects, next(points)), clicks)
+        indexed = time_call(lambda: index.find(next(points)), clicks)
+
+        results[n_boxes] = {'linear_ms': sum(linear) / clicks,
+                            'index_ms': sum(indexed) / clicks}
+
+    return results
+
+
+if __name__ == '__main__':
+    for n_boxes, result in run().items():
+        print('{} boxes: linear {:.5f} ms, index {:.5f} ms'.format(
+            n_boxes, result['linear_ms'], result['index_ms']))
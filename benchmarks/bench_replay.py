@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for replaying recorded sessions. Replays either given recording
+files, e.g. of real sessions, or sessions recorded from the simulation with
+fixed seeds, so that every run processes exactly the same inputs.
+"""
+
+from bench_utils import setup_headless
+
+setup_headless()
+
+import random
+import sys
+from time import perf_counter
+
+import simulation
+from session_record import load_recording, replay
+
+
+def record_sessions(sessions):
+    """
+    Record simulated sessions with fixed seeds.
+    :param sessions: int | number of sessions
+    :return: list of SessionRecorder objects
+    """
+
+    sim = simulation.Simulation()
+    recordings = []
+    for seed in range(sessions):
+        rng = random.Random(seed)
+        sim.run_session(rng.randint(1, 20), simulation.SimulatedParticipant(rng),
+                        seed)
+        recordings.append(sim.app.session.recorder)
+
+    return recordings
+
+
+def run(sessions=50, paths=()):
+    """
+    Replay recorded sessions and check that they reproduce the recording.
+    :param sessions: int | number of simulated sessions if no paths given
+    :param paths: list of recording files
+    :return: dict with replayed sessions and inputs per second
+    """
+
+    if paths:
+        recordings = [load_recording(path) for path in paths]
+    else:
+        recordings = record_sessions(sessions)
+
+    start = perf_counter()
+    for recording in recordings:
+        replayed = replay(recording)
+        digest = getattr(recording, 'recorded_digest',
+                         recording.digest.hexdigest())
+        assert replayed.recorder.digest.hexdigest() == digest
+    duration = perf_counter() - start
+
+    return {'sessions_per_s': len(recordings) / duration,
+            'inputs_per_s': sum(len(recording) for recording in recordings)
+            / duration}
+
+
+if __name__ == '__main__':
+    for metric, value in run(paths=sys.argv[1:]).items():
+        print('{}: {:.1f}'.format(metric, value))
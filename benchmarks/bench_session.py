@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark for the throughput of full simulated sessions.
+"""
+
+from bench_utils import setup_headless
+
+setup_headless()
+
+from time import perf_counter
+
+import simulation
+
+
+def run(sessions=200, render=False):
+    """
+    Run simulated sessions in the current process.
+    :param sessions: int | number of sessions
+    :param render: bool | draw into a full-size screen
+    :return: dict with sessions and frames per second
+    """
+
+    # Create the application before timing
+    simulation.run_sessions(1, render=render)
+
+    start = perf_counter()
+    results = simulation.run_sessions(sessions, render=render)
+    duration = perf_counter() - start
+
+    return {'sessions_per_s': sessions / duration,
+            'frames_per_s': sum(result['frames'] for result in results)
+            / duration}
+
+
+if __name__ == '__main__':
+    for metric, value in run().items():
+        print('{}: {:.1f}'.format(metric, value))
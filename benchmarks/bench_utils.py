@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+"""
+Shared helpers for the benchmark scripts. Sets up a headless PyGame
+environment and makes the application modules in src/ importable.
+"""
+
+import os
+import sys
+from time import perf_counter
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src')
+
+
+def setup_headless():
+    """
+    Use the SDL dummy drivers and add the application sources to the path.
+    Has to be called before PyGame is imported.
+    """
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+    os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+    if SRC_DIR not in sys.path:
+        sys.path.insert(0, SRC_DIR)
+
+
+def time_call(function, repeat):
+    """
+    Time repeated calls of a function.
+    :param function: callable without arguments
+    :param repeat: int | number of calls
+    :return: list of call durations in ms
+    """
+
+    durations = []
+    for _ in range(repeat):
+        start = perf_counter()
+        function()
+        durations.append((perf_counter() - start) * 1000.0)
+
+    return durations
@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+"""
+Run all benchmarks and report the results as JSON. Optionally compares the
+results with a stored baseline and fails if a metric got worse by more than
+the tolerance.
+
+Usage:
+    python run_benchmarks.py --output baseline.json
+    python run_benchmarks.py --baseline baseline.json --tolerance 0.2
+"""
+
+from bench_utils import setup_headless
+
+setup_headless()
+
+import argparse
+import json
+import platform
+import sys
+
+import pygame
+
+import bench_analysis
+import bench_assets
+import bench_binary
+import bench_board
+import bench_box_draw
+import bench_draw_text
+import bench_generate_boxes
+import bench_hit_test
+import bench_replay
+import bench_session
+
+# Metrics with these suffixes get better when they grow, all others when they
+# shrink
+HIGHER_IS_BETTER = ('_per_s',)
+
+
+def run_all(quick=False):
+    """
+    Run all benchmarks.
+    :param quick: bool | use fewer repetitions
+    :return: dict of metric name and value
+    """
+
+    scale = 0.1 if quick else 1.0
+    metrics = {}
+
+    for (n_boxes, min_dist), duration in bench_generate_boxes.run_grid(
+            repeat=max(int(20 * scale), 1)).items():
+        metrics['generate_boxes/n{}_d{:g}_ms'.format(n_boxes, min_dist)] = \
+            duration
+
+    for n_boxes, result in bench_generate_boxes.run(
+            repeat=max(int(20 * scale), 1)).items():
+        metrics['generate_layout/n{}_ms'.format(n_boxes)] = \
+            result['layout_ms']
+
+    for state, result in bench_box_draw.run(
+            frames=max(int(1000 * scale), 1)).items():
+        metrics['show/{}_ms'.format(state)] = result['mean_frame_ms']
+        metrics['show/{}_allocations'.format(state)] = \
+            result['allocations_per_frame']
+
+    for n_boxes, result in bench_hit_test.run(
+            clicks=max(int(2000 * scale), 1)).items():
+        for case, duration in result.items():
+            metrics['hit_test/n{}_{}'.format(n_boxes, case)] = duration
+
+    for n_boxes, result in bench_board.run(
+            repeat=max(int(200 * scale), 10)).items():
+        for case, value in result.items():
+            metrics['board/n{}_{}'.format(n_boxes, case)] = value
+
+    for case, duration in bench_draw_text.run(
+            repeat=max(int(2000 * scale), 1)).items():
+        metrics['draw_text/{}'.format(case)] = duration
+
+    for case, duration in bench_assets.run(
+            repeat=max(int(500 * scale), 1)).items():
+        metrics['blit_instructions/{}'.format(case)] = duration
+
+    for metric, value in bench_session.run(
+            sessions=max(int(200 * scale), 1)).items():
+        metrics['session/{}'.format(metric)] = value
+
+    for case, duration in bench_analysis.run(
+            rows=max(int(5000 * scale), 10)).items():
+        metrics['analysis/{}'.format(case)] = duration
+
+    for metric, value in bench_binary.run(
+            participants=max(int(20000 * scale), 10)).items():
+        metrics['binary/{}'.format(metric)] = value
+
+    for metric, value in bench_replay.run(
+            sessions=max(int(50 * scale), 1)).items():
+        metrics['replay/{}'.format(metric)] = value
+
+    return metrics
+
+
+def compare(metrics, baseline, tolerance):
+    """
+    Compare metrics with a baseline.
+    :param metrics: dict of metric name and value
+    :param baseline: dict of metric name and baseline value
+    :param tolerance: float | allowed relative deterioration
+    :return: list of (metric, baseline value, value, relative change) of all
+    regressed metrics
+    """
+
+    regressions = []
+    for name, value in sorted(metrics.items()):
+        reference = baseline.get(name)
+        if not reference:
+            continue
+
+        change = (value - reference) / reference
+        if name.endswith(HIGHER_IS_BETTER):
+            change = -change
+
+        if change > tolerance:
+            regressions.append((name, reference, value, change))
+
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run all benchmarks.')
+    parser.add_argument('--quick', action='store_true',
+                        help='use fewer repetitions')
+    parser.add_argument('--output', default=None,
+                        help='write results to this JSON file')
+    parser.add_argument('--baseline', default=None,
+                        help='compare with results stored in this JSON file')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative deterioration of a metric')
+    args = parser.parse_args()
+
+    results = {
+        'environment': {'python': platform.python_version(),
+                        'pygame': pygame.version.ver,
+                        'platform': platform.platform()},
+        'metrics': run_all(args.quick),
+    }
+
+    report = json.dumps(results, indent=2, sort_keys=True)
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(report + '\n')
+    else:
+        print(report)
+
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline_metrics = json.load(baseline_file)['metrics']
+
+        regressed = compare(results['metrics'], baseline_metrics,
+                            args.tolerance)
+        for name, reference, value, change in regressed:
+            print('REGRESSION {}: {:.4g} -> {:.4g} ({:+.0%})'.format(
+                name, reference, value, change), file=sys.stderr)
+
+        if regressed:
+            sys.exit(1)
+        print('No regressions against {}'.format(args.baseline),
+              file=sys.stderr)
@@ -5,14 +5,35 @@ Created on Sun Mar 22 11:08:34 2020
 @author: ilste
 """
 
+import os
+import random
 import pygame
 import sys
 from pygame.locals import *
 import pygame_textinput
-from math import sqrt
-import random
-from time import time
+from time import perf_counter, perf_counter_ns, time
 import csv
+from enum import Enum
+from assets import AssetManager
+from board import CLICKED, HIGHLIGHT, Board, BoxView
+from box_index import BoxIndex
+from box_layout import check_feasibility, generate_layout
+from cohort_stats import span_statistics
+from event_log import CLICK, EVENT_NAMES, STIMULUS_OFF, STIMULUS_ON, \
+    EventLog, click_metrics
+from frame_scheduler import FrameScheduler
+from layout_feasibility import check_generation_time
+from prefetch import Prefetcher
+from profiler import FrameProfiler
+from results_binary import BinaryJournals
+from results_store import ResultsStore
+from results_writer import ResultsWriter
+from session_record import CLICK as INPUT_CLICK, CONTINUE, START, \
+    SUBMIT_ID, UPDATE, SessionRecorder, parse_participant_id
+from startup import LazyResource, StartupTimer, start_warm_up
+from state_machine import StateMachine
+from stimulus_schedule import StimulusSchedule, jitter_report
+from text_cache import TextCache
 
 # --------------------------- Set Parameters Here -----------------------------
 # Set application size
@@ -38,10 +59,92 @@ HIGHLIGHT_TIME = 1.0  # highlight duration for each box during
 BOX_PARAMS = {'n_boxes': N_BOXES, 'size': BOX_SIZE, 'min_dist': MIN_DIST,
               't_highlight': HIGHLIGHT_TIME, 'margin': MARGIN}
 
+# Set frame pacing parameters
+FPS = 60  # target frame rate during sequence presentation, 0 for no limit
+VSYNC = True  # synchronize display updates with the monitor if available
+IDLE_TIMEOUT = 100  # maximum time to wait for events in static states in ms
+
+# Set maximum time to generate one box layout. Box parameters for which a
+# few test layouts take longer are rejected at startup, None to skip the
+# check. See layout_feasibility.py for a sweep of safe parameters.
+LAYOUT_BUDGET = 50.0  # ms
+
+# Set directory of images and other asset files. Defaults to the directory
+# of this file, can be overridden with the environment variable
+# CORSI_ASSET_DIR
+ASSET_DIR = os.environ.get('CORSI_ASSET_DIR',
+                           os.path.dirname(os.path.abspath(__file__)))
+
+# Set file name of the instruction image in the asset directory
+INSTRUCTION_IMAGE = "InstructionImage.png"
+
+# Set directory of the results files and maximum time between two forced
+# writes to disk
+RESULTS_DIR = "."
+FSYNC_INTERVAL = 1.0  # s
+
+# Set file name of the results database in the results directory, None to
+# only write CSV files. Participant IDs found in the database are rejected.
+RESULTS_DATABASE = "corsi_results.sqlite"
+
+# Set to True to also append all results to fixed-width binary files
+# (corsi_<table>.bin, see results_binary.py)
+BINARY_RESULTS = True
+
+# Set maximum number of stimulus and click events kept between two writes
+EVENT_LOG_SIZE = 1024
+
+# Generate the box layout of the next sequence in the background while the
+# instructions or the feedback are shown
+PREFETCH = True
+
+# Set maximum number of rendered text surfaces kept in memory
+TEXT_CACHE_SIZE = 32
+
+# Load fonts and images and pre-render messages in the background while the
+# participant ID can already be entered
+WARM_UP = True
+
+# Measure where frame time goes, e.g. on a slow station. Can be enabled with
+# the environment variable CORSI_PROFILE. The overlay is toggled with F3, the
+# profile is written to the results directory on exit (see profiler.py).
+PROFILE = bool(os.environ.get('CORSI_PROFILE'))
+
 
 # -----------------------------------------------------------------------------
 
 
+def open_results_writer(results_dir):
+    """
+    Start a results writer for the results directory with the results
+    database and binary files as configured above.
+    :param results_dir: string | directory of the results files
+    :return: ResultsWriter object
+    """
+
+    store = None
+    if RESULTS_DATABASE is not None:
+        os.makedirs(results_dir, exist_ok=True)
+        store = ResultsStore(os.path.join(results_dir, RESULTS_DATABASE))
+
+    binary = BinaryJournals(results_dir) if BINARY_RESULTS else None
+
+    return ResultsWriter(results_dir, FSYNC_INTERVAL, store, binary)
+
+
+class State(Enum):
+    """
+    States of a session. Values are the names used in the results and the
+    session server protocol.
+    """
+
+    PARTICIPANT_ID = 'Participant_ID'
+    INSTRUCTIONS = 'Instructions'
+    SHOW_SEQUENCE = 'ShowSequence'
+    USER_INPUT = 'UserInput'
+    FEEDBACK = 'Feedback'
+
+
 class Participant:
     def __init__(self, participant_id):
         """
@@ -69,6 +172,9 @@ class Participant:
         # Two errors for same sequence length will terminate trial
         self.errors = 0
 
+        # Number of sequences presented to the participant
+        self.sequences = 0
+
         # Keep track of performance statistics
         self.mean_corsi_span = 0
         self.std_corsi_span = 0
@@ -84,11 +190,8 @@ class Participant:
             self.corsi_spans.append(self.corsi_span)
 
         # Compute mean and standard deviation
-        self.mean_corsi_span = round(sum(self.corsi_spans) /
-                                     len(self.corsi_spans), 2)
-        self.std_corsi_span = round(sqrt(sum((xi - self.mean_corsi_span) ** 2
-                                       for xi in self.corsi_spans) /
-                                   len(self.corsi_spans)), 2)
+        self.mean_corsi_span, self.std_corsi_span = span_statistics(
+            self.corsi_spans)
 
     def write_csv(self):
         """
@@ -104,495 +207,521 @@ class Participant:
 
 class Sequence:
 
-    # Declare box as member class of sequence class
-    class Box:
-
-        # Declare colors as static member variables of box class
-        RED, GREEN = (255, 0, 0), (0, 255, 0)
-        BLUE, YELLOW = (0, 0, 255), (255, 255, 0)
-
-        def __init__(self, pos, size):
-            """
-            Class Box: For the box properties that are used, a class is
-            written
-            to avoid duplicate code. This can be done because all box
-            instances
-            have the same properties.
-            :param pos: tuple (int, int) | center coordinates of box
-            :param size: int | side length of rectangular box
-            """
-
-            self.pos = pos
-            self.size = size
-
-            # Flag to highlight box during drawing of sequence
-            self.highlight = False
-
-            # Flag to mark box as clicked during user input
-            self.clicked = False
-
-            # Flag to mark if box was correctly clicked by user
-            self.correct = False
-
-            # Declare variables used for drawing the box
-            self.rend = None
-            self.rect = None
-
-        def get_color(self):
-            """
-            Set box color based on flags.
-            """
-
-            # Highlighted box will be displayed in yellow
-            if self.highlight:
-                return self.YELLOW
-
-            # Clicked box will be displayed in green if correct and red
-            # if false
-            elif self.clicked:
-                if self.correct:
-                    return self.GREEN
-                else:
-                    return self.RED
-
-            # Box without flags will be displayed in blue
-            else:
-                return self.BLUE
-
-        def draw(self, screen):
-            """
-            Draw box on screen
-            :param screen: PyGame screen object
-            """
-
-            # Get PyGame surface of box size
-            self.rend = pygame.Surface((self.size, self.size))
+    # Boxes are views into the board of the sequence
+    Box = BoxView
 
-            # Assign box location to surface
-            self.rect = self.rend.get_rect(center=self.pos)
-
-            # Set box color
-            self.rend.fill(self.get_color())
-
-            # Display box
-            screen.blit(self.rend, self.rect)
-
-    def __init__(self, screen_size, box_parameters):
+    def __init__(self, screen_size, box_parameters, time_source=perf_counter,
+                 event_log=None, frame_period=0.0):
         """
         Sequence class to handle the display sequence. Contains a list of
         boxes and all functions relevant for displaying the boxes.
         :param screen_size: tuple (int, int) | width and height of
         application
         :param box_parameters: dict of box parameters
+        :param time_source: function returning the current time in s
+        :param event_log: EventLog object to record stimulus onsets and
+        offsets, None to disable
+        :param frame_period: float | expected time between two frames in s
         """
 
         self.screen_size = screen_size
         self.box_parameters = box_parameters
+        self.time_source = time_source
+        self.event_log = event_log
+        self.frame_period = frame_period
+
+        # Make sure that the boxes fit on the screen before the first sequence
+        # is generated
+        check_feasibility(screen_size, box_parameters['n_boxes'],
+                          box_parameters['min_dist'], box_parameters['margin'])
 
         # Set initial sequence length to None. Will be updated every time a
         # new sequence is generated
         self.length = None
 
-        # Set index of current box to be highlighted in display function
+        # Set number of boxes highlighted so far in display function
         self.highlight_box_id = 0
 
-        # Set time when last box was highlighted. Necessary to maintain
-        # interval between highlighted boxes
-        self.last_box_highlighted = 0
+        # Planned and achieved times of the stimulus changes. Will be created
+        # when the sequence is displayed for the first time
+        self.schedule = None
 
-        # Initialize empty list of boxes. Will be updated every time a new
+        # Timing errors of the stimulus changes of previous sequences in ms
+        self.timing_errors = []
+
+        # Initialize empty board of boxes. Will be updated every time a new
         # sequence is generated
-        self.boxes = []
+        self.boxes = Board()
+
+        # Spatial index of the boxes for finding clicked boxes
+        self.index = BoxIndex([], box_parameters['size'])
 
         # Flag to indicate if user input for sequence was correct
         self.correct = False
 
-    def generate(self, length):
+    def generate(self, length, rng=random, positions=None):
         """
         Generate a new sequence of given length.
         :param length: int | length of sequence
+        :param rng: random number generator (random module or random.Random)
+        :param positions: list of box centers generated ahead of time, None
+        to generate them now
         """
 
         # Set sequence length
         self.length = length
 
         # Generate random boxes
-        self.boxes = self.generate_boxes()
+        self.boxes = self.generate_boxes(rng, positions)
+        self.index = BoxIndex(self.boxes.rects(), self.box_parameters['size'])
 
         # Set first box as highlighted box
         self.highlight_box_id = 0
 
-    def generate_boxes(self):
+        # Keep timing errors of the previous sequence
+        if self.schedule is not None:
+            self.timing_errors.extend(self.schedule.errors())
+        self.schedule = None
+
+    def generate_positions(self, rng=random):
         """
-        Generate a list of randomly placed, non-overlapping box objects.
+        Sample box centers with minimum distance between each other.
+        :param rng: random number generator (random module or random.Random)
+        :return: list of box centers (int, int)
         """
 
-        # Get free margin at the borders of the screen
-        margin = self.box_parameters['margin']
+        return generate_layout(self.screen_size,
+                               self.box_parameters['n_boxes'],
+                               self.box_parameters['min_dist'],
+                               self.box_parameters['margin'], rng)
 
-        # Initialize empty list
-        boxes = []
-
-        # Set number of generated boxes to 0
-        i = 0
-
-        # Loop until specified number of non-overlapping boxes is reached
-        while i < self.box_parameters['n_boxes']:
-
-            # Sample random x and y position on screen
-            random_x = random.randint(margin, self.screen_size[0] - margin)
-            random_y = random.randint(margin, self.screen_size[1] - margin)
+    def generate_boxes(self, rng=random, positions=None):
+        """
+        Generate a board of randomly placed, non-overlapping boxes.
+        :param rng: random number generator (random module or random.Random)
+        :param positions: list of box centers generated ahead of time, None
+        to generate them now
+        :return: Board object
+        """
 
-            # Create candidate box object
-            candidate_box = self.Box((random_x, random_y),
-                                     self.box_parameters['size'])
+        if positions is None:
+            positions = self.generate_positions(rng)
 
-            # Check if candidate box collides with any of the previously
-            # generated boxes
-            if not any(self.collision_check(candidate_box, box)
-                       for box in boxes):
-                # Append candidate box to list of boxes
-                boxes.append(candidate_box)
+        # Store boxes at sampled positions
+        return Board(positions, self.box_parameters['size'])
 
-                # Increment counter of generated boxes
-                i += 1
+    def box_at(self, pos):
+        """
+        Find the box at a position on screen.
+        :param pos: tuple (int, int) | position on screen
+        :return: int | index of the box, -1 if there is no box
+        """
 
-        return boxes
+        return self.index.find(pos)
 
-    def collision_check(self, candidate_box, box):
+    def click(self, box_id):
         """
-        Check for collision of two boxes. Collision defined by mininum distance
-        between the centers of the boxes in box parameters.
-        :param candidate_box: candidate box object
-        :param box: box object already added to current set of boxes
-        :return: Flag that indicates if the two boxes collide
+        Mark a box as clicked. Only the box clicked last is marked.
+        :param box_id: int | index of the clicked box
         """
 
-        # Compute euclidean distance between box centers
-        dx = candidate_box.pos[0] - box.pos[0]
-        dy = candidate_box.pos[1] - box.pos[1]
-        distance = sqrt(dx ** 2 + dy ** 2)
-
-        # Collision if distance below threshold
-        if distance < self.box_parameters['min_dist']:
-            return True
-        else:
-            return False
+        self.boxes.clear_flag(CLICKED)
+        self.boxes.set_flag(box_id, CLICKED)
 
     def show(self, trial_start, start_delay, screen):
         """
         Draw corsi sequence. Boxes are highlighted for a
         specified duration (self.box_parameters['t_highlight']) if application
-        in state "ShowSequence". In state "UserInput", set of boxes is
+        in state ShowSequence. In state UserInput, set of boxes is
         displayed without highlighting.
+        :param trial_start: float | start time of the trial in s
+        :param start_delay: float | time before first corsi box is shown in s
+        :param screen: PyGame screen object
+        :return: next session state
+        """
+
+        next_state = self.update(trial_start, start_delay)
+
+        # Draw all boxes
+        self.draw(screen)
+
+        return next_state
+
+    def update(self, trial_start, start_delay, current_time=None):
+        """
+        Update highlighting of the boxes according to the stimulus schedule.
+        :param trial_start: float | start time of the trial in s
+        :param start_delay: float | time before first corsi box is shown in s
+        :param current_time: float | current time in s, None to read it from
+        the time source
+        :return: next session state, State.USER_INPUT once the full sequence
+        has been highlighted
         """
 
         # Next state
-        next_state = 'ShowSequence'
+        next_state = State.SHOW_SEQUENCE
 
-        # Wait specified time before starting the trial
-        # Delay only used for first sequence of trial (after reading
-        # instructions)
-        if (time() - trial_start) > start_delay:
+        # Get current time
+        if current_time is None:
+            current_time = self.time_source()
 
-            # Draw first box
-            if self.highlight_box_id == 0:
+        # Plan onsets of all boxes when the sequence is first displayed.
+        # Wait specified time before starting the trial. Delay only used for
+        # first sequence of trial (after reading instructions)
+        if self.schedule is None:
+            self.schedule = StimulusSchedule(
+                max(trial_start + start_delay, current_time), self.length,
+                self.box_parameters['t_highlight'])
 
-                # Highlight first box
-                self.boxes[self.highlight_box_id].highlight = True
+        # Number of highlighting changes due on this frame, i.e. with a
+        # deadline closer to this frame than to the next one
+        step = self.schedule.step(current_time + self.frame_period / 2.0)
 
-                # Increment box selector
-                self.highlight_box_id += 1
+        if step != self.highlight_box_id:
 
-                # Set time of last box highlighting
-                self.last_box_highlighted = time()
+            # Disable highlighting for previous box
+            if self.highlight_box_id > 0:
+                self.set_highlight(self.highlight_box_id - 1, False)
 
-            else:
+            # Enable highlighting for current box if full sequence hasn't
+            # been highlighted yet
+            if step <= self.length:
+                self.set_highlight(step - 1, True)
 
-                # Get current time
-                current_time = time()
+            # Update box selector and remember change for timing
+            self.highlight_box_id = step
+            self.schedule.drawn(step)
 
-                # Highlight next box if highlight duration exceeded
-                if (current_time - self.last_box_highlighted) > \
-                        self.box_parameters['t_highlight']:
+        # If full sequence has been highlighted, set state to user input
+        if step > self.length:
+            next_state = State.USER_INPUT
 
-                    # If full sequence hasn't been highlighted yet
-                    if self.highlight_box_id < self.length:
+        return next_state
 
-                        # Disable highlighting for previous box
-                        self.boxes[
-                            self.highlight_box_id - 1].highlight = False
+    def draw(self, screen):
+        """
+        Draw all boxes.
+        :param screen: PyGame screen object
+        """
 
-                        # Enable highlighting for current box
-                        self.boxes[self.highlight_box_id].highlight = True
+        self.boxes.draw(screen)
 
-                        # Increment box selector
-                        self.highlight_box_id += 1
+    def presented(self, time):
+        """
+        Record the time at which the last drawn frame reached the screen.
+        :param time: float | presentation time in s
+        """
 
-                        # Set time of last box highlighting
-                        self.last_box_highlighted = time()
+        if self.schedule is not None:
+            self.schedule.presented(time)
 
-                    # If full sequence has been highlighted
-                    else:
+    def timing_report(self):
+        """
+        Summarize the timing errors of all stimulus changes so far.
+        :return: dict with mean, p95 and max timing error in ms
+        """
 
-                        # Disable highlighting for previous box
-                        self.boxes[
-                            self.highlight_box_id - 1].highlight = False
+        errors = list(self.timing_errors)
+        if self.schedule is not None:
+            errors += self.schedule.errors()
 
-                        # Set state to user input
-                        next_state = 'UserInput'
+        return jitter_report(errors)
 
-        # Draw all boxes
-        for box in self.boxes:
-            box.draw(screen)
+    def set_highlight(self, box_id, highlight):
+        """
+        Switch highlighting of a box on or off and log the stimulus onset or
+        offset.
+        :param box_id: int | index of the box
+        :param highlight: bool | new highlight flag
+        """
 
-        return next_state
+        if self.boxes.get_flag(box_id, HIGHLIGHT) == highlight:
+            return
 
+        self.boxes.set_flag(box_id, HIGHLIGHT, highlight)
 
-class Application:
+        if self.event_log is not None:
+            self.event_log.log(STIMULUS_ON if highlight else STIMULUS_OFF,
+                               box_id, self.boxes[box_id].pos)
 
-    # Declare colors and fonts as static class variables
-    BLACK, WHITE = (0, 0, 0), (255, 255, 255)
-    BACKGROUND_COLOR = WHITE
-    RED, GREEN, = (255, 0, 0), (0, 255, 0)
-    BLUE, YELLOW = (0, 0, 255), (255, 255, 0)
-    font = pygame.font.Font(None, 80)
-    font_small = pygame.font.Font(None, 40)
+
+class Session:
 
     def __init__(self, screen_size, box_parameters, start_delay,
-                 max_participants, max_trials):
+                 max_participants, max_trials, time_source=perf_counter,
+                 time_source_ns=perf_counter_ns, results_writer=None,
+                 frame_period=0.0, seed=None, prefetch=PREFETCH):
         """
-        Constructor for application class. This class instantiates the GUI
-        and handles all interaction with the participant.
+        Session class to handle the course of the experiment for one
+        participant: participant ID, sequences, trials, state transitions and
+        results. Contains no drawing code, so sessions can also be run
+        without a window.
         :param screen_size: tuple (int, int) | (width, height)
         :param box_parameters: dict | box parameters (number, size, dist., ...)
         :param start_delay: float | time before first corsi box is shown in s
         :param max_participants: int | maximum number of participants
         :param max_trials: int | maximum number of attempts per participant
+        :param time_source: function returning the current time in s
+        :param time_source_ns: function returning the current time in ns,
+        has to use the same clock as time_source
+        :param results_writer: ResultsWriter object to stream results to,
+        None to disable streaming
+        :param frame_period: float | expected time between two frames in s
+        :param seed: int | seed of the random box layouts, None for a random
+        seed
+        :param prefetch: bool | generate the layout of the next sequence in
+        the background
         """
 
-        # Initialize PyGame
-        pygame.init()
-
-        # Set screen size
-        self.screen_size = screen_size
-        pygame.display.set_mode((self.screen_size[0],
-                                 self.screen_size[1]), 0, 32)
-
-        # Set application title
-        pygame.display.set_caption("Corsi Block Tapping Test")
+        # Clock used for all timing of the task
+        self.time_source = time_source
 
-        # Get screen handle
-        self.screen = pygame.display.get_surface()
+        # Stream results of each sequence and trial
+        self.results_writer = results_writer
 
-        # Declare interface for text input
-        self.text_input = pygame_textinput.TextInput()
+        # Parameters needed to reproduce the session from a recording
+        self.parameters = {'screen_size': list(screen_size),
+                           'box_parameters': dict(box_parameters),
+                           'start_delay': start_delay,
+                           'max_participants': max_participants,
+                           'max_trials': max_trials,
+                           'frame_period': frame_period}
 
-        # Set initial state of the application
-        self.state = 'Participant_ID'
-
-        # Initialize participant to None. Participant object will be created
-        # when unique participant ID is provided
-        self.participant = None
+        # Record stimulus and click events with high resolution
+        self.event_log = EventLog(EVENT_LOG_SIZE, time_source_ns)
 
         # Initialize sequence object. New sequences will be created by
         # by generating a new set of boxes
-        self.sequence = Sequence(screen_size, box_parameters)
+        self.sequence = Sequence(screen_size, box_parameters, time_source,
+                                 self.event_log, frame_period)
+
+        # Layouts depend only on the seed and the index of the sequence, not
+        # on its length. The next layout can thus be generated while the
+        # outcome of the current sequence is still open.
+        self.prefetch = prefetch
+        self.layouts = Prefetcher(self.generate_layout)
 
         # Max number of attempts
         self.max_trials = max_trials
 
-        # Set flag to indicate end of a trial
-        self.trial_over = False
-
         # Set maximum number of participants
         self.max_participants = max_participants
 
         # Set delay time between instruction and sequence presentation
         self.start_delay = int(start_delay)
 
-        # Set start time of first trial
-        self.trial_start = 0
+        # State transitions of the session. Handlers of the states are
+        # registered by the front end that drives the session
+        self.machine = StateMachine(State, State.PARTICIPANT_ID, time_source)
 
-        # Load instruction image
-        self.instruction_image = pygame.image.load("InstructionImage.png")
+        # Set initial state of the session
+        self.reset(seed)
 
-    def start(self):
+    @property
+    def state(self):
+        return self.machine.state
+
+    @state.setter
+    def state(self, state):
+        self.machine.transition(state)
+
+    def reset(self, seed=None):
         """
-        Start the application. This function contains the main PyGame event
-        loop.
+        Reset the session to the participant ID input.
+        :param seed: int | seed of the random box layouts of the new session,
+        None for a random seed
         """
 
-        # Loop until execution is terminated in GUI
-        while True:
-            # Create blank screen
-            self.screen.fill(self.BACKGROUND_COLOR)
+        # The layout of each sequence is generated from the session seed and
+        # the index of the sequence
+        if seed is None:
+            seed = random.SystemRandom().getrandbits(32)
+        self.seed = seed
 
-            # Handle events to set application state
-            self.handle_events()
+        # Record all inputs to be able to replay the session
+        self.recorder = SessionRecorder(seed, self.parameters)
 
-            # Update application based on application state and
-            # automatic transitions between states
-            self.update()
+        # Layouts prefetched for the previous session are not needed anymore
+        self.layouts.discard()
 
-            # Refresh screen
-            pygame.display.update()
+        # Set initial state of the session
+        self.state = State.PARTICIPANT_ID
 
-    def handle_events(self):
-        """
-        Handle all available events.
-        """
+        # Reason why the last participant ID was rejected
+        self.id_error = None
 
-        # Get list of events
-        events = pygame.event.get()
+        # Initialize participant to None. Participant object will be created
+        # when unique participant ID is provided
+        self.participant = None
 
-        # Iterate over all events
-        for event in events:
+        # Set flag to indicate end of a trial
+        self.trial_over = False
 
-            # Pressing ESC or clicking X
-            if event.type == QUIT or (event.type == KEYDOWN and
-                                      event.key == K_ESCAPE):
-                # Write results to CSV
-                if self.participant is not None:
-                    self.participant.write_csv()
-                pygame.quit()
-                sys.exit()
+        # Set start time of first trial
+        self.trial_start = 0
 
-            # STATE = Participant_ID
-            if self.state == 'Participant_ID':
-                self.handle_id_input(event)
+        # Feedback message on the last sequence
+        self.message = None
 
-            # STATE = Instructions
-            elif self.state == 'Instructions':
-                self.handle_instructions_input(event)
+        # Clear stimulus timing of previous session
+        self.sequence.timing_errors = []
+        self.sequence.schedule = None
 
-            # STATE = UserInput
-            elif self.state == "UserInput":
-                self.handle_user_input(event)
+        # Discard events of a sequence aborted in the previous session, they
+        # would be written with the first sequence of the new one
+        self.event_log.drain()
 
-            # STATE = Feedback
-            elif self.state == 'Feedback':
-                self.handle_feedback_input(event)
+    @property
+    def finished(self):
+        """
+        Flag that indicates if the last trial is over.
+        """
 
-    def handle_id_input(self, event):
+        return self.trial_over and \
+            self.participant.current_trial == self.max_trials
 
-        # Update text input interface
-        self.text_input.update([event])
+    def submit_id(self, text):
+        """
+        Handle the participant ID entered in state Participant_ID.
+        :param text: string | participant ID as typed by the participant
+        :return: Flag that indicates if the participant ID was valid. If not,
+        the reason is stored in id_error.
+        """
 
-        # Check if valid participant ID provided
-        if event.type == KEYDOWN and event.key == K_RETURN:
-            try:
-                # Cast text input to integer
-                participant_id = int(self.text_input.get_text())
-            except ValueError:
-                # Set participant_id to None if invalid input provided
-                participant_id = None
-
-            # Check that participant_id within range of allowed number of
-            # participants
-            if participant_id is not None and \
-                    1 <= participant_id <= self.max_participants:
-                # Create participant
-                self.participant = Participant(participant_id)
-                # Set application state to "Instructions"
-                self.state = "Instructions"
-            else:
-                print("Incorrect participant ID. Please type "
-                      "a number between 1 and ", self.max_participants,
-                      '!')
+        self.id_error = self.check_id(text)
 
-    def handle_instructions_input(self, event):
+        # Rejected IDs are recorded as invalid, so that the replay does not
+        # depend on the participants stored at the time of recording
+        self.recorder.add(self.time_source(), SUBMIT_ID,
+                          -1 if self.id_error else parse_participant_id(text))
 
-        # Go to next state upon pressing space bar and display
-        # participant ID in GUI
-        if event.type == KEYDOWN and event.key == K_SPACE:
-            pygame.display.set_caption("Corsi Block Tapping "
-                                       "Test: Participant "
-                                       + str(self.participant.participant_id))
+        if self.id_error is None:
+            # Create participant
+            self.participant = Participant(int(text))
+            # Set session state to Instructions
+            self.state = State.INSTRUCTIONS
 
-            # Set trial start time
-            self.trial_start = time()
+            # Prepare first layout while the instructions are read
+            self.prefetch_layout()
+            return True
 
-            # Prepare the new sequence
-            self.generate_sequence()
+        return False
 
-    def handle_user_input(self, event):
+    def check_id(self, text):
         """
-        Handles events in state UserInput.
-        :param event: PyGame event object
+        Check a participant ID.
+        :param text: string | participant ID as typed by the participant
+        :return: string | error message, None if the ID is valid
         """
 
-        if event.type == MOUSEBUTTONUP:
+        try:
+            # Cast text input to integer
+            participant_id = int(text)
+        except ValueError:
+            # Set participant_id to None if invalid input provided
+            participant_id = None
 
-            # Check if participant clicks on box
-            for box in self.sequence.boxes:
-                if box.rect.collidepoint(pygame.mouse.get_pos()) and not box.clicked:
+        # Check that participant_id within range of allowed number of
+        # participants
+        if participant_id is None or \
+                not 1 <= participant_id <= self.max_participants:
+            return ("Incorrect participant ID. Please type a number between "
+                    "1 and {}!".format(self.max_participants))
 
-                    # Make sure all other boxes are set to "un-clicked"
-                    for box_ in self.sequence.boxes:
-                        box_.clicked = False
+        # Check that participant did not take part before
+        if self.results_writer is not None and \
+                self.results_writer.has_participant(participant_id):
+            return "Participant {} already took part!".format(participant_id)
 
-                    # Set property of clicked box
-                    box.clicked = True
+        return None
 
-                    # Check correctness of clicked box
-                    if box == self.sequence.boxes[self.participant.clicks]:
-                        box.correct = True
+    def start(self):
+        """
+        Start the first trial after the instructions.
+        """
 
-                        # If number of clicks equal to sequence length, user
-                        # input for entire sequence correct
-                        if self.participant.clicks == self.sequence.length - 1:
-                            self.sequence.correct = True
-                            self.state = "Feedback"
-                        # If all previous clicks correct, increment number of
-                        # clicks
-                        else:
-                            self.participant.clicks += 1
-                    # If not clicked box not correct
-                    else:
+        # Set trial start time
+        self.trial_start = self.time_source()
+        self.recorder.add(self.trial_start, START)
+
+        # Prepare the new sequence
+        self.generate_sequence()
+
+    def click(self, pos):
+        """
+        Handle a click in state UserInput.
+        :param pos: tuple (int, int) | position of the click on screen
+        """
 
-                        # Set box property
-                        box.correct = False
+        self.recorder.add(self.time_source(), INPUT_CLICK, pos[0], pos[1])
+
+        # Find box under the cursor and log click together with the box
+        box_id = self.sequence.box_at(pos)
+        self.event_log.log(CLICK, box_id, pos)
+
+        # Check if participant clicks on box that is not clicked yet
+        if box_id < 0:
+            return
+        box = self.sequence.boxes[box_id]
+        if box.clicked:
+            return
+
+        # Set property of clicked box, the previously clicked box is set to
+        # "un-clicked"
+        self.sequence.click(box_id)
+
+        # Check correctness of clicked box
+        if box_id == self.participant.clicks:
+            box.correct = True
+
+            # If number of clicks equal to sequence length, user
+            # input for entire sequence correct
+            if self.participant.clicks == self.sequence.length - 1:
+                self.finish_sequence(True)
+            # If all previous clicks correct, increment number of
+            # clicks
+            else:
+                self.participant.clicks += 1
+        # If not clicked box not correct
+        else:
 
-                        # Set state
-                        self.state = "Feedback"
+            # Set box property
+            box.correct = False
 
-                        # Increment number of errors
-                        self.participant.errors += 1
+            # Increment number of errors
+            self.participant.errors += 1
 
-                        # Mark sequence as incorrect
-                        self.sequence.correct = False
+            # Mark sequence as incorrect
+            self.finish_sequence(False)
 
-    def handle_feedback_input(self, event):
+    def next_sequence(self):
         """
-        Handles events in feedback state.
-        :param event: PyGame event object
+        Continue after the feedback. Starts the next trial if the current one
+        is over and the next sequence unless the last trial is over.
         """
 
-        # Start new trial or game by hitting space bar
-        if event.type == KEYDOWN and event.key == K_SPACE:
+        self.recorder.add(self.time_source(), CONTINUE)
 
-            # If trial is over and maximum number of trials not
-            # reached
-            if self.trial_over and \
-                    self.participant.current_trial < self.max_trials:
-                # Increment attempt counter
-                self.participant.current_trial += 1
+        # If trial is over and maximum number of trials not
+        # reached
+        if self.trial_over and \
+                self.participant.current_trial < self.max_trials:
+            # Increment attempt counter
+            self.participant.current_trial += 1
 
-                # Reset participant's corsi span to 2 for new trial
-                self.participant.corsi_span = 2
+            # Reset participant's corsi span to 2 for new trial
+            self.participant.corsi_span = 2
 
-                # Reset errors
-                self.participant.errors = 0
+            # Reset errors
+            self.participant.errors = 0
 
-                # Reset game over flag
-                self.trial_over = False
+            # Reset game over flag
+            self.trial_over = False
 
-            # If not at the end of last trial, generate new sequence
-            if not (self.trial_over and
-                    self.participant.current_trial == self.max_trials):
-                # Generate new sequence
-                self.generate_sequence()
+        # If not at the end of last trial, generate new sequence
+        if not self.finished:
+            # Generate new sequence
+            self.generate_sequence()
 
     def generate_sequence(self):
         """
@@ -603,80 +732,62 @@ class Application:
         # Get sequence length
         sequence_length = self.participant.corsi_span + 1
 
-        # Create new sequence
-        self.sequence.generate(sequence_length)
+        # Create new sequence from its own random number generator
+        index = self.participant.sequences
+        self.sequence.generate(sequence_length, positions=self.layouts.get(
+            (self.seed, index)))
+        self.recorder.add_outcome(sequence_length,
+                                  self.sequence.boxes.positions())
 
         # Set new state
-        self.state = "ShowSequence"
+        self.state = State.SHOW_SEQUENCE
 
         # Set number of user_clicks to 0
         self.participant.clicks = 0
 
-    def update(self):
-        """
-      Update visual appearance based on current state of the application. For
-      transitions that don't required a user input, this might result in a
-      change of the application state.
-      """
-
-        # Set new state to current state
-        new_state = self.state
-
-        if self.state == 'Participant_ID':
-            self.show_id_input()
-
-        elif self.state == 'Instructions':
-            self.show_instructions()
+        # Count presented sequences
+        self.participant.sequences += 1
 
-        elif self.state in ['ShowSequence', 'UserInput']:
-            new_state = self.sequence.show(self.trial_start, self.start_delay,
-                                           self.screen)
-
-        elif self.state == 'Feedback':
-            self.show_feedback()
-
-        else:
-            print('Unknown state. Exit...')
-            exit()
-
-        # Set application state which might have changed due to automatic
-        # transitions (see self.sequence.show())
-        self.state = new_state
-
-    def show_id_input(self):
+    def update(self):
         """
-        Show input field for participant ID.
+        Perform transitions between states that don't require user input.
         """
 
-        self.draw_text("Corsi Block Tapping Test", self.font, self.BLACK,
-                       self.BACKGROUND_COLOR, 150)
-        self.draw_text("Please enter your participant ID", self.font_small,
-                       self.BLACK,
-                       self.BACKGROUND_COLOR, SCREEN_SIZE[1] * .8)
-        self.screen.blit(self.text_input.get_surface(),
-                         (SCREEN_SIZE[0] * .5, SCREEN_SIZE[1] * .5))
+        if self.state is State.SHOW_SEQUENCE:
+            now = self.time_source()
+            changes = (self.sequence.schedule, self.sequence.highlight_box_id)
 
-    def show_instructions(self):
-        """
-        Show instruction image.
-        """
+            state = self.sequence.update(self.trial_start, self.start_delay,
+                                         now)
 
-        self.screen.blit(self.instruction_image, (0, 0))
+            # Record frames that planned the schedule or changed the
+            # highlighting, all others have no effect
+            if changes != (self.sequence.schedule,
+                           self.sequence.highlight_box_id):
+                self.recorder.add(now, UPDATE)
 
-    def show_feedback(self):
+            if state is not self.state:
+                self.state = state
+
+    def finish_sequence(self, correct):
         """
-        Display feedback depending on the user input to the last sequence.
+        Evaluate the user input to the last sequence and show the feedback.
         Based on the number of trials and errors, either a new sequence will
         be initiated or the experiment is over.
-        :return:
+        :param correct: bool | flag if the user input was correct
         """
 
+        self.sequence.correct = correct
+        self.recorder.add_outcome(correct, self.participant.clicks)
+        self.state = State.FEEDBACK
+        self.record_sequence()
+
         # 3 scenarios based on user input to sequence
         # 1: Last sequence was correct
         if self.sequence.correct:
 
             # Set message to be displayed
-            message = "Great job!"
+            self.message = "Great job!"
 
             # Reset errors to 0 after correct sequence
             self.participant.errors = 0
@@ -691,20 +802,20 @@ class Application:
                 self.trial_over = True
 
                 # Set message to be displayed
-                message = "Congratulations! You won!"
+                self.message = "Congratulations! You won!"
 
         # 2: Last sequence was incorrect, but one remaining attempt
         elif self.participant.errors == 1:
 
             # Set message to be displayed
-            message = "One more try!"
+            self.message = "One more try!"
 
         # If errors = 2: game over, give feedback i.e. corsi span
         # and reset values for new game
         else:
 
             # Set message to be displayed
-            message = "Trial finished!"
+            self.message = "Trial finished!"
 
             # Game is over
             self.trial_over = True
@@ -712,37 +823,627 @@ class Application:
         # Update participant statistics after each trial
         if self.trial_over:
             self.participant.update_statistics()
+            self.record_trial()
 
-        # Show message on the screen
-        self.draw_text(message, self.font, self.BLACK, self.BACKGROUND_COLOR,
-                       150)
+        # Prepare next layout while the feedback is shown
+        if not self.finished:
+            self.prefetch_layout()
+
+    def generate_layout(self, key):
+        """
+        Generate the box centers of a sequence. Can run in a background
+        thread.
+        :param key: tuple (int, int) | seed of the session and index of the
+        sequence
+        :return: list of box centers (int, int)
+        """
+
+        return self.sequence.generate_positions(
+            random.Random('{}:{}'.format(*key)))
+
+    def prefetch_layout(self):
+        """
+        Start generating the layout of the next sequence in the background.
+        """
+
+        if self.prefetch:
+            self.layouts.prefetch((self.seed, self.participant.sequences))
+
+    def feedback_text(self):
+        """
+        Texts displayed in state Feedback.
+        :return: tuple of feedback message, corsi span summary (None if trial
+        not yet finished) and instruction how to continue
+        """
 
         # Show current corsi span if maximum number of trials not yet reached
         if self.trial_over and self.participant.current_trial < \
                 self.max_trials:
-            self.draw_text("Your corsi span in trial " +
-                           str(self.participant.current_trial) +
-                           "/" + str(self.max_trials) + " was " +
-                           str(self.participant.corsi_span),
-                           self.font_small, self.BLACK, self.BACKGROUND_COLOR,
-                           SCREEN_SIZE[1] * .4)
+            summary = ("Your corsi span in trial " +
+                       str(self.participant.current_trial) +
+                       "/" + str(self.max_trials) + " was " +
+                       str(self.participant.corsi_span))
             feedback = "Press space bar for next trial!"
 
         # Show final corsi span if maximum number of trials reached
-        elif self.trial_over and self.participant.current_trial == \
-                self.max_trials:
-            self.draw_text("Your final corsi span after " +
-                           str(self.max_trials) + ' is ' +
-                           str(round(self.participant.mean_corsi_span, 2))
-                           + " +- " +
-                           str(round(self.participant.std_corsi_span, 2)),
-                           self.font_small, self.BLACK, self.BACKGROUND_COLOR,
-                           SCREEN_SIZE[1] * .4)
+        elif self.finished:
+            summary = ("Your final corsi span after " +
+                       str(self.max_trials) + ' is ' +
+                       str(round(self.participant.mean_corsi_span, 2))
+                       + " +- " +
+                       str(round(self.participant.std_corsi_span, 2)))
             feedback = "Press ESC to close application!"
         # If trial not yet finished
         else:
+            summary = None
             feedback = "Press space bar to continue"
 
+        return self.message, summary, feedback
+
+    def record_sequence(self):
+        """
+        Stream the result of the current sequence together with its stimulus
+        and click events.
+        """
+
+        # Collect the events of this sequence
+        events = self.event_log.drain()
+
+        if self.results_writer is None:
+            return
+
+        participant_id = self.participant.participant_id
+        sequence = self.participant.sequences
+
+        self.results_writer.write(
+            'sequences', participant_id=participant_id,
+            trial=self.participant.current_trial,
+            sequence=sequence, length=self.sequence.length,
+            correct=int(self.sequence.correct),
+            errors=self.participant.errors, timestamp=round(time(), 3))
+
+        # Write layout, events and click timing in bulk
+        self.results_writer.write_many('boxes', [
+            {'participant_id': participant_id, 'sequence': sequence,
+             'box': box, 'x': x, 'y': y}
+            for box, (x, y) in enumerate(self.sequence.boxes.positions())])
+        self.results_writer.write_many('events', [
+            {'participant_id': participant_id, 'sequence': sequence,
+             'event': EVENT_NAMES[kind], 'time_ns': time_ns, 'box': box,
+             'x': x, 'y': y} for kind, time_ns, box, x, y in events])
+        self.results_writer.write_many('clicks', [
+            dict(metrics, participant_id=participant_id, sequence=sequence)
+            for metrics in click_metrics(events)])
+
+    def record_participant(self):
+        """
+        Stream the participant ID, which marks the ID as used. Called with
+        the first trial result, so a mistyped ID or a session aborted before
+        the end of the first trial does not use up the ID.
+        """
+
+        if self.results_writer is None:
+            return
+
+        self.results_writer.write(
+            'participants', participant_id=self.participant.participant_id,
+            seed=self.seed, timestamp=round(time(), 3))
+
+    def record_trial(self):
+        """
+        Stream the result of the current trial.
+        """
+
+        if self.results_writer is None:
+            return
+
+        if self.participant.current_trial == 1:
+            self.record_participant()
+
+        self.results_writer.write(
+            'trials', participant_id=self.participant.participant_id,
+            trial=self.participant.current_trial,
+            corsi_span=self.participant.corsi_span,
+            mean_corsi_span=self.participant.mean_corsi_span,
+            std_corsi_span=self.participant.std_corsi_span,
+            timestamp=round(time(), 3))
+
+    def save_recording(self, directory):
+        """
+        Write the recording of the session for replay (see
+        session_record.py).
+        :param directory: string | directory of the results files
+        :return: string | path of the recording file
+        """
+
+        participant_id = 0 if self.participant is None else \
+            self.participant.participant_id
+        path = os.path.join(directory, 'corsi_session_{}_{}.rec'.format(
+            participant_id, self.seed))
+        self.recorder.save(path)
+        return path
+
+
+class Application:
+
+    # Declare colors and font sizes as static class variables
+    BLACK, WHITE = (0, 0, 0), (255, 255, 255)
+    BACKGROUND_COLOR = WHITE
+    RED, GREEN, = (255, 0, 0), (0, 255, 0)
+    BLUE, YELLOW = (0, 0, 255), (255, 255, 0)
+    FONT_SIZE, FONT_SIZE_SMALL = 80, 40
+
+    # Key that shows or hides the profiling overlay
+    OVERLAY_KEY = K_F3
+
+    # States in which the screen only changes upon user input. This includes
+    # UserInput: waiting on the event queue returns as soon as a click
+    # arrives, so clicks are handled and timestamped earlier than in frames
+    # paced to the target frame rate.
+    IDLE_STATES = frozenset((State.PARTICIPANT_ID, State.INSTRUCTIONS,
+                             State.USER_INPUT, State.FEEDBACK))
+
+    # Fixed messages that are rendered at startup
+    MESSAGES = ("Corsi Block Tapping Test", "Great job!",
+                "Congratulations! You won!", "One more try!",
+                "Trial finished!")
+    MESSAGES_SMALL = ("Please enter your participant ID",
+                      "Press space bar for next trial!",
+                      "Press ESC to close application!",
+                      "Press space bar to continue")
+
+    def __init__(self, screen_size, box_parameters, start_delay,
+                 max_participants, max_trials, fps=FPS, vsync=VSYNC,
+                 idle_timeout=IDLE_TIMEOUT, time_source=perf_counter,
+                 time_source_ns=perf_counter_ns, results_dir=RESULTS_DIR,
+                 warm_up=WARM_UP, asset_dir=ASSET_DIR, profile=PROFILE,
+                 layout_budget=LAYOUT_BUDGET):
+        """
+        Constructor for application class. This class instantiates the GUI
+        and handles all interaction with the participant.
+        :param screen_size: tuple (int, int) | (width, height)
+        :param box_parameters: dict | box parameters (number, size, dist., ...)
+        :param start_delay: float | time before first corsi box is shown in s
+        :param max_participants: int | maximum number of participants
+        :param max_trials: int | maximum number of attempts per participant
+        :param fps: int | target frame rate during sequence presentation, 0
+        for no limit
+        :param vsync: bool | synchronize display updates with the monitor
+        :param idle_timeout: int | maximum time to wait for events in static
+        states in ms
+        :param time_source: function returning the current time in s
+        :param time_source_ns: function returning the current time in ns,
+        has to use the same clock as time_source
+        :param results_dir: string | directory to stream results to, None to
+        disable streaming
+        :param warm_up: bool | load fonts and images on a background thread
+        instead of on first use
+        :param asset_dir: string | directory of the images
+        :param profile: bool | measure the duration of the parts of each
+        frame per state
+        :param layout_budget: float | maximum time to generate one box layout
+        in ms, None to skip the check
+        :raise ValueError: if the box parameters are infeasible or their
+        layouts take longer than the budget
+        """
+
+        # Measure duration of all initialization steps
+        self.startup_timer = StartupTimer()
+
+        # Reject box parameters that would stall the task before anything is
+        # opened
+        if layout_budget is not None:
+            with self.startup_timer.measure('layout_check'):
+                check_generation_time(screen_size, box_parameters,
+                                      layout_budget)
+
+        # Stream results of each sequence and trial to disk
+        self.results_writer = None
+        if results_dir is not None:
+            self.results_writer = open_results_writer(results_dir)
+
+        # Clock used for all timing of the task
+        self.time_source = time_source
+
+        # Initialize the PyGame modules used by the application only
+        with self.startup_timer.measure('pygame_init'):
+            pygame.display.init()
+            pygame.font.init()
+
+        # Set screen size
+        self.screen_size = screen_size
+        with self.startup_timer.measure('display'):
+            self.set_display_mode(vsync)
+
+        # Pace the main loop
+        self.frame_scheduler = FrameScheduler(fps, idle_timeout)
+
+        # Wrap the parts of the main loop with measurements before they are
+        # registered as state handlers
+        self.profiler = None
+        if profile:
+            self.profiler = FrameProfiler(lambda: self.session.state)
+            self.profiler.instrument(self, ('frame', 'handle_events',
+                                            'update', 'show_sequence',
+                                            'draw_text', 'update_display'),
+                                     frame='frame')
+            self.frame_scheduler.get_events = self.profiler.count_events(
+                self.frame_scheduler.get_events)
+
+        # Fonts and images are loaded on first use
+        self.fonts = {size: LazyResource('font_{}'.format(size),
+                                         lambda size=size:
+                                         pygame.font.Font(None, size),
+                                         self.startup_timer)
+                      for size in (self.FONT_SIZE, self.FONT_SIZE_SMALL)}
+        self.assets = AssetManager(asset_dir)
+        self.images = {'instructions': LazyResource(
+            'instruction_image',
+            lambda: self.assets.image(INSTRUCTION_IMAGE, self.screen_size),
+            self.startup_timer)}
+
+        # Keep rendered text surfaces
+        self.text_cache = TextCache(TEXT_CACHE_SIZE)
+
+        # Set application title
+        pygame.display.set_caption("Corsi Block Tapping Test")
+
+        # Get screen handle
+        self.screen = pygame.display.get_surface()
+
+        # Declare interface for text input and collect its events, which are
+        # handed over once per frame
+        with self.startup_timer.measure('text_input'):
+            self.text_input = pygame_textinput.TextInput()
+        self.text_input_events = []
+
+        # Set if the text input was already updated in the current frame
+        self.text_input_updated = False
+
+        # Course of the experiment for the participant
+        self.session = Session(screen_size, box_parameters, start_delay,
+                               max_participants, max_trials, time_source,
+                               time_source_ns, self.results_writer,
+                               1.0 / fps if fps > 0 else 0.0)
+
+        # Register handlers of all states
+        machine = self.session.machine
+        machine.set_handlers(State.PARTICIPANT_ID,
+                             enter=self.text_input.clear_text,
+                             event=self.handle_id_input,
+                             frame=self.show_id_input)
+        machine.set_handlers(State.INSTRUCTIONS,
+                             event=self.handle_instructions_input,
+                             frame=self.show_instructions)
+        machine.set_handlers(State.SHOW_SEQUENCE, frame=self.show_sequence)
+        machine.set_handlers(State.USER_INPUT,
+                             event=self.handle_user_input,
+                             frame=self.show_sequence)
+        machine.set_handlers(State.FEEDBACK,
+                             event=self.handle_feedback_input,
+                             frame=self.show_feedback)
+        if self.profiler is not None:
+            machine.add_hook(self.profiler.transition)
+
+        # Load fonts and images and pre-render fixed messages in the
+        # background
+        self.warm_up_thread = None
+        if warm_up:
+            self.warm_up_thread = start_warm_up(
+                list(self.fonts.values()) + list(self.images.values()) +
+                [self.prerender_text], self.startup_timer)
+
+        self.startup_timer.milestone('initialized')
+
+    @property
+    def font(self):
+        return self.fonts[self.FONT_SIZE].get()
+
+    @property
+    def font_small(self):
+        return self.fonts[self.FONT_SIZE_SMALL].get()
+
+    @property
+    def instruction_image(self):
+        return self.images['instructions'].get()
+
+    def reset(self, seed=None):
+        """
+        Reset the application to the participant ID input to start a new
+        session. The text input is cleared when the state is entered.
+        :param seed: int | seed of the random box layouts of the new session,
+        None for a random seed
+        """
+
+        self.session.reset(seed)
+
+    def prerender_text(self):
+        """
+        Render all fixed messages into the text cache.
+        """
+
+        for text in self.MESSAGES:
+            self.text_cache.render(text, self.font, self.BLACK,
+                                   self.BACKGROUND_COLOR)
+        for text in self.MESSAGES_SMALL:
+            self.text_cache.render(text, self.font_small, self.BLACK,
+                                   self.BACKGROUND_COLOR)
+
+    def set_display_mode(self, vsync):
+        """
+        Open the application window. Synchronization with the monitor refresh
+        is only requested if enabled and falls back to a regular window if the
+        video driver does not support it.
+        :param vsync: bool | synchronize display updates with the monitor
+        """
+
+        size = (self.screen_size[0], self.screen_size[1])
+
+        if vsync:
+            try:
+                pygame.display.set_mode(size, SCALED, 32, vsync=1)
+                return
+            except (pygame.error, TypeError):
+                # VSync not available for this driver or PyGame version
+                pass
+
+        pygame.display.set_mode(size, 0, 32)
+
+    def start(self):
+        """
+        Start the application. This function contains the main PyGame event
+        loop.
+        """
+
+        first_frame = True
+
+        # Loop until execution is terminated in GUI
+        while True:
+            # Static screens are only redrawn upon events or after a timeout
+            idle = self.session.state in self.IDLE_STATES
+
+            self.frame(idle)
+
+            # Startup is complete once the first screen is shown
+            if first_frame:
+                self.startup_timer.milestone('first_frame')
+                first_frame = False
+
+            # Keep the frame rate
+            self.frame_scheduler.tick(idle)
+
+    def frame(self, idle=False, events=None, draw=True):
+        """
+        Run one iteration of the main loop.
+        :param idle: bool | wait for events if application is in static state
+        :param events: list of PyGame event objects to handle instead of the
+        event queue
+        :param draw: bool | draw the frame and show it on the screen. If
+        False, only the session is advanced, e.g. in simulations.
+        """
+
+        # Create blank screen
+        if draw:
+            self.screen.fill(self.BACKGROUND_COLOR)
+
+        # Handle events to set application state
+        self.handle_events(idle, events)
+
+        if not draw:
+            # Automatic transitions only, the frame handlers just draw
+            self.session.update()
+        else:
+            # Update application based on application state and
+            # automatic transitions between states
+            self.update()
+
+            # Draw profiling overlay on top
+            if self.profiler is not None:
+                self.profiler.draw_overlay(self.screen)
+
+            # Refresh screen
+            self.update_display()
+
+        # Record when scheduled stimulus changes reached the screen
+        self.session.sequence.presented(self.time_source())
+
+    def update_display(self):
+        """
+        Show the drawn frame on the screen.
+        """
+
+        pygame.display.update()
+
+    def handle_events(self, idle=False, events=None):
+        """
+        Handle all available events.
+        :param idle: bool | wait for events if application is in static state
+        :param events: list of PyGame event objects to handle instead of the
+        event queue
+        """
+
+        # Get list of events
+        if events is None:
+            events = self.frame_scheduler.get_events(idle)
+
+        # Iterate over all events
+        for event in events:
+
+            # Pressing ESC or clicking X
+            if event.type == QUIT or (event.type == KEYDOWN and
+                                      event.key == K_ESCAPE):
+                # Write results to CSV
+                if self.session.participant is not None:
+                    self.session.participant.write_csv()
+
+                # Write remaining records of the results stream and the
+                # recording of the session. Lost records are reported after
+                # the recording is saved.
+                if self.results_writer is not None:
+                    try:
+                        self.results_writer.close()
+                    finally:
+                        self.session.save_recording(
+                            self.results_writer.directory)
+
+                # Report achieved frame rate and text cache usage
+                print('Frame statistics:', self.frame_scheduler.report())
+                print('Text cache:', self.text_cache.stats())
+                print('Assets:', self.assets.stats())
+                print('Startup (ms):', self.startup_timer.report())
+                print('Stimulus timing errors (ms):',
+                      self.session.sequence.timing_report())
+                print('Layout prefetch:', self.session.layouts.stats())
+                print('Layout memory (bytes):',
+                      self.session.sequence.boxes.nbytes())
+                if self.profiler is not None:
+                    print('Profile (ms):', self.profiler.report())
+                    print('Profile written to', self.profiler.dump(
+                        self.results_writer.directory
+                        if self.results_writer is not None else '.'))
+                pygame.quit()
+                sys.exit()
+
+            # Show or hide the profiling overlay in any state
+            if self.profiler is not None and event.type == KEYDOWN and \
+                    event.key == self.OVERLAY_KEY:
+                self.profiler.toggle_overlay()
+                continue
+
+            # Call event handler of the current state
+            self.session.machine.event(event)
+
+    def handle_id_input(self, event):
+        """
+        Handles events in state Participant_ID.
+        :param event: PyGame event object
+        """
+
+        # Collect events for the text input interface
+        self.text_input_events.append(event)
+
+        # Check if valid participant ID provided. All input of this frame is
+        # applied before
+        if event.type == KEYDOWN and event.key == K_RETURN:
+            self.update_text_input()
+            if not self.session.submit_id(self.text_input.get_text()):
+                print(self.session.id_error)
+
+                # The ID input stays on the screen, which must not update
+                # the text input a second time in this frame
+                self.text_input_updated = True
+
+    def handle_instructions_input(self, event):
+        """
+        Handles events in state Instructions.
+        :param event: PyGame event object
+        """
+
+        # Go to next state upon pressing space bar and display
+        # participant ID in GUI
+        if event.type == KEYDOWN and event.key == K_SPACE:
+            pygame.display.set_caption(
+                "Corsi Block Tapping Test: Participant "
+                + str(self.session.participant.participant_id))
+
+            # Start the first trial
+            self.session.start()
+
+    def handle_user_input(self, event):
+        """
+        Handles events in state UserInput.
+        :param event: PyGame event object
+        """
+
+        if event.type == MOUSEBUTTONUP:
+            self.session.click(event.pos)
+
+    def handle_feedback_input(self, event):
+        """
+        Handles events in feedback state.
+        :param event: PyGame event object
+        """
+
+        # Start new trial or game by hitting space bar
+        if event.type == KEYDOWN and event.key == K_SPACE:
+            self.session.next_sequence()
+
+    def update(self):
+        """
+      Update visual appearance based on current state of the application. For
+      transitions that don't required a user input, this might result in a
+      change of the application state.
+      """
+
+        # Perform automatic transitions of the session (see
+        # self.session.update())
+        self.session.update()
+
+        # Call frame handler of the current state
+        self.session.machine.frame()
+
+    def show_sequence(self):
+        """
+        Show the boxes of the current sequence.
+        """
+
+        self.session.sequence.draw(self.screen)
+
+    def update_text_input(self):
+        """
+        Hand over the events collected since the last update to the text
+        input interface.
+        """
+
+        self.text_input.update(self.text_input_events)
+        self.text_input_events.clear()
+
+    def show_id_input(self):
+        """
+        Show input field for participant ID.
+        """
+
+        # Update text input interface once per frame, unless it was already
+        # updated to submit the participant ID
+        if self.text_input_updated:
+            self.text_input_updated = False
+        else:
+            self.update_text_input()
+
+        self.draw_text("Corsi Block Tapping Test", self.font, self.BLACK,
+                       self.BACKGROUND_COLOR, 150)
+        self.draw_text("Please enter your participant ID", self.font_small,
+                       self.BLACK,
+                       self.BACKGROUND_COLOR, SCREEN_SIZE[1] * .8)
+        self.screen.blit(self.text_input.get_surface(),
+                         (SCREEN_SIZE[0] * .5, SCREEN_SIZE[1] * .5))
+
+    def show_instructions(self):
+        """
+        Show instruction image, centered on the screen.
+        """
+
+        image = self.instruction_image
+        self.screen.blit(image, ((self.screen_size[0] - image.get_width()) // 2,
+                                 (self.screen_size[1] - image.get_height()) //
+                                 2))
+
+    def show_feedback(self):
+        """
+        Display feedback depending on the user input to the last sequence.
+        """
+
+        message, summary, feedback = self.session.feedback_text()
+
+        # Show message on the screen
+        self.draw_text(message, self.font, self.BLACK, self.BACKGROUND_COLOR,
+                       150)
+
+        # Show corsi span at the end of a trial
+        if summary is not None:
+            self.draw_text(summary, self.font_small, self.BLACK,
+                           self.BACKGROUND_COLOR, SCREEN_SIZE[1] * .4)
+
         # Show feedback on the screen
         self.draw_text(feedback, self.font_small, self.BLACK,
                        self.BACKGROUND_COLOR,
@@ -757,7 +1458,7 @@ class Application:
         :param bgcolor: background_color | RGB tuple
         :param ypos: y position of text
         """
-        text_surface = font.render(text, True, color, bgcolor)
+        text_surface = self.text_cache.render(text, font, color, bgcolor)
         text_rectangle = text_surface.get_rect()
         text_rectangle.center = (SCREEN_SIZE[0] / 2.0, ypos)
         self.screen.blit(text_surface, text_rectangle)
@@ -765,4 +1466,4 @@ class Application:
 
 if __name__ == '__main__':
     Application(SCREEN_SIZE, BOX_PARAMS, START_DELAY, MAX_PARTICIPANTS,
-                MAX_TRIALS).start()
+                MAX_TRIALS, FPS, VSYNC, IDLE_TIMEOUT).start()
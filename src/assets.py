@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Asset manager for images. Every image file is loaded once, converted to the
+pixel format of the display and pre-scaled to the resolution it is shown at,
+so blitting it needs neither a format conversion nor scaling.
+"""
+
+import os
+import threading
+
+import pygame
+
+
+class AssetManager:
+
+    def __init__(self, directory):
+        """
+        Asset manager class. Caches prepared surfaces keyed by path and
+        resolution.
+        :param directory: string | directory of the asset files
+        """
+
+        self.directory = directory
+
+        # Prepared surfaces keyed by (path, size)
+        self.surfaces = {}
+
+        # Assets may be loaded by a warm-up thread
+        self.lock = threading.Lock()
+
+        # Counters for cache performance
+        self.loads = 0
+        self.hits = 0
+
+    def path(self, name):
+        """
+        Path of an asset file.
+        :param name: string | file name relative to the asset directory or
+        absolute path
+        """
+
+        return os.path.join(self.directory, name)
+
+    def image(self, name, size=None):
+        """
+        Get an image in display format.
+        :param name: string | file name relative to the asset directory or
+        absolute path
+        :param size: tuple (int, int) | (width, height) of the area the image
+        is shown in. The image is scaled to fit this area with unchanged
+        aspect ratio. None to keep the original size.
+        :return: PyGame surface object
+        """
+
+        key = (self.path(name), None if size is None else tuple(size))
+
+        with self.lock:
+            surface = self.surfaces.get(key)
+            if surface is not None:
+                self.hits += 1
+                return surface
+
+            surface = self.prepare(pygame.image.load(key[0]), size)
+            self.surfaces[key] = surface
+            self.loads += 1
+
+        return surface
+
+    @staticmethod
+    def prepare(surface, size=None):
+        """
+        Scale a surface and convert it to the display format.
+        :param surface: PyGame surface object
+        :param size: tuple (int, int) | (width, height) to fit the surface
+        into or None
+        :return: PyGame surface object
+        """
+
+        if size is not None and surface.get_size() != tuple(size):
+            width, height = surface.get_size()
+            scale = min(size[0] / width, size[1] / height)
+            surface = pygame.transform.smoothscale(
+                surface, (max(int(round(width * scale)), 1),
+                          max(int(round(height * scale)), 1)))
+
+        # Conversion needs a display mode
+        if pygame.display.get_init() and pygame.display.get_surface():
+            if surface.get_flags() & pygame.SRCALPHA:
+                surface = surface.convert_alpha()
+            else:
+                surface = surface.convert()
+
+        return surface
+
+    def clear(self):
+        """
+        Remove all cached surfaces, e.g. after the display mode changed.
+        """
+
+        with self.lock:
+            self.surfaces.clear()
+
+    def stats(self):
+        """
+        Get the memory footprint of the cached surfaces.
+        :return: dict with number of surfaces, loads, cache hits and size of
+        the pixel data in bytes
+        """
+
+        with self.lock:
+            surfaces = list(self.surfaces.values())
+
+        return {'surfaces': len(surfaces), 'loads': self.loads,
+                'hits': self.hits,
+                'bytes': sum(surface.get_pitch() * surface.get_height()
+                             for surface in surfaces)}
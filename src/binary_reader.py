@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+Memory-mapped reader of the binary results files (see results_binary.py).
+The records of a file are exposed as a NumPy structured array that points
+directly into the mapped file, so scanning all results is a single mmap and
+vectorized reductions over the columns. Also converts between the binary
+files and the corsi.csv layout written by Participant.write_csv.
+
+Usage:
+    python binary_reader.py summary results/
+    python binary_reader.py from-csv corsi.csv results/
+    python binary_reader.py to-csv results/ corsi.csv
+"""
+
+import argparse
+import ast
+import csv
+import json
+import mmap
+import os
+
+import numpy as np
+
+from cohort_stats import span_statistics
+from results_binary import FORMATS, HEADER, RECORDS, SCALES, \
+    BinaryJournals, binary_path, check_header
+
+
+def parse_spans(text):
+    """
+    Parse the list of corsi spans as written by Participant.write_csv.
+    :param text: string | Python representation of the list, e.g. [3, 4]
+    :return: list of int
+    """
+
+    # Lists of integers are valid JSON, which parses several times faster
+    # than Python literals
+    try:
+        return json.loads(text)
+    except ValueError:
+        return ast.literal_eval(text)
+
+
+def record_dtype(table):
+    """
+    NumPy type of the records of a table, identical to their binary layout.
+    :param table: string | name of the table
+    :return: NumPy dtype object
+    """
+
+    return np.dtype([(column, '<' + code) for column, code in FORMATS[table]])
+
+
+def column_values(records, column):
+    """
+    Values of a column of records. Columns stored as scaled integers are
+    converted back.
+    :param records: NumPy structured array or record of a table
+    :param column: string | name of the column
+    :return: array or scalar
+    """
+
+    if column in SCALES:
+        return records[column] / SCALES[column]
+    return records[column]
+
+
+class RecordFile:
+
+    def __init__(self, path, table):
+        """
+        Record file class. Maps a binary file read-only into memory. Records
+        appended later are not visible.
+        :param path: string | path of the binary file
+        :param table: string | name of the table
+        :raise ValueError: if the file is not a binary file of the table
+        """
+
+        self.path = path
+        self.table = table
+
+        with open(path, 'rb') as binary:
+            size = os.fstat(binary.fileno()).st_size
+            check_header(path, table, binary.read(HEADER.size))
+
+            # Empty files cannot be mapped
+            self.map = mmap.mmap(binary.fileno(), 0, access=mmap.ACCESS_READ) \
+                if size > HEADER.size else None
+
+        # Records left incomplete by a crash are ignored
+        count = (size - HEADER.size) // RECORDS[table].size
+        self.records = np.frombuffer(
+            self.map, record_dtype(table), count, HEADER.size) \
+            if self.map is not None else np.empty(0, record_dtype(table))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """
+        Unmap the file. If views of the records are still in use, the file
+        stays mapped until the last of them is gone.
+        """
+
+        self.records = None
+        if self.map is not None:
+            try:
+                self.map.close()
+            except BufferError:
+                pass
+            self.map = None
+
+
+def open_table(directory, table):
+    """
+    Map the binary file of a table.
+    :param directory: string | directory of the results files
+    :param table: string | name of the table
+    :return: RecordFile object
+    """
+
+    return RecordFile(binary_path(directory, table), table)
+
+
+def summarize(values, groups=None):
+    """
+    Count, mean, population standard deviation and histogram of integer
+    values, in the format of RunningStats.summary.
+    :param values: integer array
+    :param groups: integer array of the same length to summarize each group
+    separately, None for a single summary
+    :return: dict, or dict of dicts by group
+    """
+
+    if groups is not None:
+        return {int(group): summarize(values[groups == group])
+                for group in np.unique(groups)}
+
+    if len(values) == 0:
+        return {'count': 0, 'mean': 0.0, 'std': 0.0, 'histogram': {}}
+
+    histogram = np.bincount(values)
+    return {'count': int(len(values)), 'mean': round(float(values.mean()), 3),
+            'std': round(float(values.std()), 3),
+            'histogram': {int(value): int(histogram[value])
+                          for value in np.flatnonzero(histogram)}}
+
+
+def span_summary(directory):
+    """
+    Statistics of the corsi spans of all trials.
+    :param directory: string | directory of the results files
+    :return: dict with overall and per trial statistics
+    """
+
+    with open_table(directory, 'trials') as trials:
+        spans = trials.records['corsi_span']
+        return {'participants': int(len(np.unique(
+                    trials.records['participant_id']))),
+                'overall': summarize(spans),
+                'by_trial': summarize(spans, trials.records['trial'])}
+
+
+def csv_to_binary(csv_path, directory):
+    """
+    Append the participants of a corsi.csv file to the binary files. Seeds
+    and timestamps are not part of corsi.csv and are stored as 0 and NaN.
+    :param csv_path: string | path of the corsi.csv file
+    :param directory: string | directory of the binary files
+    :return: int | number of converted participants
+    """
+
+    participants, trials = [], []
+    with open(csv_path, newline='') as results_file:
+        for row in csv.reader(results_file):
+            if not row:
+                continue
+            participant_id, spans = int(row[0]), parse_spans(row[1])
+            participants.append([participant_id, 0, None])
+
+            # Mean and standard deviation after each trial, as written to
+            # the trials table by the task. The last ones are stored in
+            # corsi.csv.
+            for trial in range(1, len(spans) + 1):
+                mean, std = span_statistics(spans[:trial]) \
+                    if trial < len(spans) else (float(row[2]), float(row[3]))
+                trials.append([participant_id, trial, spans[trial - 1], mean,
+                               std, None])
+
+    journals = BinaryJournals(directory)
+    journals.open({table: [column for column, _ in FORMATS[table]]
+                   for table in ('participants', 'trials')})
+    try:
+        journals.write('participants', participants)
+        journals.write('trials', trials)
+    finally:
+        journals.close()
+
+    return len(participants)
+
+
+def binary_to_csv(directory, csv_path):
+    """
+    Append the results of all participants in the binary files to a file in
+    the corsi.csv layout: participant ID, corsi spans, mean and standard
+    deviation after the last trial.
+    :param directory: string | directory of the binary files
+    :param csv_path: string | path of the corsi.csv file
+    :return: int | number of converted participants
+    """
+
+    rows = []
+    with open_table(directory, 'trials') as trials:
+        records = trials.records
+        participant_ids = records['participant_id']
+
+        # Sort trials by participant and trial and find the first trial of
+        # each participant
+        order = np.lexsort((records['trial'], participant_ids))
+        sorted_ids = participant_ids[order]
+        starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+        ends = np.append(starts[1:], len(order))
+        spans = records['corsi_span'][order]
+
+        # Participants are written in the order of their first record
+        first = np.minimum.reduceat(order, starts) if len(order) else []
+        for group in np.argsort(first, kind='stable'):
+            start, end = starts[group], ends[group]
+            last = records[order[end - 1]]
+            rows.append([int(last['participant_id']),
+                         spans[start:end].tolist(),
+                         float(column_values(last, 'mean_corsi_span')),
+                         float(column_values(last, 'std_corsi_span'))])
+
+    with open(csv_path, 'a', newline='') as results_file:
+        csv.writer(results_file).writerows(rows)
+
+    return len(rows)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Read and convert binary results files.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    summary_parser = commands.add_parser(
+        'summary', help='statistics of the corsi spans of all trials')
+    summary_parser.add_argument('directory', help='results directory')
+    from_parser = commands.add_parser(
+        'from-csv', help='append a corsi.csv file to the binary files')
+    from_parser.add_argument('csv_path', help='corsi.csv file')
+    from_parser.add_argument('directory', help='results directory')
+    to_parser = commands.add_parser(
+        'to-csv', help='append all participants to a corsi.csv file')
+    to_parser.add_argument('directory', help='results directory')
+    to_parser.add_argument('csv_path', help='corsi.csv file')
+    args = parser.parse_args()
+
+    if args.command == 'summary':
+        print(json.dumps(span_summary(args.directory), indent=2))
+    elif args.command == 'from-csv':
+        print('{} participants converted'.format(
+            csv_to_binary(args.csv_path, args.directory)))
+    else:
+        print('{} participants converted'.format(
+            binary_to_csv(args.directory, args.csv_path)))
@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Compact board of boxes. Box centers and sizes are stored in typed arrays and
+the box flags (highlighted, clicked, correct) as bits in a bytearray, so a
+layout needs a few bytes per box instead of several Python objects. Flags of
+all boxes are cleared in a single bytearray.translate call. Existing code
+accesses single boxes through lightweight BoxView objects. Screen rectangles
+are computed once and kept until a box is moved or resized.
+"""
+
+import sys
+from array import array
+
+import pygame
+
+# Box flags, stored as bits of one byte per box
+HIGHLIGHT, CLICKED, CORRECT = 1, 2, 4
+
+
+def clear_table(flag):
+    """
+    Translation table that clears a flag in every byte.
+    :param flag: int | bits to clear
+    :return: bytes of length 256
+    """
+
+    return bytes(value & ~flag for value in range(256))
+
+
+def test_table(flag):
+    """
+    Translation table that maps every byte to 1 if a flag is set, else 0.
+    :param flag: int | bits to test
+    :return: bytes of length 256
+    """
+
+    return bytes(1 if value & flag else 0 for value in range(256))
+
+
+# Translation tables keyed by table function and flag, created on first use
+_tables = {}
+
+
+def translation_table(function, flag):
+    """
+    Get a cached translation table.
+    :param function: clear_table or test_table
+    :param flag: int | flag bits
+    :return: bytes of length 256
+    """
+
+    table = _tables.get((function, flag))
+    if table is None:
+        table = _tables[(function, flag)] = function(flag)
+    return table
+
+
+class BoxView:
+
+    # Declare colors as static member variables of box class
+    RED, GREEN = (255, 0, 0), (0, 255, 0)
+    BLUE, YELLOW = (0, 0, 255), (255, 255, 0)
+
+    # Pre-filled box surfaces shared by all boxes, keyed by (size, color)
+    surface_cache = {}
+
+    __slots__ = ('board', 'index')
+
+    @classmethod
+    def get_surface(cls, size, color):
+        """
+        Get a surface of given size filled with given color. Surfaces are
+        only created once and reused for all boxes.
+        :param size: int | side length of rectangular box
+        :param color: tuple (int, int, int) | RGB color of the box
+        :return: PyGame surface object
+        """
+
+        key = (size, color)
+        surface = cls.surface_cache.get(key)
+
+        if surface is None:
+            # Create and fill surface on first use
+            surface = pygame.Surface((size, size))
+            surface.fill(color)
+            cls.surface_cache[key] = surface
+
+        return surface
+
+    @classmethod
+    def flag_color(cls, flags):
+        """
+        Box color for a combination of flags.
+        :param flags: int | flag bits of the box
+        :return: tuple (int, int, int) | RGB color
+        """
+
+        # Highlighted box will be displayed in yellow
+        if flags & HIGHLIGHT:
+            return cls.YELLOW
+
+        # Clicked box will be displayed in green if correct and red if false
+        elif flags & CLICKED:
+            return cls.GREEN if flags & CORRECT else cls.RED
+
+        # Box without flags will be displayed in blue
+        else:
+            return cls.BLUE
+
+    def __init__(self, board, index):
+        """
+        Box view class. Reads and writes the attributes of one box of a board.
+        Views are created on access and hold no state of their own.
+        :param board: Board object
+        :param index: int | index of the box on the board
+        """
+
+        self.board = board
+        self.index = index
+
+    @property
+    def pos(self):
+        return self.board.xs[self.index], self.board.ys[self.index]
+
+    @pos.setter
+    def pos(self, pos):
+        self.board.set_pos(self.index, pos)
+
+    @property
+    def size(self):
+        return self.board.sizes[self.index]
+
+    @size.setter
+    def size(self, size):
+        self.board.set_size(self.index, size)
+
+    @property
+    def rect(self):
+        return self.board.rect(self.index)
+
+    @property
+    def highlight(self):
+        return self.board.get_flag(self.index, HIGHLIGHT)
+
+    @highlight.setter
+    def highlight(self, value):
+        self.board.set_flag(self.index, HIGHLIGHT, value)
+
+    @property
+    def clicked(self):
+        return self.board.get_flag(self.index, CLICKED)
+
+    @clicked.setter
+    def clicked(self, value):
+        self.board.set_flag(self.index, CLICKED, value)
+
+    @property
+    def correct(self):
+        return self.board.get_flag(self.index, CORRECT)
+
+    @correct.setter
+    def correct(self, value):
+        self.board.set_flag(self.index, CORRECT, value)
+
+    def get_color(self):
+        """
+        Set box color based on flags.
+        """
+
+        return self.flag_color(self.board.flags[self.index])
+
+    def draw(self, screen):
+        """
+        Draw box on screen
+        :param screen: PyGame screen object
+        """
+
+        screen.blit(self.get_surface(self.size, self.get_color()), self.rect)
+
+
+class Board:
+
+    def __init__(self, positions=(), size=0):
+        """
+        Board class. Holds all boxes of a layout in contiguous arrays.
+        :param positions: list of box centers (int, int)
+        :param size: int | side length of the boxes
+        """
+
+        self.xs = array('i', [pos[0] for pos in positions])
+        self.ys = array('i', [pos[1] for pos in positions])
+        self.sizes = array('i', [size]) * len(self.xs)
+        self.flags = bytearray(len(self.xs))
+
+        # Screen rectangles of all boxes, computed on first access
+        self._rects = None
+
+    def __len__(self):
+        return len(self.flags)
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError('box index out of range')
+        return BoxView(self, index % len(self))
+
+    def __iter__(self):
+        return (BoxView(self, i) for i in range(len(self)))
+
+    def positions(self):
+        """
+        Centers of all boxes.
+        :return: list of box centers (int, int)
+        """
+
+        return list(zip(self.xs, self.ys))
+
+    def set_pos(self, index, pos):
+        """
+        Move a box.
+        :param index: int | index of the box
+        :param pos: tuple (int, int) | new center of the box
+        """
+
+        self.xs[index], self.ys[index] = pos
+        self._rects = None
+
+    def set_size(self, index, size):
+        """
+        Resize a box.
+        :param index: int | index of the box
+        :param size: int | new side length of the box
+        """
+
+        self.sizes[index] = size
+        self._rects = None
+
+    def rect(self, index):
+        """
+        Screen rectangle of a box.
+        :param index: int | index of the box
+        :return: PyGame rect object, shared until the box is moved or resized
+        """
+
+        return self.rects()[index]
+
+    def rects(self):
+        """
+        Screen rectangles of all boxes. Computed once and kept until a box is
+        moved or resized.
+        :return: list of PyGame rect objects
+        """
+
+        if self._rects is None:
+            self._rects = [pygame.Rect(x - size // 2, y - size // 2, size,
+                                       size)
+                           for x, y, size in zip(self.xs, self.ys,
+                                                 self.sizes)]
+        return self._rects
+
+    def get_flag(self, index, flag):
+        """
+        Read a flag of a box.
+        :param index: int | index of the box
+        :param flag: int | HIGHLIGHT, CLICKED or CORRECT
+        :return: bool
+        """
+
+        return bool(self.flags[index] & flag)
+
+    def set_flag(self, index, flag, value=True):
+        """
+        Set or clear a flag of a box.
+        :param index: int | index of the box
+        :param flag: int | HIGHLIGHT, CLICKED or CORRECT
+        :param value: bool | new value of the flag
+        """
+
+        if value:
+            self.flags[index] |= flag
+        else:
+            self.flags[index] &= ~flag
+
+    def clear_flag(self, flag):
+        """
+        Clear a flag of all boxes with a single translate of the flag bytes.
+        :param flag: int | HIGHLIGHT, CLICKED or CORRECT, or several of them
+        combined
+        """
+
+        self.flags[:] = self.flags.translate(
+            translation_table(clear_table, flag))
+
+    def find_flag(self, flag):
+        """
+        Find the first box with a flag set.
+        :param flag: int | HIGHLIGHT, CLICKED or CORRECT
+        :return: int | index of the box, -1 if no box has the flag
+        """
+
+        return self.flags.translate(translation_table(test_table, flag)).find(1)
+
+    def draw(self, screen):
+        """
+        Draw all boxes with a single blits call.
+        :param screen: PyGame screen object
+        """
+
+        get_surface, flag_color = BoxView.get_surface, BoxView.flag_color
+        screen.blits([(get_surface(size, flag_color(flags)),
+                       (x - size // 2, y - size // 2))
+                      for x, y, size, flags in zip(self.xs, self.ys,
+                                                   self.sizes, self.flags)],
+                     False)
+
+    def nbytes(self):
+        """
+        Memory footprint of the board.
+        :return: int | size of the board object and its arrays in bytes
+        """
+
+        rects = self._rects or []
+        return sys.getsizeof(self) + sys.getsizeof(self.__dict__) + sum(
+            sys.getsizeof(values)
+            for values in (self.xs, self.ys, self.sizes, self.flags,
+                           rects, *rects))
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Uniform-grid spatial index of box rectangles for hit-testing clicks. Every
+grid cell lists the boxes overlapping it, so finding the box under a point
+only tests the few boxes of one cell, independent of the number of boxes.
+"""
+
+
+class BoxIndex:
+
+    def __init__(self, rects, cell_size):
+        """
+        Box index class. Built once per layout.
+        :param rects: list of PyGame rect objects of the boxes
+        :param cell_size: int | side length of the grid cells in pixels. The
+        box size gives at most four cells per box.
+        """
+
+        self.rects = rects
+        self.cell_size = max(int(cell_size), 1)
+
+        # Indices of the boxes overlapping each cell, keyed by cell
+        # coordinates. Boxes are listed in increasing order.
+        self.cells = {}
+        for i, rect in enumerate(rects):
+            for cx in range(rect.left // self.cell_size,
+                            (rect.right - 1) // self.cell_size + 1):
+                for cy in range(rect.top // self.cell_size,
+                                (rect.bottom - 1) // self.cell_size + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    def find(self, pos):
+        """
+        Find the box at a position.
+        :param pos: tuple (int, int) | position on screen
+        :return: int | index of the first box containing the position, -1 if
+        there is none
+        """
+
+        candidates = self.cells.get((pos[0] // self.cell_size,
+                                     pos[1] // self.cell_size))
+        if candidates:
+            for i in candidates:
+                if self.rects[i].collidepoint(pos):
+                    return i
+
+        return -1
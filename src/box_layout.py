@@ -0,0 +1,252 @@
+# -*- coding: utf-8 -*-
+"""
+Generation of random box layouts with a minimum distance between the box
+centers. Collisions are checked on a background grid, so each candidate is
+only compared to its neighbors. The number of samples is bounded: sparse
+layouts are drawn by dart throwing, dense layouts fall back to Poisson-disk
+sampling (Bridson's algorithm), which always terminates.
+"""
+
+import random
+from math import ceil, cos, pi, sin, sqrt
+
+
+def max_boxes(screen_size, min_dist, margin):
+    """
+    Upper bound for the number of box centers with pairwise distance of at
+    least min_dist that fit into the screen without the margins.
+    :param screen_size: tuple (int, int) | width and height of application
+    :param min_dist: float | minimum distance between two box centers
+    :param margin: float | free margin at the borders of the screen
+    :return: int | maximum number of boxes
+    """
+
+    width = screen_size[0] - 2 * margin
+    height = screen_size[1] - 2 * margin
+
+    if width < 0 or height < 0:
+        return 0
+
+    if min_dist <= 0:
+        return (int(width) + 1) * (int(height) + 1)
+
+    # Packing bound for circles of diameter min_dist in a rectangle
+    return int(2.0 / sqrt(3.0) * width * height / min_dist ** 2
+               + (width + height) / min_dist + 1)
+
+
+def check_feasibility(screen_size, n_boxes, min_dist, margin):
+    """
+    Check that the requested number of boxes can be placed on the screen.
+    :param screen_size: tuple (int, int) | width and height of application
+    :param n_boxes: int | number of boxes
+    :param min_dist: float | minimum distance between two box centers
+    :param margin: float | free margin at the borders of the screen
+    :raise ValueError: if the box parameters are geometrically infeasible
+    """
+
+    if 2 * margin > min(screen_size):
+        raise ValueError("Margin of {} px leaves no space for boxes on a "
+                         "screen of size {}".format(margin, screen_size))
+
+    upper_bound = max_boxes(screen_size, min_dist, margin)
+    if n_boxes > upper_bound:
+        raise ValueError("Cannot place {} boxes with a minimum distance of {} "
+                         "px on a screen of size {} with a margin of {} px. "
+                         "At most {} boxes fit.".format(n_boxes, min_dist,
+                                                        screen_size, margin,
+                                                        upper_bound))
+
+
+class PointGrid:
+
+    def __init__(self, screen_size, min_dist, margin):
+        """
+        Background grid over the area in which box centers can be placed. The
+        cells are small enough to hold at most one point, so only the
+        neighboring cells have to be searched for collisions.
+        :param screen_size: tuple (int, int) | width and height of application
+        :param min_dist: float | minimum distance between two points
+        :param margin: float | free margin at the borders of the screen
+        """
+
+        # Bounds of the area in which box centers can be placed
+        self.x_min = self.y_min = int(ceil(margin))
+        self.x_max = int(screen_size[0] - margin)
+        self.y_max = int(screen_size[1] - margin)
+
+        self.min_dist_sq = min_dist ** 2
+        self.cell_size = max(min_dist / sqrt(2.0), 1.0)
+        self.n_cols = int((self.x_max - self.x_min) / self.cell_size) + 1
+        self.n_rows = int((self.y_max - self.y_min) / self.cell_size) + 1
+        self.cells = [None] * (self.n_cols * self.n_rows)
+
+        # Accepted points in order of insertion
+        self.points = []
+
+    def random_point(self, rng):
+        """
+        Sample a uniformly distributed point inside the area.
+        :param rng: random number generator
+        :return: point (int, int)
+        """
+
+        return (rng.randint(self.x_min, self.x_max),
+                rng.randint(self.y_min, self.y_max))
+
+    def cell(self, point):
+        return (int((point[0] - self.x_min) / self.cell_size),
+                int((point[1] - self.y_min) / self.cell_size))
+
+    def fits(self, point):
+        """
+        Check if a point lies inside the area and keeps the minimum distance
+        to all accepted points.
+        :param point: tuple (int, int) | candidate point
+        :return: Flag that indicates if the point can be accepted
+        """
+
+        if not (self.x_min <= point[0] <= self.x_max and
+                self.y_min <= point[1] <= self.y_max):
+            return False
+
+        # Only points in the neighboring cells can be closer than min_dist
+        col, row = self.cell(point)
+        n_cols = self.n_cols
+        for r in range(max(row - 2, 0), min(row + 3, self.n_rows)):
+            for c in range(max(col - 2, 0), min(col + 3, n_cols)):
+                other = self.cells[r * n_cols + c]
+                if other is not None:
+                    dx = point[0] - other[0]
+                    dy = point[1] - other[1]
+                    if dx * dx + dy * dy < self.min_dist_sq:
+                        return False
+        return True
+
+    def add(self, point):
+        """
+        Accept a point.
+        :param point: tuple (int, int) | point that fits into the grid
+        """
+
+        col, row = self.cell(point)
+        self.cells[row * self.n_cols + col] = point
+        self.points.append(point)
+
+
+def dart_throwing(screen_size, n_boxes, min_dist, margin, rng=random,
+                  tries_per_box=30):
+    """
+    Sample uniformly distributed points and keep those that fit, with a
+    bounded number of samples.
+    :param screen_size: tuple (int, int) | width and height of application
+    :param n_boxes: int | number of points
+    :param min_dist: float | minimum distance between two points
+    :param margin: float | free margin at the borders of the screen
+    :param rng: random number generator (random module or random.Random)
+    :param tries_per_box: int | average number of samples allowed per point
+    :return: list of points (int, int) or None if sample budget exceeded
+    """
+
+    grid = PointGrid(screen_size, min_dist, margin)
+
+    for _ in range(tries_per_box * n_boxes):
+        point = grid.random_point(rng)
+        if grid.fits(point):
+            grid.add(point)
+            if len(grid.points) == n_boxes:
+                return grid.points
+
+    return None
+
+
+def poisson_disk_sample(screen_size, min_dist, margin, rng=random,
+                        candidates=30):
+    """
+    Generate a maximal set of integer points with pairwise distance of at
+    least min_dist inside the screen without the margins (Bridson's
+    algorithm).
+    :param screen_size: tuple (int, int) | width and height of application
+    :param min_dist: float | minimum distance between two points
+    :param margin: float | free margin at the borders of the screen
+    :param rng: random number generator (random module or random.Random)
+    :param candidates: int | number of candidates tried around each point
+    :return: list of points (int, int)
+    """
+
+    grid = PointGrid(screen_size, min_dist, margin)
+
+    first = grid.random_point(rng)
+    grid.add(first)
+    active = [first]
+
+    # Grow the sample around active points until no point fits anymore
+    while active:
+        index = rng.randrange(len(active))
+        center = active[index]
+
+        for _ in range(candidates):
+            # Sample candidate in the annulus between min_dist and 2 min_dist
+            angle = 2 * pi * rng.random()
+            radius = min_dist * (1 + rng.random())
+            candidate = (int(round(center[0] + radius * cos(angle))),
+                         int(round(center[1] + radius * sin(angle))))
+
+            if grid.fits(candidate):
+                grid.add(candidate)
+                active.append(candidate)
+                break
+        else:
+            # No candidate fits around this point, remove it from active list
+            active[index] = active[-1]
+            active.pop()
+
+    return grid.points
+
+
+def generate_layout(screen_size, n_boxes, min_dist, margin, rng=random,
+                    max_restarts=10, stats=None):
+    """
+    Generate random box centers with a minimum distance between each other.
+    Sparse layouts are sampled uniformly. If that exceeds its sample budget,
+    a random subset of a maximal Poisson-disk sample is used instead.
+    :param screen_size: tuple (int, int) | width and height of application
+    :param n_boxes: int | number of boxes
+    :param min_dist: float | minimum distance between two box centers
+    :param margin: float | free margin at the borders of the screen
+    :param rng: random number generator (random module or random.Random)
+    :param max_restarts: int | number of Poisson-disk samples drawn before
+    giving up
+    :param stats: dict | receives the number of Poisson-disk samples drawn
+    as 'restarts', None to skip
+    :return: list of box centers (int, int)
+    :raise ValueError: if the boxes cannot be placed
+    """
+
+    # Fail fast for impossible configurations
+    check_feasibility(screen_size, n_boxes, min_dist, margin)
+    if stats is not None:
+        stats['restarts'] = 0
+
+    positions = dart_throwing(screen_size, n_boxes, min_dist, margin, rng)
+    if positions is not None:
+        return positions
+
+    most_points = 0
+    for _ in range(max_restarts):
+        points = poisson_disk_sample(screen_size, min_dist, margin, rng)
+        if stats is not None:
+            stats['restarts'] += 1
+
+        # Pick a random subset of the maximal sample
+        if len(points) >= n_boxes:
+            return rng.sample(points, n_boxes)
+
+        most_points = max(most_points, len(points))
+
+    raise ValueError("Could not place {} boxes with a minimum distance of {} "
+                     "px on a screen of size {} with a margin of {} px within "
+                     "{} attempts (at most {} boxes placed). Reduce the "
+                     "number of boxes or their distance.".format(
+                         n_boxes, min_dist, screen_size, margin, max_restarts,
+                         most_points))
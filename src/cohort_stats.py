@@ -0,0 +1,323 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming cohort statistics over the trial results journal (corsi_trials.csv)
+written by the results writer. The journal is the canonical results file: it
+holds a row for every trial of every participant as soon as the trial ends,
+while corsi.csv only receives the participant of the session that is quit.
+The file is read incrementally in constant memory: each update only parses
+the rows appended since the last one. Large files can be split into byte
+ranges that are aggregated in parallel.
+
+Usage:
+    python cohort_stats.py --workers 4
+    python cohort_stats.py corsi_trials.csv --follow 10
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+from collections import Counter, defaultdict
+from math import sqrt
+from time import sleep
+
+from results_writer import journal_path
+
+# Name of the trial results journal
+RESULTS_FILE = journal_path('', 'trials')
+
+
+def span_statistics(spans):
+    """
+    Mean and population standard deviation of the corsi spans of a
+    participant, rounded to two decimals as stored in the results.
+    :param spans: list of int | corsi spans of all trials
+    :return: tuple (float, float) | mean and standard deviation
+    """
+
+    mean = round(sum(spans) / len(spans), 2)
+    std = round(sqrt(sum((xi - mean) ** 2 for xi in spans) / len(spans)), 2)
+    return mean, std
+
+
+def read_rows(journal, end=None):
+    """
+    Read the complete rows of an open journal from its current position.
+    :param journal: file object opened in binary mode
+    :param end: int | byte offset at which no further row is read, None to
+    read up to the end of the file
+    :return: generator of tuples (int, list of strings) | byte offset behind
+    the row and values of the columns
+    """
+
+    position = journal.tell()
+    while end is None or position < end:
+        line = journal.readline()
+        # Leave incomplete last line for the next update
+        if not line.endswith(b'\n'):
+            break
+        position += len(line)
+        if line.strip():
+            yield position, next(csv.reader([line.decode()]))
+
+
+class RunningStats:
+
+    def __init__(self):
+        """
+        Running mean, variance and histogram of a series of values (Welford's
+        online algorithm).
+        """
+
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.histogram = Counter()
+
+    def add(self, value):
+        """
+        Add a value.
+        :param value: int | value to be added, e.g. a corsi span
+        """
+
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.histogram[value] += 1
+
+    def merge(self, other):
+        """
+        Add all values of another RunningStats object (Chan's parallel
+        algorithm).
+        :param other: RunningStats object
+        """
+
+        count = self.count + other.count
+        if count == 0:
+            return
+
+        delta = other.mean - self.mean
+        self.mean += delta * other.count / count
+        self.m2 += other.m2 + delta ** 2 * self.count * other.count / count
+        self.count = count
+        self.histogram.update(other.histogram)
+
+    @property
+    def std(self):
+        """
+        Population standard deviation, as in Participant.update_statistics.
+        """
+
+        return sqrt(self.m2 / self.count) if self.count else 0.0
+
+    def summary(self):
+        return {'count': self.count, 'mean': round(self.mean, 3),
+                'std': round(self.std, 3),
+                'histogram': dict(sorted(self.histogram.items()))}
+
+
+class CohortStatistics:
+
+    def __init__(self, path, condition='trial', value='corsi_span'):
+        """
+        Statistics of a results column over all rows of a journal file,
+        overall and per condition.
+        :param path: string | path of the journal file
+        :param condition: string | column to group the rows by
+        :param value: string | column with the values to aggregate
+        """
+
+        self.path = path
+        self.condition = condition
+        self.value = value
+        self.reset()
+
+    def reset(self):
+        """
+        Forget all rows read so far.
+        """
+
+        self.overall = RunningStats()
+        self.by_condition = defaultdict(RunningStats)
+
+        # Byte offset of the first row not yet read and column names
+        self.offset = 0
+        self.columns = None
+
+    def add_row(self, row):
+        """
+        Add a parsed row to the statistics.
+        :param row: list of strings | values of the columns
+        """
+
+        record = dict(zip(self.columns, row))
+        self.add(record[self.condition], int(float(record[self.value])))
+
+    def add(self, condition, value):
+        """
+        Add a value to the statistics.
+        :param condition: string | condition of the value
+        :param value: int | value to be added
+        """
+
+        self.overall.add(value)
+        self.by_condition[condition].add(value)
+
+    def merge(self, other):
+        """
+        Add the statistics of another CohortStatistics object.
+        """
+
+        self.overall.merge(other.overall)
+        for condition, stats in other.by_condition.items():
+            self.by_condition[condition].merge(stats)
+
+    def read_header(self, journal):
+        """
+        Read the column names from the first line of an open journal.
+        :return: bool | True if a complete header was read
+        """
+
+        line = journal.readline()
+        if not line.endswith(b'\n'):
+            return False
+
+        self.columns = next(csv.reader([line.decode()]))
+        self.offset = len(line)
+        return True
+
+    def update(self):
+        """
+        Read all complete rows appended since the last update.
+        :return: int | number of new rows
+        """
+
+        if not os.path.exists(self.path):
+            return 0
+
+        # Start over if the file was replaced by a shorter one
+        if os.path.getsize(self.path) < self.offset:
+            self.reset()
+
+        rows = 0
+        with open(self.path, 'rb') as journal:
+            journal.seek(self.offset)
+            if self.columns is None and not self.read_header(journal):
+                return 0
+
+            for offset, row in read_rows(journal):
+                self.offset = offset
+                self.add_row(row)
+                rows += 1
+
+        return rows
+
+    def summary(self):
+        return {'overall': self.overall.summary(),
+                'by_' + self.condition: {
+                    condition: stats.summary() for condition, stats in
+                    sorted(self.by_condition.items())}}
+
+
+def aggregate_range(path, columns, start, end, condition, value):
+    """
+    Aggregate all rows starting within a byte range of a journal file.
+    :return: CohortStatistics object with the partial statistics
+    """
+
+    stats = CohortStatistics(path, condition, value)
+    stats.columns = columns
+
+    with open(path, 'rb') as journal:
+        # Skip to the beginning of the first row starting in the range
+        journal.seek(start - 1)
+        journal.readline()
+
+        for _, row in read_rows(journal, end):
+            stats.add_row(row)
+
+    return stats
+
+
+def complete_rows_end(journal, block_size=65536):
+    """
+    Byte offset behind the last complete row of an open journal.
+    """
+
+    end = journal.seek(0, os.SEEK_END)
+
+    # Search backwards for the last line break
+    while end > 0:
+        start = max(end - block_size, 0)
+        journal.seek(start)
+        newline = journal.read(end - start).rfind(b'\n')
+        if newline >= 0:
+            return start + newline + 1
+        end = start
+
+    return 0
+
+
+def _aggregate_range(args):
+    return aggregate_range(*args)
+
+
+def aggregate_parallel(path, workers, condition='trial', value='corsi_span'):
+    """
+    Aggregate a journal file by splitting it into byte ranges processed by a
+    pool of processes.
+    :param path: string | path of the journal file
+    :param workers: int | number of processes
+    :param condition: string | column to group the rows by
+    :param value: string | column with the values to aggregate
+    :return: CohortStatistics object that can be updated incrementally
+    """
+
+    stats = CohortStatistics(path, condition, value)
+    with open(path, 'rb') as journal:
+        if not stats.read_header(journal):
+            return stats
+
+        # Only complete rows are aggregated, later rows are left for update()
+        content_end = complete_rows_end(journal)
+
+    bounds = [stats.offset + (content_end - stats.offset) * i // workers
+              for i in range(workers + 1)]
+    shards = [(path, stats.columns, bounds[i], bounds[i + 1], condition,
+               value) for i in range(workers) if bounds[i] < bounds[i + 1]]
+
+    with multiprocessing.Pool(workers) as pool:
+        for partial in pool.imap(_aggregate_range, shards):
+            stats.merge(partial)
+
+    stats.offset = content_end
+    return stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Aggregate corsi spans over a trial results journal.')
+    parser.add_argument('path', nargs='?', default=RESULTS_FILE,
+                        help='trial results journal, default {}'.format(
+                            RESULTS_FILE))
+    parser.add_argument('--condition', default='trial',
+                        help='column to group the results by')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes for the initial pass')
+    parser.add_argument('--follow', type=float, default=None,
+                        help='keep reading new rows every FOLLOW seconds')
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        cohort = aggregate_parallel(args.path, args.workers, args.condition)
+    else:
+        cohort = CohortStatistics(args.path, args.condition)
+        cohort.update()
+    print(json.dumps(cohort.summary(), indent=2))
+
+    while args.follow:
+        sleep(args.follow)
+        if cohort.update():
+            print(json.dumps(cohort.summary(), indent=2))
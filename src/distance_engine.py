@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+Vectorized distance computations for box layouts. Checks candidates against
+all accepted box centers at once and validates whole batches of layouts,
+e.g. to audit a stimulus bank offline. All comparisons use squared distances.
+
+Usage:
+    python distance_engine.py --layouts 10000 --output layouts.npy
+"""
+
+import argparse
+import random
+from time import perf_counter
+
+import numpy as np
+
+from box_layout import generate_layout
+
+
+def collides(candidate, centers, min_dist):
+    """
+    Check a candidate center against all accepted centers.
+    :param candidate: tuple (int, int) | center of candidate box
+    :param centers: array (n, 2) | centers of accepted boxes
+    :param min_dist: float | minimum distance between two box centers
+    :return: Flag that indicates if the candidate collides with any box
+    """
+
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 2)
+    delta = centers - np.asarray(candidate, dtype=np.float64)
+    return bool(np.any(np.einsum('ij,ij->i', delta, delta) < min_dist ** 2))
+
+
+def pairwise_sq_distances(layouts):
+    """
+    Squared distances between all pairs of box centers of each layout.
+    :param layouts: array (n_layouts, n_boxes, 2) | box centers
+    :return: array (n_layouts, n_boxes, n_boxes)
+    """
+
+    layouts = np.asarray(layouts, dtype=np.float64)
+    delta = layouts[:, :, None, :] - layouts[:, None, :, :]
+    return np.einsum('lijk,lijk->lij', delta, delta)
+
+
+def validate_layouts(layouts, min_dist, screen_size=None, margin=0,
+                     chunk_size=10000):
+    """
+    Validate a batch of layouts. A layout is valid if all box centers keep
+    the minimum distance and, if a screen size is given, lie inside the
+    screen without the margins.
+    :param layouts: array (n_layouts, n_boxes, 2) | box centers
+    :param min_dist: float | minimum distance between two box centers
+    :param screen_size: tuple (int, int) | width and height of application
+    :param margin: float | free margin at the borders of the screen
+    :param chunk_size: int | number of layouts processed at once
+    :return: bool array (n_layouts,) | validity of each layout
+    """
+
+    layouts = np.asarray(layouts, dtype=np.float64)
+    n_layouts, n_boxes = layouts.shape[:2]
+    valid = np.empty(n_layouts, dtype=bool)
+
+    # Only the pairs above the diagonal have to be compared
+    upper = np.triu_indices(n_boxes, k=1)
+
+    for start in range(0, n_layouts, chunk_size):
+        chunk = layouts[start:start + chunk_size]
+        distances = pairwise_sq_distances(chunk)[:, upper[0], upper[1]]
+        valid[start:start + chunk_size] = np.all(distances >= min_dist ** 2,
+                                                 axis=1)
+
+    if screen_size is not None:
+        low = np.array([margin, margin])
+        high = np.array([screen_size[0] - margin, screen_size[1] - margin])
+        valid &= np.all((layouts >= low) & (layouts <= high), axis=(1, 2))
+
+    return valid
+
+
+def generate_layout_bank(n_layouts, screen_size, box_parameters, seed=None):
+    """
+    Generate a bank of layouts and validate it.
+    :param n_layouts: int | number of layouts
+    :param screen_size: tuple (int, int) | width and height of application
+    :param box_parameters: dict of box parameters
+    :param seed: int | seed of the random number generator
+    :return: array (n_layouts, n_boxes, 2) of box centers and bool array of
+    layout validity
+    """
+
+    rng = random.Random(seed)
+    layouts = np.array([generate_layout(screen_size,
+                                        box_parameters['n_boxes'],
+                                        box_parameters['min_dist'],
+                                        box_parameters['margin'], rng)
+                        for _ in range(n_layouts)], dtype=np.int32)
+
+    valid = validate_layouts(layouts, box_parameters['min_dist'], screen_size,
+                             box_parameters['margin'])
+
+    return layouts, valid
+
+
+if __name__ == '__main__':
+    from Final_Corsi_OOP import BOX_PARAMS, SCREEN_SIZE
+
+    parser = argparse.ArgumentParser(
+        description='Generate and audit a bank of box layouts.')
+    parser.add_argument('--layouts', type=int, default=10000,
+                        help='number of layouts')
+    parser.add_argument('--seed', type=int, default=None,
+                        help='seed of the random number generator')
+    parser.add_argument('--output', default=None,
+                        help='store layouts in this .npy file')
+    args = parser.parse_args()
+
+    start = perf_counter()
+    bank, bank_valid = generate_layout_bank(args.layouts, SCREEN_SIZE,
+                                            BOX_PARAMS, args.seed)
+    print('Generated and validated {} layouts in {:.2f} s, {} invalid'.format(
+        len(bank), perf_counter() - start, int(np.sum(~bank_valid))))
+
+    if args.output:
+        np.save(args.output, bank)
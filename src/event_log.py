@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+High-resolution log of stimulus and click events. Events are stored in a
+preallocated ring buffer of typed arrays and drained in bulk, e.g. at the
+end of each sequence. Reaction time metrics are computed from the drained
+events.
+"""
+
+from array import array
+from time import perf_counter_ns
+
+# Event kinds
+STIMULUS_ON, STIMULUS_OFF, CLICK = 0, 1, 2
+EVENT_NAMES = ('stimulus_on', 'stimulus_off', 'click')
+
+
+class EventLog:
+
+    def __init__(self, capacity=1024, clock_ns=perf_counter_ns):
+        """
+        Event log class. Keeps the most recent events up to the given
+        capacity.
+        :param capacity: int | maximum number of events kept
+        :param clock_ns: function returning the current time in ns
+        """
+
+        self.capacity = capacity
+        self.clock_ns = clock_ns
+
+        # One array per event attribute
+        self.kinds = array('b', [0]) * capacity
+        self.times = array('q', [0]) * capacity
+        self.boxes = array('h', [0]) * capacity
+        self.xs = array('i', [0]) * capacity
+        self.ys = array('i', [0]) * capacity
+
+        # Index of the oldest event and number of events in the buffer
+        self.first = 0
+        self.count = 0
+
+        # Number of events overwritten before they were drained
+        self.dropped = 0
+
+    def log(self, kind, box=-1, pos=(-1, -1)):
+        """
+        Add an event with the current time.
+        :param kind: int | STIMULUS_ON, STIMULUS_OFF or CLICK
+        :param box: int | index of the box, -1 if no box is involved
+        :param pos: tuple (int, int) | position of the event on screen
+        """
+
+        timestamp = self.clock_ns()
+
+        index = (self.first + self.count) % self.capacity
+        if self.count == self.capacity:
+            # Buffer full, overwrite oldest event
+            self.first = (self.first + 1) % self.capacity
+            self.dropped += 1
+        else:
+            self.count += 1
+
+        self.kinds[index] = kind
+        self.times[index] = timestamp
+        self.boxes[index] = box
+        self.xs[index] = int(pos[0])
+        self.ys[index] = int(pos[1])
+
+    def drain(self):
+        """
+        Remove all events from the buffer.
+        :return: list of events (kind, time_ns, box, x, y) in order of
+        occurrence
+        """
+
+        indices = [(self.first + i) % self.capacity for i in range(self.count)]
+        events = [(self.kinds[i], self.times[i], self.boxes[i], self.xs[i],
+                   self.ys[i]) for i in indices]
+
+        self.first = 0
+        self.count = 0
+
+        return events
+
+
+def click_metrics(events):
+    """
+    Compute timing metrics of the clicks in response to a sequence.
+    :param events: list of events (kind, time_ns, box, x, y) of one sequence
+    :return: list of dicts per click with the reaction time since the end
+    of the presentation, the interval since the previous click and the
+    latency since the onset of the stimulus at the same serial position,
+    all in ms
+    """
+
+    onsets = [event[1] for event in events if event[0] == STIMULUS_ON]
+    offsets = [event[1] for event in events if event[0] == STIMULUS_OFF]
+    clicks = [event for event in events if event[0] == CLICK]
+
+    # Responses are timed from the end of the presentation
+    presentation_end = offsets[-1] if offsets else None
+
+    metrics = []
+    previous = None
+    for i, (_, timestamp, box, x, y) in enumerate(clicks):
+        metrics.append({
+            'click': i + 1, 'box': box, 'x': x, 'y': y,
+            'reaction_time_ms': _ms(timestamp, presentation_end),
+            'inter_tap_ms': _ms(timestamp, previous),
+            'stimulus_latency_ms': _ms(timestamp, onsets[i]
+                                       if i < len(onsets) else None),
+        })
+        previous = timestamp
+
+    return metrics
+
+
+def _ms(end, start):
+    """
+    Difference of two times in ns as ms, None if no start time exists.
+    """
+
+    return None if start is None else round((end - start) / 1e6, 3)
@@ -0,0 +1,116 @@
+# -*- coding: utf-8 -*-
+"""
+Frame scheduler for the Corsi application. Paces the main loop to a target
+frame rate, blocks on the event queue in static states and keeps track of
+the achieved frame times.
+"""
+
+from collections import deque
+from time import perf_counter
+
+import pygame
+from pygame.locals import NOEVENT
+
+
+def percentile(values, q):
+    """
+    Nearest-rank percentile of a list of values.
+    :param values: iterable of numbers
+    :param q: float | percentile in [0, 100]
+    :return: percentile value or 0.0 for an empty input
+    """
+
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+
+    # Nearest rank, clipped to the valid index range
+    rank = int(round(q / 100.0 * (len(ordered) - 1)))
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+class FrameScheduler:
+
+    def __init__(self, fps, idle_timeout, history=1000):
+        """
+        Frame scheduler class. Limits the frame rate while frames are
+        rendered continuously and waits for events in static states.
+        :param fps: int | target frame rate in frames per second, 0 for no
+        limit
+        :param idle_timeout: int | maximum time to wait for events in static
+        states in ms
+        :param history: int | number of frame times kept for the statistics
+        """
+
+        self.fps = fps
+        self.idle_timeout = idle_timeout
+
+        # PyGame clock used to limit the frame rate
+        self.clock = pygame.time.Clock()
+
+        # Duration of the most recent frames in ms, split by frame type
+        self.active_frame_times = deque(maxlen=history)
+        self.idle_frame_times = deque(maxlen=history)
+
+        # Time stamp of the end of the last frame
+        self.last_frame = perf_counter()
+
+    def get_events(self, idle):
+        """
+        Get the events of the current frame. In static states, block until
+        an event arrives or the idle timeout has passed.
+        :param idle: bool | True if the screen only changes upon input
+        :return: list of PyGame event objects
+        """
+
+        if not idle:
+            return pygame.event.get()
+
+        # Sleep on the event queue instead of polling it
+        event = pygame.event.wait(self.idle_timeout)
+        if event.type == NOEVENT:
+            return []
+
+        # Collect all other events that arrived in the meantime
+        return [event] + pygame.event.get()
+
+    def tick(self, idle):
+        """
+        Finish a frame. Active frames are limited to the target frame rate,
+        idle frames are already paced by waiting for events.
+        :param idle: bool | True if the frame was rendered in a static state
+        """
+
+        if not idle:
+            self.clock.tick(self.fps)
+
+        # Store frame duration
+        now = perf_counter()
+        frame_time = (now - self.last_frame) * 1000.0
+        self.last_frame = now
+
+        if idle:
+            self.idle_frame_times.append(frame_time)
+        else:
+            self.active_frame_times.append(frame_time)
+
+    def report(self):
+        """
+        Summarize the achieved frame rate and frame time percentiles.
+        :return: dict with achieved fps and frame time percentiles in ms for
+        active and idle frames
+        """
+
+        report = {}
+        for name, frame_times in (('active', self.active_frame_times),
+                                  ('idle', self.idle_frame_times)):
+            mean = sum(frame_times) / len(frame_times) if frame_times else 0.0
+            report[name] = {
+                'frames': len(frame_times),
+                'fps': round(1000.0 / mean, 1) if mean > 0 else 0.0,
+                'p50': round(percentile(frame_times, 50), 2),
+                'p95': round(percentile(frame_times, 95), 2),
+                'p99': round(percentile(frame_times, 99), 2),
+            }
+
+        return report
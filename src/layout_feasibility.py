@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+"""
+Feasibility analysis of the box parameters. Whether box layouts can be
+generated, and how long it takes, depends on the interplay of the screen
+size, the number and size of the boxes, the margin and the minimum distance.
+A configuration is estimated by generating a number of seeded layouts as the
+task does and timing them. A sweep estimates every combination of parameter
+grids in a pool of processes and prints the largest number of boxes that is
+safe for each geometry. The application runs a short estimate at startup and
+rejects configurations that are too slow.
+
+Timings depend on the machine, run the sweep on the stations or on a machine
+at least as slow. Running one process per core slows down each of them
+somewhat, so the timings of a sweep are rather pessimistic.
+
+Usage:
+    python layout_feasibility.py --n-boxes 6 9 12 15 --min-dist 80 100 120
+    python layout_feasibility.py --screen-size 800x600 1024x768 --all
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import random
+from functools import partial
+from math import sqrt
+from time import perf_counter
+
+from box_layout import check_feasibility, generate_layout, max_boxes
+
+# Maximum time to generate one box layout in ms. Layouts are usually
+# generated in the background, but the first one of a session or a late
+# prefetch delays the sequence.
+LAYOUT_BUDGET_MS = 50.0
+
+# Number of layouts generated per configuration in a sweep and at startup
+TRIALS = 20
+STARTUP_TRIALS = 5
+
+# Outcome of an estimate, from worst to best. Configurations with boxes that
+# may overlap or leave the screen can be generated, but are not safe to use.
+STATUSES = ('infeasible', 'fails', 'slow', 'overlap', 'clipped', 'safe')
+
+
+def geometry_issue(screen_size, n_boxes, box_size, min_dist, margin):
+    """
+    Check the box parameters without generating layouts.
+    :param screen_size: tuple (int, int) | width and height of application
+    :param n_boxes: int | number of boxes
+    :param box_size: int | side length of the boxes
+    :param min_dist: float | minimum distance between two box centers
+    :param margin: float | free margin at the borders of the screen
+    :return: string | 'infeasible' if the boxes cannot be placed, 'overlap'
+    if two boxes may overlap, 'clipped' if boxes may extend beyond the
+    screen, None if the parameters are fine
+    """
+
+    try:
+        check_feasibility(screen_size, n_boxes, min_dist, margin)
+    except ValueError:
+        return 'infeasible'
+
+    # Squares with centers closer than their diagonal can overlap
+    if min_dist < box_size * sqrt(2.0):
+        return 'overlap'
+
+    if margin < box_size / 2.0:
+        return 'clipped'
+
+    return None
+
+
+def estimate_generation(screen_size, n_boxes, box_size, min_dist, margin,
+                        trials=TRIALS, budget_ms=LAYOUT_BUDGET_MS, seed=0):
+    """
+    Estimate whether layouts of a configuration can be generated and how
+    long it takes. Layouts are seeded like the layouts of a session.
+    :param screen_size: tuple (int, int) | width and height of application
+    :param n_boxes: int | number of boxes
+    :param box_size: int | side length of the boxes
+    :param min_dist: float | minimum distance between two box centers
+    :param margin: float | free margin at the borders of the screen
+    :param trials: int | number of generated layouts
+    :param budget_ms: float | maximum time per layout in ms. The estimate
+    stops at the first layout that takes longer. None for no limit.
+    :param seed: int | seed of the layouts
+    :return: dict with the packing bound, the fraction of the bound that is
+    used, the number of generated layouts, failures and Poisson-disk
+    fallbacks, mean and maximum generation time in ms and the status (see
+    STATUSES)
+    """
+
+    bound = max_boxes(screen_size, min_dist, margin)
+    estimate = {'bound': bound,
+                'fill': round(n_boxes / bound, 3) if bound else float('inf'),
+                'trials': 0, 'failures': 0, 'fallbacks': 0,
+                'mean_ms': 0.0, 'max_ms': 0.0}
+
+    issue = geometry_issue(screen_size, n_boxes, box_size, min_dist, margin)
+    if issue == 'infeasible':
+        estimate['status'] = issue
+        return estimate
+
+    total = 0.0
+    for trial in range(trials):
+        rng = random.Random('{}:{}'.format(seed, trial))
+        stats = {}
+        start = perf_counter()
+        try:
+            generate_layout(screen_size, n_boxes, min_dist, margin, rng,
+                            stats=stats)
+        except ValueError:
+            estimate['failures'] += 1
+        duration = (perf_counter() - start) * 1000.0
+
+        estimate['trials'] += 1
+        estimate['fallbacks'] += stats.get('restarts', 0) > 0
+        estimate['max_ms'] = max(estimate['max_ms'], duration)
+        total += duration
+
+        # A single slow layout is enough to reject the configuration
+        if budget_ms is not None and duration > budget_ms:
+            break
+
+    estimate['mean_ms'] = total / estimate['trials']
+
+    if estimate['failures']:
+        estimate['status'] = 'fails'
+    elif budget_ms is not None and estimate['max_ms'] > budget_ms:
+        estimate['status'] = 'slow'
+    else:
+        estimate['status'] = issue or 'safe'
+
+    return estimate
+
+
+def check_generation_time(screen_size, box_parameters,
+                          budget_ms=LAYOUT_BUDGET_MS, trials=STARTUP_TRIALS):
+    """
+    Fast check of the box parameters at startup. Generates a few layouts and
+    rejects the configuration if one of them fails or takes longer than the
+    budget.
+    :param screen_size: tuple (int, int) | width and height of application
+    :param box_parameters: dict of box parameters
+    :param budget_ms: float | maximum time per layout in ms
+    :param trials: int | number of generated layouts
+    :return: dict | estimate of the configuration
+    :raise ValueError: if the configuration is infeasible, fails or is too
+    slow
+    """
+
+    n_boxes = box_parameters['n_boxes']
+    min_dist = box_parameters['min_dist']
+    margin = box_parameters['margin']
+
+    # Raise the detailed error of impossible configurations
+    check_feasibility(screen_size, n_boxes, min_dist, margin)
+
+    estimate = estimate_generation(screen_size, n_boxes,
+                                   box_parameters['size'], min_dist, margin,
+                                   trials, budget_ms)
+
+    if estimate['status'] == 'fails':
+        raise ValueError("Could not place {} boxes with a minimum distance of "
+                         "{} px on a screen of size {} with a margin of {} px "
+                         "in {} of {} layouts. Reduce the number of boxes or "
+                         "their distance.".format(
+                             n_boxes, min_dist, screen_size, margin,
+                             estimate['failures'], estimate['trials']))
+
+    if estimate['status'] == 'slow':
+        raise ValueError("Generating a layout of {} boxes with a minimum "
+                         "distance of {} px on a screen of size {} with a "
+                         "margin of {} px took {:.1f} ms, more than the "
+                         "budget of {} ms. Reduce the number of boxes or "
+                         "their distance, see layout_feasibility.py for safe "
+                         "parameters.".format(n_boxes, min_dist, screen_size,
+                                              margin, estimate['max_ms'],
+                                              budget_ms))
+
+    return estimate
+
+
+def estimate_case(case, trials, budget_ms, seed):
+    """
+    Estimate one combination of a sweep, run in the worker processes.
+    :param case: tuple of screen size, number of boxes, box size, margin and
+    minimum distance
+    :return: tuple of the case and its estimate
+    """
+
+    screen_size, n_boxes, box_size, margin, min_dist = case
+    return case, estimate_generation(screen_size, n_boxes, box_size,
+                                     min_dist, margin, trials, budget_ms,
+                                     seed)
+
+
+def sweep(screen_sizes, n_boxes, box_sizes, margins, min_dists,
+          trials=TRIALS, budget_ms=LAYOUT_BUDGET_MS, workers=None, seed=0):
+    """
+    Estimate all combinations of the parameter grids.
+    :param screen_sizes: list of tuples (int, int) | screen sizes
+    :param n_boxes: list of int | numbers of boxes
+    :param box_sizes: list of int | side lengths of the boxes
+    :param margins: list of float | margins at the borders of the screen
+    :param min_dists: list of float | minimum distances between box centers
+    :param trials: int | number of generated layouts per combination
+    :param budget_ms: float | maximum time per layout in ms
+    :param workers: int | number of processes, None for one per CPU
+    :param seed: int | seed of the layouts
+    :return: list of tuples (case, estimate) in the order of the grids,
+    cases as passed to estimate_case
+    """
+
+    cases = list(itertools.product(screen_sizes, n_boxes, box_sizes, margins,
+                                   min_dists))
+    estimate = partial(estimate_case, trials=trials, budget_ms=budget_ms,
+                       seed=seed)
+
+    workers = min(workers or os.cpu_count() or 1, len(cases))
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            # Hand out the cases in small chunks, as their durations differ
+            # by orders of magnitude
+            return pool.map(estimate, cases,
+                            max(len(cases) // (4 * workers), 1))
+
+    return [estimate(case) for case in cases]
+
+
+def safe_regions(results):
+    """
+    Largest safe number of boxes of each geometry of a sweep.
+    :param results: list of tuples (case, estimate) as returned by sweep
+    :return: list of dicts with screen size, box size, margin, minimum
+    distance, packing bound, largest number of boxes for which all smaller
+    numbers in the grid are safe (0 if none), its maximum generation time in
+    ms and the status of the next larger number of boxes
+    """
+
+    geometries = {}
+    for (screen_size, n_boxes, box_size, margin, min_dist), estimate in \
+            results:
+        geometries.setdefault((screen_size, box_size, margin, min_dist),
+                              []).append((n_boxes, estimate))
+
+    regions = []
+    for (screen_size, box_size, margin, min_dist), estimates in \
+            geometries.items():
+        region = {'screen_size': screen_size, 'box_size': box_size,
+                  'margin': margin, 'min_dist': min_dist,
+                  'bound': estimates[0][1]['bound'], 'max_boxes': 0,
+                  'max_ms': 0.0, 'limited_by': None}
+        for n_boxes, estimate in sorted(estimates, key=lambda item: item[0]):
+            if estimate['status'] != 'safe':
+                region['limited_by'] = estimate['status']
+                break
+            region['max_boxes'] = n_boxes
+            region['max_ms'] = estimate['max_ms']
+        regions.append(region)
+
+    return regions
+
+
+def format_table(header, rows):
+    """
+    Format rows as a text table with right-aligned columns.
+    :param header: list of column names
+    :param rows: list of lists of strings
+    :return: string
+    """
+
+    widths = [max(len(row[i]) for row in [header] + rows)
+              for i in range(len(header))]
+    return '\n'.join('  '.join(value.rjust(width)
+                               for value, width in zip(row, widths))
+                     for row in [header] + rows)
+
+
+def parse_screen_size(text):
+    """
+    Parse a screen size such as 800x600.
+    :return: tuple (int, int)
+    """
+
+    try:
+        width, height = text.lower().split('x')
+        return int(width), int(height)
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'screen size has to be given as WIDTHxHEIGHT, not {}'.format(
+                text))
+
+
+if __name__ == '__main__':
+    from Final_Corsi_OOP import BOX_SIZE, MARGIN, MIN_DIST, SCREEN_SIZE
+
+    parser = argparse.ArgumentParser(
+        description='Estimate for which box parameters layouts can be '
+                    'generated within the time budget.')
+    parser.add_argument('--screen-size', type=parse_screen_size, nargs='+',
+                        default=[SCREEN_SIZE], help='e.g. 800x600')
+    parser.add_argument('--n-boxes', type=int, nargs='+',
+                        default=list(range(3, 31, 3)))
+    parser.add_argument('--box-size', type=int, nargs='+',
+                        default=[BOX_SIZE])
+    parser.add_argument('--margin', type=float, nargs='+', default=[MARGIN])
+    parser.add_argument('--min-dist', type=float, nargs='+',
+                        default=[MIN_DIST])
+    parser.add_argument('--trials', type=int, default=TRIALS,
+                        help='layouts generated per combination')
+    parser.add_argument('--budget', type=float, default=LAYOUT_BUDGET_MS,
+                        help='maximum time per layout in ms')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes, default one per CPU')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the layouts')
+    parser.add_argument('--all', action='store_true',
+                        help='also list every combination')
+    args = parser.parse_args()
+
+    start = perf_counter()
+    results = sweep(args.screen_size, args.n_boxes, args.box_size,
+                    args.margin, args.min_dist, args.trials, args.budget,
+                    args.workers, args.seed)
+
+    if args.all:
+        print(format_table(
+            ['screen', 'n_boxes', 'size', 'margin', 'min_dist', 'bound',
+             'fill', 'fallbacks', 'mean ms', 'max ms', 'status'],
+            [['{}x{}'.format(*screen_size), str(n_boxes), str(box_size),
+              '{:g}'.format(margin), '{:g}'.format(min_dist),
+              str(estimate['bound']), '{:.2f}'.format(estimate['fill']),
+              '{}/{}'.format(estimate['fallbacks'], estimate['trials']),
+              '{:.2f}'.format(estimate['mean_ms']),
+              '{:.2f}'.format(estimate['max_ms']), estimate['status']]
+             for (screen_size, n_boxes, box_size, margin, min_dist),
+             estimate in results]))
+        print()
+
+    print(format_table(
+        ['screen', 'size', 'margin', 'min_dist', 'bound', 'safe n_boxes',
+         'max ms', 'limited by'],
+        [['{}x{}'.format(*region['screen_size']), str(region['box_size']),
+          '{:g}'.format(region['margin']), '{:g}'.format(region['min_dist']),
+          str(region['bound']),
+          '<= {}'.format(region['max_boxes']) if region['max_boxes']
+          else 'none',
+          '{:.2f}'.format(region['max_ms']), region['limited_by'] or '-']
+         for region in safe_regions(results)]))
+    print('{} combinations in {:.2f} s, budget {:g} ms per layout'.format(
+        len(results), perf_counter() - start, args.budget))
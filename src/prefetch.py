@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+Speculative prefetching of values that are expensive to compute, e.g. the
+box layout of the next sequence. Values are computed by a shared background
+worker while the application waits for user input and handed over when they
+are requested.
+"""
+
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from time import perf_counter
+
+# Worker shared by all prefetchers of the process
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+
+def shared_executor():
+    """
+    Get the background worker shared by all prefetchers. Created on first
+    use.
+    :return: ThreadPoolExecutor object
+    """
+
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix='Prefetch')
+    return _shared_executor
+
+
+class Prefetcher:
+
+    def __init__(self, compute, executor=None):
+        """
+        Prefetcher class. Values are identified by a key and computed by
+        compute(key), which has to return the same value for the same key no
+        matter in which thread it runs.
+        :param compute: function computing the value of a key
+        :param executor: Executor object running the computations, None for
+        the shared background worker
+        """
+
+        self.compute = compute
+        self.executor = executor
+
+        # Computations started ahead of time by key
+        self.pending = {}
+
+        # Requests served by a finished prefetch, by a prefetch that was
+        # still running and by computing the value on request
+        self.hits = 0
+        self.late = 0
+        self.misses = 0
+
+        # Time spent waiting for requested values in s
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def prefetch(self, key):
+        """
+        Start computing the value of a key in the background.
+        :param key: hashable key of the value
+        """
+
+        if key not in self.pending:
+            executor = self.executor or shared_executor()
+            self.pending[key] = executor.submit(self.compute, key)
+
+    def get(self, key):
+        """
+        Get the value of a key. Prefetched values are handed over directly,
+        others are computed on request. Prefetches of all other keys are
+        discarded.
+        :param key: hashable key of the value
+        :return: value of the key
+        """
+
+        start = perf_counter()
+
+        future = self.pending.pop(key, None)
+        self.discard()
+
+        if future is None:
+            self.misses += 1
+            value = self.compute(key)
+        else:
+            if future.done():
+                self.hits += 1
+            else:
+                self.late += 1
+            value = future.result()
+
+        wait = perf_counter() - start
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+        return value
+
+    async def ready(self):
+        """
+        Wait until all pending prefetches are finished without blocking the
+        event loop, so that the next request does not wait in get().
+        """
+
+        if self.pending:
+            await asyncio.wait([asyncio.wrap_future(future)
+                                for future in self.pending.values()])
+
+    def discard(self):
+        """
+        Discard all pending prefetches.
+        """
+
+        for future in self.pending.values():
+            future.cancel()
+        self.pending.clear()
+
+    def stats(self):
+        """
+        Get prefetch statistics.
+        :return: dict with hits, late hits, misses, hit rate and mean and
+        maximum time waited for a value in ms
+        """
+
+        requests = self.hits + self.late + self.misses
+        return {'hits': self.hits, 'late': self.late, 'misses': self.misses,
+                'hit_rate': round(self.hits / requests, 3) if requests
+                else 0.0,
+                'mean_wait_ms': round(self.wait_total / requests * 1000.0, 3)
+                if requests else 0.0,
+                'max_wait_ms': round(self.wait_max * 1000.0, 3)}
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+"""
+Opt-in profiling of the main loop. Selected methods of the application are
+wrapped to measure their duration, which is counted in per-state histograms
+with power-of-two buckets. Recent calls are kept for a timeline. A small
+overlay shows the frame rate, the 99th percentile frame time and the number
+of events handled per frame. The data can be written as a cProfile (pstats)
+file or as a Chrome trace (chrome://tracing, Perfetto).
+"""
+
+import json
+import marshal
+import os
+from array import array
+from collections import deque
+from functools import wraps
+from time import perf_counter, perf_counter_ns
+
+import pygame
+
+from frame_scheduler import percentile
+
+# Number of histogram buckets. Bucket i counts durations below 2 ** i us.
+BUCKETS = 32
+
+# Enclosing section of each section, used for the call hierarchy of the
+# cProfile output
+PARENTS = {'handle_events': 'frame', 'update': 'frame',
+           'update_display': 'frame', 'wait_events': 'handle_events',
+           'show_sequence': 'update', 'draw_text': 'update'}
+
+# Sections that measure time spent in a state rather than running code
+DWELL = 'dwell'
+
+
+class Histogram:
+
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        """
+        Histogram class. Counts durations in ns in power-of-two buckets of
+        us.
+        """
+
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = array('Q', [0]) * BUCKETS
+
+    def add(self, duration):
+        """
+        Add a duration.
+        :param duration: int | duration in ns
+        """
+
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+        self.buckets[min((duration // 1000).bit_length(), BUCKETS - 1)] += 1
+
+    def percentile(self, q):
+        """
+        Upper bound of a percentile.
+        :param q: float | percentile in [0, 100]
+        :return: float | upper bound of the bucket containing the percentile
+        in ms
+        """
+
+        rank = q / 100.0 * self.count
+        seen = 0
+        for i, count in enumerate(self.buckets):
+            seen += count
+            if count and seen >= rank:
+                return min(2 ** i / 1000.0, self.max / 1e6)
+        return 0.0
+
+    def summary(self):
+        return {'count': self.count,
+                'mean_ms': round(self.total / self.count / 1e6, 3)
+                if self.count else 0.0,
+                'p50_ms': round(self.percentile(50), 3),
+                'p99_ms': round(self.percentile(99), 3),
+                'max_ms': round(self.max / 1e6, 3)}
+
+
+class FrameProfiler:
+
+    def __init__(self, state_source, history=100000, window=240):
+        """
+        Frame profiler class.
+        :param state_source: function returning the current state. Sections
+        are attributed to the state at the start of their frame.
+        :param history: int | number of recent calls kept for the timeline
+        :param window: int | number of recent frames shown in the overlay
+        """
+
+        self.state_source = state_source
+
+        # Histograms keyed by (state, section)
+        self.histograms = {}
+
+        # Recent calls as (section, state, start in ns, duration in ns)
+        self.calls = deque(maxlen=history)
+
+        # Start times of recent frames in s and events handled per frame
+        self.frame_starts = deque(maxlen=window)
+        self.frame_events = deque(maxlen=window)
+
+        # State of the current frame
+        self.state = None
+
+        # Overlay, refreshed periodically
+        self.overlay = False
+        self.overlay_font = None
+        self.overlay_surface = None
+        self.overlay_refreshed = 0.0
+
+    def record(self, section, state, start, duration):
+        """
+        Count a call of a section.
+        :param section: string | name of the section
+        :param state: state the call is attributed to
+        :param start: int | start time in ns
+        :param duration: int | duration in ns
+        """
+
+        histogram = self.histograms.get((state, section))
+        if histogram is None:
+            histogram = self.histograms[(state, section)] = Histogram()
+        histogram.add(duration)
+        self.calls.append((section, state, start, duration))
+
+    def wrap(self, section, function, frame=False):
+        """
+        Measure all calls of a function.
+        :param section: string | name of the section
+        :param function: callable
+        :param frame: bool | the function runs a whole frame, which sets the
+        state of all sections called within
+        :return: wrapped function
+        """
+
+        @wraps(function)
+        def timed(*args, **kwargs):
+            if frame:
+                self.state = self.state_source()
+                self.frame_starts.append(perf_counter())
+            state = self.state
+            start = perf_counter_ns()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.record(section, state, start, perf_counter_ns() - start)
+
+        return timed
+
+    def instrument(self, target, sections, frame=None):
+        """
+        Replace methods of an object by measuring wrappers. Has to be called
+        before the methods are handed out, e.g. as state handlers.
+        :param target: object
+        :param sections: list of method names
+        :param frame: string | name of the method that runs a whole frame
+        """
+
+        for name in sections:
+            setattr(target, name, self.wrap(name, getattr(target, name),
+                                            frame=name == frame))
+
+    def count_events(self, get_events):
+        """
+        Measure the time spent waiting for events as section wait_events and
+        record the number of events returned, i.e. the depth of the event
+        queue at the start of the frame.
+        :param get_events: function returning a list of events
+        :return: wrapped function
+        """
+
+        @wraps(get_events)
+        def counted(*args, **kwargs):
+            start = perf_counter_ns()
+            events = get_events(*args, **kwargs)
+            self.record('wait_events', self.state, start,
+                        perf_counter_ns() - start)
+            self.frame_events.append(len(events))
+            return events
+
+        return counted
+
+    def transition(self, previous, state, dwell, enter_time):
+        """
+        Transition hook of the state machine. Records the time spent in the
+        previous state and in the enter handler of the new state.
+        """
+
+        now = perf_counter_ns()
+        self.record(DWELL, previous, now - int(dwell * 1e9),
+                    int(dwell * 1e9))
+        self.record('enter', state, now - int(enter_time * 1e9),
+                    int(enter_time * 1e9))
+
+    def overlay_text(self):
+        """
+        Text of the overlay.
+        :return: string with frame rate, p99 frame time and mean and maximum
+        event queue depth of the recent frames
+        """
+
+        starts = list(self.frame_starts)
+        intervals = [(b - a) * 1000.0 for a, b in zip(starts, starts[1:])]
+        fps = 1000.0 * len(intervals) / sum(intervals) if intervals and \
+            sum(intervals) > 0 else 0.0
+        events = list(self.frame_events)
+
+        return '{:.1f} fps  p99 {:.1f} ms  events {:.1f}/{}'.format(
+            fps, percentile(intervals, 99),
+            sum(events) / len(events) if events else 0.0,
+            max(events) if events else 0)
+
+    def draw_overlay(self, screen, refresh=0.5):
+        """
+        Draw the overlay in the top left corner if enabled.
+        :param screen: PyGame screen object
+        :param refresh: float | time between two updates of the text in s
+        """
+
+        if not self.overlay:
+            return
+
+        now = perf_counter()
+        if self.overlay_surface is None or \
+                now - self.overlay_refreshed >= refresh:
+            if self.overlay_font is None:
+                self.overlay_font = pygame.font.Font(None, 24)
+            self.overlay_surface = self.overlay_font.render(
+                self.overlay_text(), True, (255, 255, 255), (0, 0, 0))
+            self.overlay_refreshed = now
+
+        screen.blit(self.overlay_surface, (4, 4))
+
+    def toggle_overlay(self):
+        """
+        Show or hide the overlay.
+        """
+
+        self.overlay = not self.overlay
+        self.overlay_surface = None
+
+    def report(self):
+        """
+        Summarize the histograms.
+        :return: dict of section summaries by state
+        """
+
+        report = {}
+        for (state, section), histogram in self.histograms.items():
+            name = getattr(state, 'value', str(state))
+            report.setdefault(name, {})[section] = histogram.summary()
+        return report
+
+    def dump_pstats(self, path):
+        """
+        Write the histograms as cProfile statistics, readable with pstats or
+        snakeviz. Every section of every state is a function. Time spent in
+        states is left out, as it is no run time.
+        :param path: string | path of the output file
+        """
+
+        def key(state, section):
+            return ('<corsi>', 0, '{} [{}]'.format(
+                section, getattr(state, 'value', str(state))))
+
+        # Time of the nested sections of each section
+        nested = {}
+        for (state, section), histogram in self.histograms.items():
+            parent = PARENTS.get(section)
+            if parent is not None and (state, parent) in self.histograms:
+                nested[(state, parent)] = nested.get((state, parent), 0) + \
+                    histogram.total
+
+        stats = {}
+        for (state, section), histogram in self.histograms.items():
+            if section == DWELL:
+                continue
+            total = histogram.total / 1e9
+            own = max(histogram.total - nested.get((state, section), 0),
+                      0) / 1e9
+            callers = {}
+            parent = PARENTS.get(section)
+            if parent is not None and (state, parent) in self.histograms:
+                callers[key(state, parent)] = (histogram.count,
+                                               histogram.count, own, total)
+            stats[key(state, section)] = (histogram.count, histogram.count,
+                                          own, total, callers)
+
+        with open(path, 'wb') as output:
+            marshal.dump(stats, output)
+
+    def dump_trace(self, path):
+        """
+        Write the recent calls as a Chrome trace.
+        :param path: string | path of the output file
+        """
+
+        # Time spent in states is shown on a separate track, as it overlaps
+        # frames only partially
+        events = [{'name': section, 'cat': getattr(state, 'value', str(state)),
+                   'ph': 'X', 'ts': start / 1000.0, 'dur': duration / 1000.0,
+                   'pid': 1, 'tid': 2 if section == DWELL else 1}
+                  for section, state, start, duration in self.calls]
+
+        with open(path, 'w') as output:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'},
+                      output)
+
+    def dump(self, directory):
+        """
+        Write the cProfile statistics and the Chrome trace to a directory.
+        :param directory: string | output directory
+        :return: tuple of the paths of both files
+        """
+
+        paths = (os.path.join(directory, 'corsi_profile.prof'),
+                 os.path.join(directory, 'corsi_trace.json'))
+        self.dump_pstats(paths[0])
+        self.dump_trace(paths[1])
+        return paths
@@ -8,8 +8,6 @@ import os.path
 import pygame
 import pygame.locals as pl
 
-pygame.font.init()
-
 
 class TextInput:
     """
@@ -47,15 +45,29 @@ class TextInput:
         self.max_string_length = max_string_length
         self.input_string = initial_string  # Inputted text
 
-        if not os.path.isfile(font_family):
+        # Fonts are initialized on first use instead of at import time
+        if not pygame.font.get_init():
+            pygame.font.init()
+
+        # Only look up named system fonts, the default font needs no search
+        # through the installed fonts
+        if not font_family:
+            font_family = None
+        elif not os.path.isfile(font_family):
             font_family = pygame.font.match_font(font_family)
 
         self.font_object = pygame.font.Font(font_family, font_size)
 
-        # Text-surface will be created during the first update call:
+        # Text-surface will be created when it is first requested:
         self.surface = pygame.Surface((1, 1))
         self.surface.set_alpha(0)
 
+        # Text, cursor position and cursor visibility of the current surface:
+        self.rendered_state = (None, None, None)
+        self.rendered_string = None
+        self.text_surface = None
+        self.cursor_x_pos = None
+
         # Vars to make keydowns repeat after user pressed a key for some time:
         self.keyrepeat_counters = {}  # {event.key: (counter_int, event.unicode)} (look for "***")
         self.keyrepeat_intial_interval_ms = repeat_keys_initial_ms
@@ -72,93 +84,119 @@ class TextInput:
         self.clock = pygame.time.Clock()
 
     def update(self, events):
+        """
+        Process the input events of one frame. Call exactly once per frame, also without events, to advance key
+        repeat and cursor blinking. The text surface is only re-rendered when it is requested and the text or
+        cursor changed since the last rendering.
+        :param events: All events of the frame
+        :return: True if return was pressed
+        """
+        # Time since the previous frame:
+        elapsed_ms = self.clock.tick()
+        return_pressed = False
+
         for event in events:
             if event.type == pygame.KEYDOWN:
-                self.cursor_visible = True  # So the user sees where he writes
-
                 # If none exist, create counter for that key:
                 if event.key not in self.keyrepeat_counters:
                     self.keyrepeat_counters[event.key] = [0, event.unicode]
 
-                if event.key == pl.K_BACKSPACE:
-                    self.input_string = (
-                        self.input_string[:max(self.cursor_position - 1, 0)]
-                        + self.input_string[self.cursor_position:]
-                    )
-
-                    # Subtract one from cursor_pos, but do not go below zero:
-                    self.cursor_position = max(self.cursor_position - 1, 0)
-                elif event.key == pl.K_DELETE:
-                    self.input_string = (
-                        self.input_string[:self.cursor_position]
-                        + self.input_string[self.cursor_position + 1:]
-                    )
-
-                elif event.key == pl.K_RETURN:
-                    return True
-
-                elif event.key == pl.K_RIGHT:
-                    # Add one to cursor_pos, but do not exceed len(input_string)
-                    self.cursor_position = min(self.cursor_position + 1, len(self.input_string))
-
-                elif event.key == pl.K_LEFT:
-                    # Subtract one from cursor_pos, but do not go below zero:
-                    self.cursor_position = max(self.cursor_position - 1, 0)
-
-                elif event.key == pl.K_END:
-                    self.cursor_position = len(self.input_string)
-
-                elif event.key == pl.K_HOME:
-                    self.cursor_position = 0
-
-                elif len(self.input_string) < self.max_string_length or self.max_string_length == -1:
-                    # If no special key is pressed, add unicode of key to input_string
-                    self.input_string = (
-                        self.input_string[:self.cursor_position]
-                        + event.unicode
-                        + self.input_string[self.cursor_position:]
-                    )
-                    self.cursor_position += len(event.unicode)  # Some are empty, e.g. K_UP
+                if event.key == pl.K_RETURN:
+                    return_pressed = True
+                else:
+                    self.process_key(event.key, event.unicode)
 
             elif event.type == pl.KEYUP:
                 # *** Because KEYUP doesn't include event.unicode, this dict is stored in such a weird way
                 if event.key in self.keyrepeat_counters:
                     del self.keyrepeat_counters[event.key]
 
-        # Update key counters:
-        for key in self.keyrepeat_counters:
-            self.keyrepeat_counters[key][0] += self.clock.get_time()  # Update clock
-
-            # Generate new key events if enough time has passed:
-            if self.keyrepeat_counters[key][0] >= self.keyrepeat_intial_interval_ms:
-                self.keyrepeat_counters[key][0] = (
-                    self.keyrepeat_intial_interval_ms
-                    - self.keyrepeat_interval_ms
-                )
-
-                event_key, event_unicode = key, self.keyrepeat_counters[key][1]
-                pygame.event.post(pygame.event.Event(pl.KEYDOWN, key=event_key, unicode=event_unicode))
-
-        # Re-render text surface:
-        self.surface = self.font_object.render(self.input_string, self.antialias, self.text_color)
+        # Update key counters and repeat held keys directly instead of posting new events:
+        for key, counter in self.keyrepeat_counters.items():
+            counter[0] += elapsed_ms
+            while counter[0] >= self.keyrepeat_intial_interval_ms:
+                counter[0] -= self.keyrepeat_interval_ms
+                if key != pl.K_RETURN:
+                    self.process_key(key, counter[1])
 
         # Update self.cursor_visible
-        self.cursor_ms_counter += self.clock.get_time()
+        self.cursor_ms_counter += elapsed_ms
         if self.cursor_ms_counter >= self.cursor_switch_ms:
             self.cursor_ms_counter %= self.cursor_switch_ms
             self.cursor_visible = not self.cursor_visible
 
-        if self.cursor_visible:
-            cursor_y_pos = self.font_object.size(self.input_string[:self.cursor_position])[0]
+        return return_pressed
+
+    def process_key(self, key, unicode):
+        """
+        Apply a key press to the text and the cursor.
+        :param key: Key code of the pressed key
+        :param unicode: Character of the pressed key
+        """
+        self.cursor_visible = True  # So the user sees where he writes
+
+        if key == pl.K_BACKSPACE:
+            self.input_string = (
+                self.input_string[:max(self.cursor_position - 1, 0)]
+                + self.input_string[self.cursor_position:]
+            )
+
+            # Subtract one from cursor_pos, but do not go below zero:
+            self.cursor_position = max(self.cursor_position - 1, 0)
+        elif key == pl.K_DELETE:
+            self.input_string = (
+                self.input_string[:self.cursor_position]
+                + self.input_string[self.cursor_position + 1:]
+            )
+
+        elif key == pl.K_RIGHT:
+            # Add one to cursor_pos, but do not exceed len(input_string)
+            self.cursor_position = min(self.cursor_position + 1, len(self.input_string))
+
+        elif key == pl.K_LEFT:
+            # Subtract one from cursor_pos, but do not go below zero:
+            self.cursor_position = max(self.cursor_position - 1, 0)
+
+        elif key == pl.K_END:
+            self.cursor_position = len(self.input_string)
+
+        elif key == pl.K_HOME:
+            self.cursor_position = 0
+
+        elif len(self.input_string) < self.max_string_length or self.max_string_length == -1:
+            # If no special key is pressed, add unicode of key to input_string
+            self.input_string = (
+                self.input_string[:self.cursor_position]
+                + unicode
+                + self.input_string[self.cursor_position:]
+            )
+            self.cursor_position += len(unicode)  # Some are empty, e.g. K_UP
+
+    def get_surface(self):
+        state = (self.input_string, self.cursor_position, self.cursor_visible)
+        if state == self.rendered_state:
+            return self.surface
+
+        # Re-render text surface only if the text changed:
+        if self.input_string != self.rendered_string:
+            self.text_surface = self.font_object.render(self.input_string, self.antialias, self.text_color)
+            self.rendered_string = self.input_string
+            self.cursor_x_pos = None
+
+        # Re-measure cursor position only if text or cursor changed:
+        if self.cursor_x_pos is None or self.cursor_position != self.rendered_state[1]:
+            self.cursor_x_pos = self.font_object.size(self.input_string[:self.cursor_position])[0]
             # Without this, the cursor is invisible when self.cursor_position > 0:
             if self.cursor_position > 0:
-                cursor_y_pos -= self.cursor_surface.get_width()
-            self.surface.blit(self.cursor_surface, (cursor_y_pos, 0))
+                self.cursor_x_pos -= self.cursor_surface.get_width()
 
-        self.clock.tick()
-        return False
+        if self.cursor_visible:
+            self.surface = self.text_surface.copy()
+            self.surface.blit(self.cursor_surface, (self.cursor_x_pos, 0))
+        else:
+            self.surface = self.text_surface
 
-    def get_surface(self):
+        self.rendered_state = state
         return self.surface
 
     def get_text(self):
@@ -169,9 +207,13 @@ class TextInput:
 
     def set_text_color(self, color):
         self.text_color = color
+        # Render text again with the new color:
+        self.rendered_state = (None, None, None)
+        self.rendered_string = None
 
     def set_cursor_color(self, color):
         self.cursor_surface.fill(color)
+        self.rendered_state = (None, None, None)
 
     def clear_text(self):
         self.input_string = ""
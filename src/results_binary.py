@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Binary results format. Every table is appended to its own file of
+fixed-width little-endian records behind a small versioned header, so a file
+can be memory-mapped and read as an array of records without parsing (see
+binary_reader.py). The files are written by the results writer thread next
+to the CSV journals and are smaller than these, but not smaller than
+corsi.csv, which only keeps the final statistics of each participant.
+
+File layout:
+    header   magic b'CRSB', format version (uint16), table ID (uint16),
+             record size in bytes (uint32), 4 reserved bytes
+    records  fixed-width records of the table, see FORMATS
+"""
+
+import os
+import struct
+import sys
+
+# File header: magic, format version, table ID and record size
+MAGIC = b'CRSB'
+VERSION = 2
+HEADER = struct.Struct('<4sHHI4x')
+
+# Fields of the records of each table as (column, struct format character).
+# Columns are named as in results_writer.SCHEMA, missing values of float
+# columns are stored as NaN and screen positions as int16. Integer values
+# outside the range of their field are clamped to it. The boxes of a
+# sequence are stored in the order of presentation, the first boxes form the
+# sequence.
+FORMATS = {
+    'participants': (('participant_id', 'I'), ('seed', 'Q'),
+                     ('timestamp', 'd')),
+    'trials': (('participant_id', 'I'), ('trial', 'H'), ('corsi_span', 'H'),
+               ('mean_corsi_span', 'H'), ('std_corsi_span', 'H'),
+               ('timestamp', 'd')),
+    'sequences': (('participant_id', 'I'), ('trial', 'H'), ('sequence', 'H'),
+                  ('length', 'H'), ('correct', 'B'), ('errors', 'H'),
+                  ('timestamp', 'd')),
+    'boxes': (('participant_id', 'I'), ('sequence', 'H'), ('box', 'H'),
+              ('x', 'h'), ('y', 'h')),
+    'clicks': (('participant_id', 'I'), ('sequence', 'H'), ('click', 'H'),
+               ('box', 'h'), ('x', 'h'), ('y', 'h'),
+               ('reaction_time_ms', 'd'), ('inter_tap_ms', 'd'),
+               ('stimulus_latency_ms', 'd')),
+}
+
+# Table IDs stored in the file headers. IDs must never be reused.
+TABLE_IDS = {'participants': 1, 'trials': 2, 'sequences': 3, 'boxes': 4,
+             'clicks': 5}
+
+# Columns stored as integer multiples of 1 / scale. Mean and standard
+# deviation of the corsi spans are rounded to two decimals.
+SCALES = {'mean_corsi_span': 100, 'std_corsi_span': 100}
+
+# Packing of the records of each table
+RECORDS = {table: struct.Struct('<' + ''.join(code for _, code in fields))
+           for table, fields in FORMATS.items()}
+
+# Range of the values of the integer format characters
+LIMITS = {code: (-(1 << (8 * struct.calcsize(code) - 1)),
+                 (1 << (8 * struct.calcsize(code) - 1)) - 1)
+          if code.islower() else (0, (1 << (8 * struct.calcsize(code))) - 1)
+          for code in 'bBhHiIqQ'}
+
+
+def binary_path(directory, table):
+    """
+    Path of the binary file of a table.
+    :param directory: string | directory of the results files
+    :param table: string | name of the table
+    """
+
+    return os.path.join(directory, 'corsi_{}.bin'.format(table))
+
+
+def encoder(column, code):
+    """
+    Conversion of the values of a column to the values packed into a field.
+    :param column: string | name of the column
+    :param code: string | struct format character of the field
+    :return: function
+    """
+
+    if code not in LIMITS:
+        return lambda value: float('nan') if value is None else value
+
+    low, high = LIMITS[code]
+    scale = SCALES.get(column, 1)
+    return lambda value: min(max(int(round(value * scale)), low), high)
+
+
+def set_aside(path):
+    """
+    Rename a file that cannot be appended to, keeping earlier ones.
+    :param path: string | path of the file
+    :return: string | new path of the file
+    """
+
+    count = 1
+    while os.path.exists('{}.{}'.format(path, count)):
+        count += 1
+    target = '{}.{}'.format(path, count)
+    os.rename(path, target)
+    return target
+
+
+def check_header(path, table, header):
+    """
+    Check the header of a binary file.
+    :param path: string | path of the file, used in the error message
+    :param table: string | name of the table
+    :param header: bytes | first HEADER.size bytes of the file
+    :raise ValueError: if the file is not a binary file of the table in the
+    current format version
+    """
+
+    if len(header) < HEADER.size or HEADER.unpack(header[:HEADER.size]) != (
+            MAGIC, VERSION, TABLE_IDS[table], RECORDS[table].size):
+        raise ValueError('{} is not a binary {} file of version {}'.format(
+            path, table, VERSION))
+
+
+class BinaryJournals:
+
+    def __init__(self, directory):
+        """
+        Binary journals class. Appends records to one binary file per table.
+        Tables without a binary format are skipped.
+        :param directory: string | directory of the results files
+        """
+
+        self.directory = directory
+
+        # Open files by table
+        self.files = {}
+
+        # Positions of the record fields in the rows of each table and
+        # conversions of their values
+        self.columns = {}
+        self.encoders = {}
+
+    def open(self, schema):
+        """
+        Open all binary files for appending. Headers are written to new
+        files, records left incomplete by a crash are removed. Files with a
+        damaged header or of another format version are renamed to
+        <name>.bin.<n> and replaced by new files.
+        :param schema: dict of column names by table of the rows passed to
+        write()
+        :return: list of the open files
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        for table, fields in FORMATS.items():
+            if table not in schema:
+                continue
+            self.columns[table] = [schema[table].index(column)
+                                   for column, _ in fields]
+            self.encoders[table] = [encoder(column, code)
+                                    for column, code in fields]
+
+            path = binary_path(self.directory, table)
+            binary = open(path, 'ab+')
+            size = binary.seek(0, os.SEEK_END)
+            if size > 0:
+                binary.seek(0)
+                try:
+                    check_header(path, table, binary.read(HEADER.size))
+                except ValueError as error:
+                    binary.close()
+                    print('{}, moved to {}'.format(error, set_aside(path)),
+                          file=sys.stderr)
+                    binary = open(path, 'ab+')
+                    size = 0
+
+            if size == 0:
+                binary.write(HEADER.pack(MAGIC, VERSION, TABLE_IDS[table],
+                                         RECORDS[table].size))
+            else:
+                binary.truncate(size - (size - HEADER.size) %
+                                RECORDS[table].size)
+            self.files[table] = binary
+
+        return list(self.files.values())
+
+    def write(self, table, rows):
+        """
+        Append rows to the file of a table.
+        :param table: string | name of the table
+        :param rows: list of lists with the values of the columns of the table
+        """
+
+        binary = self.files.get(table)
+        if binary is None:
+            return
+
+        pack = RECORDS[table].pack
+        fields = list(zip(self.columns[table], self.encoders[table]))
+        binary.write(b''.join(
+            pack(*[encode(row[i]) for i, encode in fields]) for row in rows))
+
+    def close(self):
+        """
+        Close all files.
+        """
+
+        for binary in self.files.values():
+            binary.close()
+        self.files.clear()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+Embedded SQLite store of the results. Holds the same tables as the CSV
+journals of the results writer with indexes on the participant ID, so
+participant IDs can be validated and the results of a participant queried
+with an index lookup. The database runs in WAL mode: the results writer
+thread inserts batches of records inside transactions while analysis
+connections keep reading without blocking it.
+
+Usage:
+    python results_store.py corsi_results.sqlite 12
+"""
+
+import argparse
+import json
+import sqlite3
+
+from results_writer import SCHEMA
+
+# SQL types of all columns, columns not listed are stored as REAL
+COLUMN_TYPES = {'participant_id': 'INTEGER', 'trial': 'INTEGER',
+                'sequence': 'INTEGER', 'length': 'INTEGER',
+                'correct': 'INTEGER', 'errors': 'INTEGER', 'seed': 'INTEGER',
+                'corsi_span': 'INTEGER', 'click': 'INTEGER', 'box': 'INTEGER',
+                'x': 'INTEGER', 'y': 'INTEGER', 'time_ns': 'INTEGER',
+                'event': 'TEXT'}
+
+
+def create_statements():
+    """
+    SQL statements creating all tables and indexes.
+    :return: list of strings
+    """
+
+    statements = []
+    for table, columns in SCHEMA.items():
+        definitions = ['{} {}'.format(column, COLUMN_TYPES.get(column, 'REAL'))
+                       for column in columns]
+
+        # Each participant is stored once, all other tables are looked up by
+        # participant
+        if table == 'participants':
+            definitions[0] += ' PRIMARY KEY'
+        statements.append('CREATE TABLE IF NOT EXISTS {} ({})'.format(
+            table, ', '.join(definitions)))
+        if table != 'participants':
+            statements.append(
+                'CREATE INDEX IF NOT EXISTS {0}_participant ON {0} '
+                '(participant_id)'.format(table))
+
+    return statements
+
+
+class ResultsStore:
+
+    def __init__(self, path):
+        """
+        Results store class. Creates the database file and its tables if
+        necessary. Records are written through a connection opened with
+        open() in the writer thread, queries use a separate connection.
+        :param path: string | path of the database file
+        """
+
+        self.path = path
+
+        # Connection of the writer thread
+        self.connection = None
+
+        # Connection for queries, created on first query
+        self.reader = None
+
+        # Insert statement of each table
+        self.inserts = {
+            table: '{} INTO {} VALUES ({})'.format(
+                'INSERT OR IGNORE' if table == 'participants' else 'INSERT',
+                table, ', '.join('?' * len(columns)))
+            for table, columns in SCHEMA.items()}
+
+        connection = self.connect()
+        with connection:
+            for statement in create_statements():
+                connection.execute(statement)
+        connection.close()
+
+    def connect(self):
+        """
+        Open a connection in WAL mode.
+        :return: sqlite3 Connection object
+        """
+
+        connection = sqlite3.connect(self.path)
+        connection.execute('PRAGMA journal_mode=WAL')
+
+        # In WAL mode, committed transactions survive application crashes
+        # without a sync on every commit
+        connection.execute('PRAGMA synchronous=NORMAL')
+        return connection
+
+    def open(self):
+        """
+        Open the connection for writing. Has to be called in the thread that
+        writes the records.
+        """
+
+        self.connection = self.connect()
+
+    def insert(self, table, rows):
+        """
+        Insert rows into a table. Rows become visible to other connections
+        with the next commit.
+        :param table: string | name of the table, see SCHEMA
+        :param rows: list of lists with the values of the columns
+        """
+
+        self.connection.executemany(self.inserts[table], rows)
+
+    def commit(self):
+        """
+        Commit all rows inserted since the last commit in one transaction.
+        """
+
+        self.connection.commit()
+
+    def close(self):
+        """
+        Commit and close the connection for writing.
+        """
+
+        if self.connection is not None:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def query(self, sql, parameters=()):
+        """
+        Run a query on the reading connection.
+        :param sql: string | SQL query
+        :param parameters: tuple of query parameters
+        :return: list of rows
+        """
+
+        if self.reader is None:
+            self.reader = self.connect()
+
+        return self.reader.execute(sql, parameters).fetchall()
+
+    def has_participant(self, participant_id):
+        """
+        Check if a participant already took part.
+        :param participant_id: int | participant ID
+        :return: bool
+        """
+
+        return bool(self.query(
+            'SELECT 1 FROM participants WHERE participant_id = ?',
+            (participant_id,)))
+
+    def participant_results(self, participant_id):
+        """
+        Get all results of a participant.
+        :param participant_id: int | participant ID
+        :return: dict of lists of records by table
+        """
+
+        results = {}
+        for table, columns in SCHEMA.items():
+            rows = self.query('SELECT {} FROM {} WHERE participant_id = ? '
+                              'ORDER BY rowid'.format(', '.join(columns),
+                                                      table),
+                              (participant_id,))
+            results[table] = [dict(zip(columns, row)) for row in rows]
+
+        return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Show the results of a participant.')
+    parser.add_argument('path', help='results database')
+    parser.add_argument('participant_id', type=int, help='participant ID')
+    parser.add_argument('--tables', nargs='+', default=['participants',
+                                                         'trials'],
+                        help='tables to show')
+    args = parser.parse_args()
+
+    store_results = ResultsStore(args.path).participant_results(
+        args.participant_id)
+    print(json.dumps({table: store_results[table] for table in args.tables},
+                     indent=2))
@@ -0,0 +1,317 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming results writer. Records are handed over to a background thread
+which appends them to one CSV journal per table as they happen, so a crash
+loses at most the records of the last fsync interval. The render loop never
+waits for the disk. Optionally, the same records are inserted into a
+results store (see results_store.py) and appended to binary files (see
+results_binary.py).
+"""
+
+import csv
+import os
+import queue
+import sys
+import threading
+from time import monotonic
+
+# Columns of each results table. Every table is stored in its own file.
+SCHEMA = {
+    'participants': ('participant_id', 'seed', 'timestamp'),
+    'sequences': ('participant_id', 'trial', 'sequence', 'length', 'correct',
+                  'errors', 'timestamp'),
+    'boxes': ('participant_id', 'sequence', 'box', 'x', 'y'),
+    'trials': ('participant_id', 'trial', 'corsi_span', 'mean_corsi_span',
+               'std_corsi_span', 'timestamp'),
+    'clicks': ('participant_id', 'sequence', 'click', 'box', 'x', 'y',
+               'reaction_time_ms', 'inter_tap_ms', 'stimulus_latency_ms'),
+    'events': ('participant_id', 'sequence', 'event', 'time_ns', 'box', 'x',
+               'y'),
+}
+
+
+def journal_path(directory, table):
+    """
+    Path of the journal file of a table.
+    :param directory: string | directory of the results files
+    :param table: string | name of the table
+    """
+
+    return os.path.join(directory, 'corsi_{}.csv'.format(table))
+
+
+def repair_journal(path):
+    """
+    Remove an incomplete last line left behind by a crash during writing.
+    :param path: string | path of the journal file
+    """
+
+    with open(path, 'rb+') as journal:
+        end = journal.seek(0, os.SEEK_END)
+        if end == 0:
+            return
+        journal.seek(-1, os.SEEK_END)
+        if journal.read(1) == b'\n':
+            return
+
+        # Search backwards for the end of the last complete line, journals
+        # are too large to be read as a whole
+        while end > 0:
+            start = max(end - 4096, 0)
+            journal.seek(start)
+            index = journal.read(end - start).rfind(b'\n')
+            if index >= 0:
+                journal.truncate(start + index + 1)
+                return
+            end = start
+        journal.truncate(0)
+
+
+class ResultsWriter:
+
+    # Marker to stop the writer thread
+    STOP = object()
+
+    def __init__(self, directory, fsync_interval=1.0, store=None,
+                 binary=None):
+        """
+        Results writer class. Starts a background thread that writes all
+        records to the journal files in the given directory.
+        :param directory: string | directory of the results files
+        :param fsync_interval: float | maximum time between two fsync calls
+        in s
+        :param store: ResultsStore object to insert all records into as well,
+        None to only write the journals
+        :param binary: BinaryJournals object to append all records to as
+        well, None to only write the journals
+        """
+
+        self.directory = directory
+        self.fsync_interval = fsync_interval
+        self.store = store
+        self.binary = binary
+
+        # IDs of the participants written by this process, including those
+        # still waiting in the queue
+        self.participants = set()
+
+        # Records waiting to be written
+        self.queue = queue.Queue()
+
+        # Number of records written to disk and of records lost due to
+        # errors, and the last error. Errors are raised again by close().
+        self.records_written = 0
+        self.records_failed = 0
+        self.error = None
+
+        self.thread = threading.Thread(target=self.run, name='ResultsWriter',
+                                       daemon=True)
+        self.thread.start()
+
+    def write(self, table, **record):
+        """
+        Queue a record for writing. Never blocks.
+        :param table: string | name of the table, see SCHEMA
+        :param record: values of the columns of the table
+        """
+
+        self.write_many(table, [record])
+
+    def write_many(self, table, records):
+        """
+        Queue a batch of records of the same table for writing. Never blocks.
+        :param table: string | name of the table, see SCHEMA
+        :param records: list of dicts with the values of the columns
+        :raise RuntimeError: if the writer thread has stopped
+        """
+
+        if not self.thread.is_alive():
+            raise RuntimeError('Results writer is not running, {} records '
+                               'cannot be written'.format(table)) \
+                from self.error
+
+        columns = SCHEMA[table]
+        if table == 'participants':
+            self.participants.update(record['participant_id']
+                                     for record in records)
+        self.queue.put_nowait((table, [[record[column] for column in columns]
+                                       for record in records]))
+
+    def has_participant(self, participant_id):
+        """
+        Check if a participant already took part, in this process or, if a
+        results store is used, in any earlier session stored there.
+        :param participant_id: int | participant ID
+        :return: bool
+        """
+
+        if participant_id in self.participants:
+            return True
+
+        return self.store is not None and \
+            self.store.has_participant(participant_id)
+
+    def close(self):
+        """
+        Write all queued records and stop the writer thread.
+        :raise RuntimeError: if records could not be written
+        """
+
+        if self.thread.is_alive():
+            self.queue.put(self.STOP)
+            self.thread.join()
+
+        if self.error is not None:
+            raise RuntimeError('Results writer failed, {} records could not '
+                               'be written'.format(self.records_failed)) \
+                from self.error
+
+    def log_error(self, error, action, records=0):
+        """
+        Report an error of the writer thread and keep it for close().
+        :param error: Exception object
+        :param action: string | what failed
+        :param records: int | number of records lost
+        """
+
+        self.error = error
+        self.records_failed += records
+        print('Results writer: {} failed: {!r}'.format(action, error),
+              file=sys.stderr)
+
+    @staticmethod
+    def binary_error(error, action):
+        """
+        Report an error of the binary files. Errors of the binary files do
+        not make close() fail, as all records are still in the journals.
+        :param error: Exception object
+        :param action: string | what failed
+        """
+
+        print('Results writer: {} failed: {!r}'.format(action, error),
+              file=sys.stderr)
+
+    def open_journals(self):
+        """
+        Open the journal files of all tables for appending. Headers are
+        written to new files.
+        :return: dict of open files and dict of CSV writers by table
+        """
+
+        os.makedirs(self.directory, exist_ok=True)
+
+        files, writers = {}, {}
+        for table, columns in SCHEMA.items():
+            path = journal_path(self.directory, table)
+            if os.path.exists(path):
+                repair_journal(path)
+
+            files[table] = open(path, 'a', newline='')
+            writers[table] = csv.writer(files[table])
+
+            # Write header to empty file
+            if files[table].tell() == 0:
+                writers[table].writerow(columns)
+
+        return files, writers
+
+    def run(self):
+        """
+        Main loop of the writer thread. Errors are logged and do not stop the
+        thread, only the records of the failing batch are lost.
+        """
+
+        try:
+            self.write_journals()
+        except Exception as error:
+            self.log_error(error, 'opening the results files')
+
+    def write_journals(self):
+        """
+        Write queued records to the journals until stopped.
+        """
+
+        files, writers = self.open_journals()
+        try:
+            # The binary files are a copy of the journals, if they cannot be
+            # written the journals and the store are written without them
+            if self.binary is not None:
+                try:
+                    self.binary.open(SCHEMA)
+                except Exception as error:
+                    self.binary_error(error, 'opening the binary files')
+                    self.binary.close()
+                    self.binary = None
+            if self.store is not None:
+                self.store.open()
+            last_fsync = monotonic()
+            unsynced = False
+            running = True
+
+            while running:
+                try:
+                    items = [self.queue.get(timeout=self.fsync_interval)]
+                except queue.Empty:
+                    items = []
+
+                # Write all records available at once
+                while True:
+                    try:
+                        items.append(self.queue.get_nowait())
+                    except queue.Empty:
+                        break
+
+                for item in items:
+                    if item is self.STOP:
+                        running = False
+                        continue
+                    table, rows = item
+                    try:
+                        writers[table].writerows(rows)
+                        if self.store is not None:
+                            self.store.insert(table, rows)
+                        self.records_written += len(rows)
+                    except Exception as error:
+                        self.log_error(error, 'writing {} {} records'.format(
+                            len(rows), table), len(rows))
+                    if self.binary is not None:
+                        try:
+                            self.binary.write(table, rows)
+                        except Exception as error:
+                            self.binary_error(error, 'writing {} {} records '
+                                                     'to the binary file'
+                                                     .format(len(rows), table))
+                    unsynced = True
+
+                if not unsynced:
+                    continue
+
+                try:
+                    # Records of all available items are inserted in one
+                    # transaction
+                    if self.store is not None and items:
+                        self.store.commit()
+
+                    # Hand over records to the operating system right away and
+                    # force them to disk periodically
+                    journals = list(files.values())
+                    if self.binary is not None:
+                        journals += self.binary.files.values()
+                    for journal in journals:
+                        journal.flush()
+
+                    if not running or \
+                            monotonic() - last_fsync >= self.fsync_interval:
+                        for journal in journals:
+                            os.fsync(journal.fileno())
+                        last_fsync = monotonic()
+                        unsynced = False
+                except Exception as error:
+                    self.log_error(error, 'saving the results')
+        finally:
+            for journal in files.values():
+                journal.close()
+            if self.binary is not None:
+                self.binary.close()
+            if self.store is not None:
+                self.store.close()
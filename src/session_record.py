@@ -0,0 +1,211 @@
+# -*- coding: utf-8 -*-
+"""
+Compact record of a session for deterministic replay. A session is fully
+determined by its seed, its parameters and the times and arguments of its
+inputs. These are stored in typed arrays and written to a small binary file.
+Replaying re-executes the session without a display at maximum speed on a
+virtual clock and checks that the same sequences and results come out.
+
+Usage:
+    python session_record.py corsi_session_12_123456.rec
+"""
+
+import argparse
+import hashlib
+import json
+import struct
+from array import array
+from time import perf_counter
+
+# Input kinds
+SUBMIT_ID, START, CLICK, CONTINUE, UPDATE = 0, 1, 2, 3, 4
+INPUT_NAMES = ('submit_id', 'start', 'click', 'continue', 'update')
+
+# File header: magic, format version and length of the JSON parameters
+MAGIC = b'CRSR'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+
+
+class SessionRecorder:
+
+    def __init__(self, seed, parameters):
+        """
+        Session recorder class. Records the inputs of one session.
+        :param seed: int | seed of the session
+        :param parameters: dict | parameters needed to re-create the session
+        (screen size, box parameters, start delay, ...)
+        """
+
+        self.seed = seed
+        self.parameters = parameters
+
+        # One array per input attribute. Times are stored exactly as read
+        # from the time source of the session.
+        self.times = array('d')
+        self.kinds = array('b')
+        self.xs = array('i')
+        self.ys = array('i')
+
+        # Digest of all generated sequences and their outcomes
+        self.digest = hashlib.sha1()
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, time, kind, x=0, y=0):
+        """
+        Record an input.
+        :param time: float | time of the input as read from the time source
+        :param kind: int | SUBMIT_ID, START, CLICK, CONTINUE or UPDATE
+        :param x: int | x position of a click or the submitted participant ID
+        :param y: int | y position of a click
+        """
+
+        self.times.append(time)
+        self.kinds.append(kind)
+        self.xs.append(x)
+        self.ys.append(y)
+
+    def add_outcome(self, *values):
+        """
+        Add values that describe the course of the session, e.g. box positions
+        or correctness of a sequence, to the digest.
+        """
+
+        self.digest.update(repr(values).encode())
+
+    def inputs(self):
+        """
+        Iterate over all recorded inputs.
+        :return: iterator of (time, kind, x, y)
+        """
+
+        return zip(self.times, self.kinds, self.xs, self.ys)
+
+    def save(self, path):
+        """
+        Write the recording to a file.
+        :param path: string | path of the recording file
+        """
+
+        meta = json.dumps({'seed': self.seed, 'parameters': self.parameters,
+                           'inputs': len(self),
+                           'digest': self.digest.hexdigest()}).encode()
+
+        with open(path, 'wb') as record:
+            record.write(HEADER.pack(MAGIC, VERSION, len(meta)))
+            record.write(meta)
+            for values in (self.times, self.kinds, self.xs, self.ys):
+                values.tofile(record)
+
+
+def load_recording(path):
+    """
+    Read a recording file.
+    :param path: string | path of the recording file
+    :return: SessionRecorder object with the recorded inputs and the digest
+    of the recorded session as attribute recorded_digest
+    """
+
+    with open(path, 'rb') as record:
+        magic, version, meta_length = HEADER.unpack(record.read(HEADER.size))
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a session recording of version '
+                             '{}'.format(path, VERSION))
+
+        meta = json.loads(record.read(meta_length).decode())
+        recording = SessionRecorder(meta['seed'], meta['parameters'])
+        recording.recorded_digest = meta['digest']
+
+        n = meta['inputs']
+        for values in (recording.times, recording.kinds, recording.xs,
+                       recording.ys):
+            values.fromfile(record, n)
+
+    return recording
+
+
+def parse_participant_id(text):
+    """
+    Participant ID as stored in a recording. Text that is not a valid
+    integer is stored as -1, which is rejected on replay just like the
+    original text.
+    :param text: string | participant ID as typed by the participant
+    :return: int
+    """
+
+    try:
+        value = int(text)
+    except ValueError:
+        return -1
+
+    return value if 0 <= value < 2 ** 31 else -1
+
+
+def replay(recording, results_writer=None):
+    """
+    Re-execute a recorded session on a virtual clock without a display.
+    :param recording: SessionRecorder object
+    :param results_writer: ResultsWriter object to write the results of the
+    replayed session to, None to discard them. Its results store must not
+    hold the participant yet, otherwise the participant ID is rejected.
+    :return: replayed Session object, its recorder holds the digest of the
+    replayed session
+    """
+
+    # Imported here so that recordings can be read without PyGame
+    from Final_Corsi_OOP import Session
+    from simulation import VirtualClock
+
+    clock = VirtualClock()
+    parameters = recording.parameters
+    session = Session(tuple(parameters['screen_size']),
+                      parameters['box_parameters'],
+                      parameters['start_delay'],
+                      parameters['max_participants'],
+                      parameters['max_trials'], clock, clock.ns,
+                      results_writer, parameters['frame_period'],
+                      seed=recording.seed)
+
+    for time, kind, x, y in recording.inputs():
+        clock.now = time
+
+        if kind == UPDATE:
+            session.update()
+        elif kind == CLICK:
+            session.click((x, y))
+        elif kind == SUBMIT_ID:
+            session.submit_id(str(x))
+        elif kind == START:
+            session.start()
+        elif kind == CONTINUE:
+            session.next_sequence()
+
+    return session
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Replay a recorded session and verify its outcome.')
+    parser.add_argument('path', help='session recording')
+    parser.add_argument('--repeat', type=int, default=1,
+                        help='replay several times, e.g. for timing')
+    args = parser.parse_args()
+
+    loaded = load_recording(args.path)
+
+    start = perf_counter()
+    for _ in range(args.repeat):
+        replayed = replay(loaded)
+    duration = (perf_counter() - start) / args.repeat
+
+    participant = replayed.participant
+    print(json.dumps({
+        'seed': loaded.seed, 'inputs': len(loaded),
+        'participant_id': participant and participant.participant_id,
+        'corsi_spans': participant and participant.corsi_spans,
+        'state': replayed.state.value,
+        'identical': replayed.recorder.digest.hexdigest() ==
+        loaded.recorded_digest,
+        'replay_ms': round(duration * 1000.0, 3)}, indent=2))
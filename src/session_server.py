@@ -0,0 +1,482 @@
+# -*- coding: utf-8 -*-
+"""
+Asyncio engine that runs many Corsi sessions in one process. Each client
+(e.g. a thin-client station or a simulated participant) connects over a
+local TCP socket and drives its own session with newline-delimited JSON
+commands. Nothing is rendered by the server: clients receive the state of
+their session and draw it themselves. All sessions share the layout
+generation code and a single results writer.
+
+Commands (one JSON object per line):
+    {"cmd": "id", "text": "12"}       submit participant ID
+    {"cmd": "start"}                  leave instructions, start first trial
+    {"cmd": "click", "pos": [x, y]}   click during user input
+    {"cmd": "continue"}               leave feedback
+    {"cmd": "state"}                  request current state
+
+Every command is answered with the state of the session. While a sequence
+is shown, the state is pushed to the client on every highlighting change.
+
+Usage:
+    python session_server.py --port 8765
+    python session_server.py --simulate 200 --speed 50
+"""
+
+import os
+
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import asyncio
+import json
+import random
+from time import perf_counter
+
+import Final_Corsi_OOP as corsi
+from Final_Corsi_OOP import State
+from board import HIGHLIGHT
+
+# Connections waiting to be accepted, e.g. a whole simulated cohort
+# connecting at once
+BACKLOG = 1024
+
+# Simulated clients connecting at the same time and time in s a client
+# waits for the first state of its session
+MAX_CONNECTING = 64
+CONNECT_TIMEOUT = 10.0
+
+
+class ScaledClock:
+
+    def __init__(self, speed=1.0):
+        """
+        Clock that runs faster than real time, e.g. to run simulated cohorts
+        with the regular highlight durations.
+        :param speed: float | factor by which the clock runs faster
+        """
+
+        self.speed = speed
+        self.origin = perf_counter()
+
+    def __call__(self):
+        return (perf_counter() - self.origin) * self.speed
+
+    def ns(self):
+        """
+        Current time in ns.
+        """
+
+        return int(self() * 1e9)
+
+    def delay(self, duration):
+        """
+        Real time in s that corresponds to a duration on this clock.
+        :param duration: float | duration on this clock in s
+        """
+
+        return duration / self.speed
+
+
+class SessionServer:
+
+    # Commands of the protocol and the state in which they are allowed
+    COMMANDS = {'id': State.PARTICIPANT_ID, 'start': State.INSTRUCTIONS,
+                'click': State.USER_INPUT, 'continue': State.FEEDBACK}
+
+    # States in which the boxes are sent to the client
+    BOX_STATES = frozenset((State.SHOW_SEQUENCE, State.USER_INPUT,
+                            State.FEEDBACK))
+
+    def __init__(self, screen_size=corsi.SCREEN_SIZE,
+                 box_parameters=corsi.BOX_PARAMS,
+                 start_delay=corsi.START_DELAY,
+                 max_participants=corsi.MAX_PARTICIPANTS,
+                 max_trials=corsi.MAX_TRIALS, results_dir=corsi.RESULTS_DIR,
+                 speed=1.0):
+        """
+        Session server class. Creates a session for every connected client.
+        :param screen_size: tuple (int, int) | (width, height) of the client
+        screens
+        :param box_parameters: dict | box parameters (number, size, dist., ...)
+        :param start_delay: float | time before first corsi box is shown in s
+        :param max_participants: int | maximum number of participants
+        :param max_trials: int | maximum number of attempts per participant
+        :param results_dir: string | directory of the results files, None to
+        disable writing results
+        :param speed: float | factor by which session time runs faster than
+        real time
+        """
+
+        self.screen_size = screen_size
+        self.box_parameters = box_parameters
+        self.start_delay = start_delay
+        self.max_participants = max_participants
+        self.max_trials = max_trials
+
+        self.clock = ScaledClock(speed)
+
+        # Results of all sessions are streamed by a single writer
+        self.results_writer = None
+        if results_dir is not None:
+            self.results_writer = corsi.open_results_writer(results_dir)
+
+        # Participant IDs of the running sessions
+        self.active_ids = set()
+
+        # Number of sessions started and finished
+        self.sessions_started = 0
+        self.sessions_finished = 0
+
+    def create_session(self):
+        """
+        Create a new session. Sessions are created per connection and don't
+        touch the display.
+        :return: Session object
+        """
+
+        self.sessions_started += 1
+        return corsi.Session(self.screen_size, self.box_parameters,
+                             self.start_delay, self.max_participants,
+                             self.max_trials, self.clock, self.clock.ns,
+                             self.results_writer)
+
+    def close(self):
+        """
+        Write all queued results and stop the results writer.
+        """
+
+        if self.results_writer is not None:
+            self.results_writer.close()
+
+    @staticmethod
+    def snapshot(session):
+        """
+        State of a session as sent to the client.
+        :param session: Session object
+        :return: dict
+        """
+
+        state = {'state': session.state.value, 'finished': False}
+
+        if session.participant is not None:
+            state['participant_id'] = session.participant.participant_id
+            state['trial'] = session.participant.current_trial
+
+        if session.state in SessionServer.BOX_STATES:
+            boxes = session.sequence.boxes
+            state['boxes'] = [list(pos) for pos in boxes.positions()]
+            state['length'] = session.sequence.length
+            highlight = boxes.find_flag(HIGHLIGHT)
+            state['highlight'] = highlight if highlight >= 0 else None
+
+        if session.state is State.FEEDBACK:
+            message, summary, feedback = session.feedback_text()
+            state.update(message=message, summary=summary, feedback=feedback,
+                         finished=session.finished)
+
+        return state
+
+    def handle_command(self, session, command):
+        """
+        Apply a client command to a session.
+        :param session: Session object
+        :param command: dict | decoded command
+        :return: string | error message, None if the command was accepted
+        """
+
+        cmd = command.get('cmd')
+
+        if cmd == 'state':
+            return None
+
+        if self.COMMANDS.get(cmd) is not session.state:
+            return 'Command {!r} not allowed in state {}'.format(
+                cmd, session.state.value)
+
+        return getattr(self, 'command_' + cmd)(session, command)
+
+    def command_id(self, session, command):
+        """
+        Submit the participant ID.
+        """
+
+        text = str(command.get('text', ''))
+        if text.strip().isdigit() and int(text) in self.active_ids:
+            return 'Participant ID already in use'
+        if not session.submit_id(text):
+            return session.id_error
+        self.active_ids.add(session.participant.participant_id)
+
+    def command_start(self, session, command):
+        """
+        Leave the instructions and start the first trial.
+        """
+
+        session.start()
+
+    def command_click(self, session, command):
+        """
+        Click at a position during user input.
+        """
+
+        pos = command.get('pos')
+        if not isinstance(pos, (list, tuple)) or len(pos) != 2 or \
+                not all(isinstance(value, (int, float)) and
+                        not isinstance(value, bool) for value in pos):
+            return 'Click requires a position [x, y]'
+
+        # Positions outside of the screen cannot hit a box and do not fit
+        # into the event log and the results
+        if not (0 <= pos[0] < self.screen_size[0] and
+                0 <= pos[1] < self.screen_size[1]):
+            return 'Click position {} outside of the screen of size {}'.format(
+                pos, list(self.screen_size))
+        session.click((int(pos[0]), int(pos[1])))
+
+    def command_continue(self, session, command):
+        """
+        Leave the feedback.
+        """
+
+        if session.finished:
+            return 'Session finished'
+        session.next_sequence()
+
+    async def present(self, session, send):
+        """
+        Present the sequence of a session. Sleeps until the next highlighting
+        change is due and pushes every change to the client.
+        :param session: Session object
+        :param send: coroutine function sending a message to the client
+        """
+
+        sequence = session.sequence
+        while session.state is State.SHOW_SEQUENCE:
+            changes = sequence.highlight_box_id
+            session.update()
+
+            if sequence.highlight_box_id != changes:
+                await send(self.snapshot(session))
+                sequence.presented(self.clock())
+
+            if session.state is not State.SHOW_SEQUENCE:
+                break
+
+            # Wait for the deadline of the next change, which is later than
+            # planned if changes were delayed
+            deadline = sequence.schedule.next_deadline()
+            await asyncio.sleep(max(self.clock.delay(
+                deadline - self.clock()), 0))
+
+    async def serve_client(self, reader, writer):
+        """
+        Run a session for a connected client until the connection is closed.
+        :param reader: asyncio StreamReader of the connection
+        :param writer: asyncio StreamWriter of the connection
+        """
+
+        session = self.create_session()
+        presentation = None
+
+        async def send(message):
+            writer.write(json.dumps(message).encode() + b'\n')
+            await writer.drain()
+
+        def start_presentation():
+            # Present each new sequence in the background
+            nonlocal presentation
+            presentation = asyncio.ensure_future(self.present(session, send))
+
+        session.machine.set_handlers(State.SHOW_SEQUENCE,
+                                     enter=start_presentation)
+
+        try:
+            await send(self.snapshot(session))
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                # Layouts are handed over synchronously by the session, so
+                # prefetches still running are awaited here instead of
+                # blocking all other sessions
+                await session.layouts.ready()
+
+                try:
+                    command = json.loads(line)
+                    error = self.handle_command(session, command)
+                except (ValueError, AttributeError):
+                    error = 'Invalid command'
+
+                reply = self.snapshot(session)
+                if error is not None:
+                    reply['error'] = error
+                await send(reply)
+
+        except ConnectionError:
+            pass
+
+        finally:
+            if presentation is not None:
+                presentation.cancel()
+            if session.participant is not None:
+                self.active_ids.discard(session.participant.participant_id)
+                if session.finished:
+                    self.sessions_finished += 1
+
+                # Keep the recording of the session for replay
+                if self.results_writer is not None:
+                    session.save_recording(self.results_writer.directory)
+            writer.close()
+
+    async def serve(self, host='127.0.0.1', port=8765, backlog=BACKLOG):
+        """
+        Accept clients until cancelled.
+        :param host: string | address to listen on
+        :param port: int | port to listen on, 0 for any free port
+        :param backlog: int | maximum number of connections waiting to be
+        accepted
+        :return: asyncio Server object
+        """
+
+        return await asyncio.start_server(self.serve_client, host, port,
+                                          backlog=backlog)
+
+
+async def simulated_client(host, port, participant_id, participant,
+                           connecting=None):
+    """
+    Client that runs a full session with a simulated participant.
+    :param host: string | address of the server
+    :param port: int | port of the server
+    :param participant_id: int | participant ID to submit
+    :param participant: simulation.SimulatedParticipant object
+    :param connecting: asyncio Semaphore limiting the clients that connect
+    at the same time, None for no limit
+    :return: dict | last state of the session
+    """
+
+    # A semaphore of its own does not limit the client
+    connecting = connecting or asyncio.Semaphore(1)
+
+    async def request(**command):
+        writer.write(json.dumps(command).encode() + b'\n')
+        await writer.drain()
+        return await receive()
+
+    async def receive():
+        return json.loads(await reader.readline())
+
+    async with connecting:
+        reader, writer = await asyncio.open_connection(host, port)
+        try:
+            await asyncio.wait_for(receive(), CONNECT_TIMEOUT)
+        except asyncio.TimeoutError:
+            writer.close()
+            return {'error': 'No session started within {} s'.format(
+                CONNECT_TIMEOUT)}
+
+    state = await request(cmd='id', text=str(participant_id))
+    if 'error' in state:
+        writer.close()
+        return state
+    state = await request(cmd='start')
+
+    while True:
+        # Wait for the end of the presentation
+        while state['state'] == 'ShowSequence':
+            state = await receive()
+
+        boxes = [_ClientBox(pos) for pos in state['boxes']]
+        for pos in participant.respond(boxes, state['length']):
+            state = await request(cmd='click', pos=list(pos))
+            if state['state'] != 'UserInput':
+                break
+
+        if state['finished']:
+            break
+        state = await request(cmd='continue')
+
+    writer.close()
+    return state
+
+
+class _ClientBox:
+
+    def __init__(self, pos):
+        # Box as seen by a client, only the position is known
+        self.pos = tuple(pos)
+
+
+async def run_simulated_cohort(n_clients, speed, seed=0, results_dir=None):
+    """
+    Start a server and run simulated clients against it concurrently.
+    :param n_clients: int | number of simultaneous sessions
+    :param speed: float | factor by which session time runs faster than
+    real time
+    :param seed: int | seed of the first participant
+    :param results_dir: string | directory of the results files or None
+    :return: SessionServer object
+    """
+
+    from simulation import SimulatedParticipant
+
+    server = SessionServer(results_dir=results_dir, speed=speed,
+                           max_participants=max(corsi.MAX_PARTICIPANTS,
+                                                n_clients))
+    listener = await server.serve(port=0)
+    host, port = listener.sockets[0].getsockname()[:2]
+    connecting = asyncio.Semaphore(MAX_CONNECTING)
+
+    async with listener:
+        await asyncio.gather(*[
+            simulated_client(host, port, i + 1,
+                             SimulatedParticipant(random.Random(seed + i)),
+                             connecting)
+            for i in range(n_clients)])
+
+    server.close()
+    return server
+
+
+async def main(args):
+    server = SessionServer(results_dir=args.results_dir, speed=args.speed)
+    listener = await server.serve(args.host, args.port)
+    print('Serving sessions on {}:{}'.format(args.host, args.port))
+
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve Corsi sessions to clients over a local socket.')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on')
+    parser.add_argument('--port', type=int, default=8765,
+                        help='port to listen on')
+    parser.add_argument('--results-dir', default=corsi.RESULTS_DIR,
+                        help='directory of the results files')
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help='factor by which session time runs faster than '
+                             'real time')
+    parser.add_argument('--simulate', type=int, default=0,
+                        help='run this many simulated clients and exit')
+    args = parser.parse_args()
+
+    if args.simulate:
+        start = perf_counter()
+        server = asyncio.run(run_simulated_cohort(args.simulate, args.speed,
+                                                  results_dir=None))
+        print('{} of {} sessions finished in {:.2f} s'.format(
+            server.sessions_finished, server.sessions_started,
+            perf_counter() - start))
+    else:
+        try:
+            asyncio.run(main(args))
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,308 @@
+# -*- coding: utf-8 -*-
+"""
+Headless simulation of the Corsi application. Runs the real state machine of
+the application on the SDL dummy video driver with a virtual clock and feeds
+it with synthetic events from simulated participants. Frames are not drawn
+unless requested, so a process runs about 200 sessions per second, most of
+the time going into the box layouts and the session logic. Use more
+workers for larger cohorts.
+
+Usage:
+    python simulation.py --sessions 1000 --workers 4
+"""
+
+import os
+
+# Render into memory instead of a window
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+os.environ.setdefault('PYGAME_HIDE_SUPPORT_PROMPT', '1')
+
+import argparse
+import multiprocessing
+import random
+from time import perf_counter
+
+import pygame
+from pygame.locals import KEYDOWN, KEYUP, K_RETURN, K_SPACE, MOUSEBUTTONUP
+
+import Final_Corsi_OOP as corsi
+
+
+class VirtualClock:
+
+    def __init__(self, start=0.0):
+        """
+        Clock that only advances when told to. Can be used as time source of
+        the application.
+        :param start: float | initial time in s
+        """
+
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def ns(self):
+        """
+        Current time in ns.
+        """
+
+        return int(round(self.now * 1e9))
+
+    def advance(self, seconds):
+        """
+        Advance the clock.
+        :param seconds: float | time step in s
+        """
+
+        self.now += seconds
+
+
+class SimulatedParticipant:
+
+    def __init__(self, rng, span_mean=5.0, span_std=1.0, lapse_rate=0.05,
+                 tap_interval=0.7):
+        """
+        Simulated participant that reproduces sequences up to a personal
+        memory span and makes occasional random errors.
+        :param rng: random.Random | random number generator of the participant
+        :param span_mean: float | mean memory span of the population
+        :param span_std: float | standard deviation of the memory span
+        :param lapse_rate: float | probability of an error on each click
+        :param tap_interval: float | mean time between two clicks in s
+        """
+
+        self.rng = rng
+        self.span = rng.gauss(span_mean, span_std)
+        self.lapse_rate = lapse_rate
+        self.tap_interval = tap_interval
+
+    def tap_time(self):
+        """
+        Time until the next click in s.
+        """
+
+        return max(self.rng.gauss(self.tap_interval, 0.2), 0.1)
+
+    def respond(self, boxes, length):
+        """
+        Generate the clicks in response to a sequence.
+        :param boxes: list of box objects, the first length boxes form the
+        sequence
+        :param length: int | length of the sequence
+        :return: list of click positions (int, int)
+        """
+
+        clicks = []
+        for i in range(length):
+            # Sequences longer than the memory span fail at a random position
+            if (length > self.span + self.rng.gauss(0, 0.5) and
+                    self.rng.random() < 1.0 / (length - i)) or \
+                    self.rng.random() < self.lapse_rate:
+                wrong = [box for j, box in enumerate(boxes) if j != i]
+                clicks.append(self.rng.choice(wrong).pos)
+                break
+            clicks.append(boxes[i].pos)
+
+        return clicks
+
+
+def key_events(key, unicode=''):
+    """
+    Key press and release events of a single key.
+    """
+
+    return [pygame.event.Event(KEYDOWN, key=key, unicode=unicode, mod=0),
+            pygame.event.Event(KEYUP, key=key, mod=0)]
+
+
+def click_event(pos):
+    """
+    Mouse click event at given position.
+    """
+
+    return pygame.event.Event(MOUSEBUTTONUP, pos=pos, button=1)
+
+
+class Simulation:
+
+    def __init__(self, screen_size=corsi.SCREEN_SIZE,
+                 box_parameters=corsi.BOX_PARAMS,
+                 start_delay=corsi.START_DELAY,
+                 max_participants=corsi.MAX_PARTICIPANTS,
+                 max_trials=corsi.MAX_TRIALS, render=False):
+        """
+        Headless driver for the application. Creates the application once
+        and runs any number of sessions on it.
+        :param screen_size: tuple (int, int) | (width, height)
+        :param box_parameters: dict | box parameters (number, size, dist., ...)
+        :param start_delay: float | time before first corsi box is shown in s
+        :param max_participants: int | maximum number of participants
+        :param max_trials: int | maximum number of attempts per participant
+        :param render: bool | draw every frame into a full-size screen.
+        Otherwise, frames are not drawn and only the session is advanced.
+        """
+
+        self.clock = VirtualClock()
+        self.app = corsi.Application(screen_size, box_parameters, start_delay,
+                                     max_participants, max_trials,
+                                     vsync=False, time_source=self.clock,
+                                     time_source_ns=self.clock.ns,
+                                     results_dir=None)
+        self.render = render
+
+        # Time step that completes the current stimulus in a single frame
+        self.sequence_step = max(start_delay, box_parameters['t_highlight'])
+
+    def frame(self, events=()):
+        """
+        Run one frame of the main loop with the given events.
+        :param events: list of PyGame event objects
+        """
+
+        self.app.frame(events=list(events), draw=self.render)
+
+    def run_session(self, participant_id, participant, seed=None):
+        """
+        Run a full session from participant ID input until the end of the
+        last trial.
+        :param participant_id: int | participant ID typed into the application
+        :param participant: SimulatedParticipant object
+        :param seed: int | seed of the box layouts, None for a random seed
+        :return: dict with the results and the number of frames
+        """
+
+        app = self.app
+        app.reset(seed)
+        session = app.session
+        frames = 0
+
+        # Type participant ID and confirm
+        for digit in str(participant_id):
+            self.frame(key_events(ord(digit), digit))
+        self.frame(key_events(K_RETURN, '\r'))
+
+        # Leave instructions
+        self.frame(key_events(K_SPACE, ' '))
+        frames += len(str(participant_id)) + 2
+
+        while True:
+            # Present sequence, each frame completes one stimulus
+            while session.state is corsi.State.SHOW_SEQUENCE:
+                self.clock.advance(self.sequence_step)
+                self.frame()
+                frames += 1
+
+            # Reproduce sequence until feedback is shown
+            for pos in participant.respond(session.sequence.boxes,
+                                           session.sequence.length):
+                self.clock.advance(participant.tap_time())
+                self.frame([click_event(pos)])
+                frames += 1
+                if session.state is not corsi.State.USER_INPUT:
+                    break
+
+            # Show feedback once
+            self.frame()
+            frames += 1
+
+            if session.finished:
+                break
+
+            # Continue with next sequence
+            self.frame(key_events(K_SPACE, ' '))
+            frames += 1
+
+        return {'participant_id': participant_id,
+                'corsi_spans': list(session.participant.corsi_spans),
+                'mean_corsi_span': session.participant.mean_corsi_span,
+                'std_corsi_span': session.participant.std_corsi_span,
+                'frames': frames,
+                'timing': session.sequence.timing_report()}
+
+
+# Simulation of the current worker process
+_worker_simulation = None
+
+
+def _init_worker(render):
+    """
+    Create the simulation of a worker process.
+    """
+
+    # SDL installs handlers that swallow SIGTERM, which the pool sends to
+    # stop its workers
+    os.environ['SDL_NO_SIGNAL_HANDLERS'] = '1'
+
+    global _worker_simulation
+    _worker_simulation = Simulation(render=render)
+
+
+def _run_worker_session(seed):
+    """
+    Run a session with a participant generated from the seed in a worker
+    process.
+    """
+
+    rng = random.Random(seed)
+    participant_id = rng.randint(1, corsi.MAX_PARTICIPANTS)
+    return _worker_simulation.run_session(participant_id,
+                                          SimulatedParticipant(rng), seed)
+
+
+def run_sessions(n_sessions, workers=1, seed=0, render=False):
+    """
+    Run simulated sessions, optionally spread over a pool of processes.
+    :param n_sessions: int | number of sessions
+    :param workers: int | number of processes
+    :param seed: int | seed of the first session
+    :param render: bool | draw into a full-size screen
+    :return: list of session results
+    """
+
+    seeds = range(seed, seed + n_sessions)
+
+    if workers <= 1:
+        _init_worker(render)
+        return [_run_worker_session(s) for s in seeds]
+
+    pool = multiprocessing.Pool(workers, _init_worker, (render,))
+    try:
+        results = pool.map(_run_worker_session, seeds,
+                           chunksize=max(n_sessions // (4 * workers), 1))
+        pool.close()
+    except BaseException:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run simulated sessions of the Corsi application.')
+    parser.add_argument('--sessions', type=int, default=1000,
+                        help='number of sessions')
+    parser.add_argument('--workers', type=int,
+                        default=multiprocessing.cpu_count(),
+                        help='number of processes')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first session')
+    parser.add_argument('--render', action='store_true',
+                        help='draw every frame into a full-size screen')
+    args = parser.parse_args()
+
+    start = perf_counter()
+    results = run_sessions(args.sessions, args.workers, args.seed,
+                           args.render)
+    duration = perf_counter() - start
+
+    frames = sum(result['frames'] for result in results)
+    spans = [result['mean_corsi_span'] for result in results]
+    print('{} sessions, {} frames in {:.2f} s: {:.0f} sessions/s, '
+          '{:.0f} frames/s'.format(len(results), frames, duration,
+                                   len(results) / duration,
+                                   frames / duration))
+    print('Mean corsi span: {:.2f}'.format(sum(spans) / len(spans)))
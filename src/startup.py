@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+"""
+Lazy, measured initialization of resources such as fonts and images.
+Resources are loaded on first use or ahead of time by a warm-up thread while
+the first screen is already interactive. The duration of every
+initialization step is recorded for a startup timing breakdown.
+"""
+
+import threading
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class StartupTimer:
+
+    def __init__(self, clock=perf_counter):
+        """
+        Startup timer class. Records the duration of initialization steps and
+        the time of startup milestones relative to the creation of the timer.
+        :param clock: function returning the current time in s
+        """
+
+        self.clock = clock
+        self.start = clock()
+
+        # Duration of each step in ms and name of the thread that ran it
+        self.steps = {}
+
+        # Time of each milestone since start in ms
+        self.milestones = {}
+
+        # Steps may be measured by the warm-up thread
+        self.lock = threading.Lock()
+
+    @contextmanager
+    def measure(self, name):
+        """
+        Measure the duration of a step, e.g. `with timer.measure('display'):`
+        :param name: string | name of the step
+        """
+
+        start = self.clock()
+        try:
+            yield
+        finally:
+            duration = (self.clock() - start) * 1000.0
+            with self.lock:
+                self.steps[name] = (duration,
+                                    threading.current_thread().name)
+
+    def milestone(self, name):
+        """
+        Record the time of a milestone, only the first time it is reached.
+        :param name: string | name of the milestone
+        """
+
+        with self.lock:
+            self.milestones.setdefault(
+                name, (self.clock() - self.start) * 1000.0)
+
+    def report(self):
+        """
+        Get the startup timing breakdown.
+        :return: dict with the duration of all steps run on the main thread
+        and in the background and the time of all milestones, all in ms
+        """
+
+        with self.lock:
+            steps = dict(self.steps)
+            milestones = dict(self.milestones)
+
+        main = threading.main_thread().name
+        return {'main': {name: round(duration, 3)
+                         for name, (duration, thread) in steps.items()
+                         if thread == main},
+                'background': {name: round(duration, 3)
+                               for name, (duration, thread) in steps.items()
+                               if thread != main},
+                'milestones': {name: round(time, 3)
+                               for name, time in milestones.items()}}
+
+
+class LazyResource:
+
+    def __init__(self, name, loader, timer=None):
+        """
+        Lazy resource class. The resource is loaded once on first access,
+        from whichever thread gets there first.
+        :param name: string | name of the resource in the timing breakdown
+        :param loader: function without arguments returning the resource
+        :param timer: StartupTimer object or None
+        """
+
+        self.name = name
+        self.loader = loader
+        self.timer = timer
+
+        self.value = None
+        self.loaded = False
+        self.lock = threading.Lock()
+
+    def get(self):
+        """
+        Get the resource, load it if necessary.
+        """
+
+        # Fast path once loaded
+        if self.loaded:
+            return self.value
+
+        with self.lock:
+            if not self.loaded:
+                if self.timer is None:
+                    self.value = self.loader()
+                else:
+                    with self.timer.measure(self.name):
+                        self.value = self.loader()
+                self.loaded = True
+
+        return self.value
+
+
+def start_warm_up(tasks, timer=None):
+    """
+    Run initialization tasks on a background thread.
+    :param tasks: list of LazyResource objects or functions without arguments
+    :param timer: StartupTimer object or None, records the milestone
+    'warm_up_done'
+    :return: started Thread object
+    """
+
+    def run():
+        for task in tasks:
+            if isinstance(task, LazyResource):
+                task.get()
+            elif timer is not None:
+                with timer.measure(task.__name__):
+                    task()
+            else:
+                task()
+        if timer is not None:
+            timer.milestone('warm_up_done')
+
+    thread = threading.Thread(target=run, name='WarmUp', daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""
+Table-driven state machine. Every state has an enter, an event and a frame
+handler. The handlers of the current state are looked up once per
+transition, so dispatching events and frames is a plain function call.
+Transition hooks are called on every state change with the time spent in the
+previous state and the time taken by the enter handler, e.g. to collect
+per-state latencies.
+"""
+
+from time import perf_counter
+
+
+def _ignore(*args):
+    """
+    Default handler, does nothing.
+    """
+
+
+class StateMachine:
+
+    def __init__(self, states, initial, clock=perf_counter):
+        """
+        State machine class. All states are known up front, transitions to
+        other states raise a ValueError.
+        :param states: Enum class | states of the machine
+        :param initial: member of states | initial state, entered without
+        calling its enter handler
+        :param clock: function returning the current time in s
+        """
+
+        self.clock = clock
+
+        # Dispatch table: enter, event and frame handler of each state
+        self.handlers = {state: (_ignore, _ignore, _ignore)
+                         for state in states}
+
+        # Functions called on every transition with previous state, new
+        # state, time spent in previous state and duration of the enter
+        # handler in s
+        self.hooks = []
+
+        # Current state and time at which it was entered
+        self.state = initial
+        self.entered = clock()
+
+        # Handlers of the current state
+        _, self.event, self.frame = self.handlers[initial]
+
+    def set_handlers(self, state, enter=None, event=None, frame=None):
+        """
+        Register the handlers of a state. Handlers not given do nothing.
+        :param state: member of states
+        :param enter: function without arguments called when the state is
+        entered
+        :param event: function called with each event in this state
+        :param frame: function without arguments called once per frame in
+        this state
+        """
+
+        if state not in self.handlers:
+            raise ValueError('Unknown state: {!r}'.format(state))
+
+        self.handlers[state] = (enter or _ignore, event or _ignore,
+                                frame or _ignore)
+
+        # Refresh handlers of the current state
+        if state == self.state:
+            _, self.event, self.frame = self.handlers[state]
+
+    def add_hook(self, hook):
+        """
+        Register a transition hook.
+        :param hook: function (previous, state, dwell, enter_time)
+        """
+
+        self.hooks.append(hook)
+
+    def transition(self, state):
+        """
+        Enter a new state. The enter handler is called even if the state
+        doesn't change.
+        :param state: member of states
+        """
+
+        try:
+            enter, event, frame = self.handlers[state]
+        except KeyError:
+            raise ValueError('Unknown state: {!r}'.format(state)) from None
+
+        now = self.clock()
+        previous, dwell = self.state, now - self.entered
+
+        self.state, self.entered = state, now
+        self.event, self.frame = event, frame
+        enter()
+
+        if self.hooks:
+            enter_time = self.clock() - now
+            for hook in self.hooks:
+                hook(previous, state, dwell, enter_time)
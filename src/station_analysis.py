@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Offline analysis of the per-station trial results journals
+(corsi_trials.csv) written by the results writer. Journals are discovered
+below the given paths and parsed in a pool of processes with the reader of
+cohort_stats.py. The partial aggregates of all files are merged into the
+statistics of the whole cohort. Parsed files are cached by modification time
+and size, so re-runs only parse the files that changed.
+
+Usage:
+    python station_analysis.py lab1/ lab2/ --workers 4
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import pickle
+
+from cohort_stats import RESULTS_FILE, CohortStatistics, RunningStats, \
+    span_statistics
+
+# Cache of parsed result files in the current directory
+CACHE_FILE = '.corsi_analysis_cache.pickle'
+CACHE_VERSION = 2
+
+
+class StationResults(CohortStatistics):
+
+    def __init__(self, path=None):
+        """
+        Station results class. Aggregates the corsi spans of one or several
+        trial results journals, overall and per trial, together with the
+        statistics of each participant.
+        :param path: string | path of the journal file, None for results
+        that are only merged
+        """
+
+        super().__init__(path)
+
+    def reset(self):
+        """
+        Forget all rows read so far.
+        """
+
+        super().reset()
+        self.participants = 0
+        self.invalid_rows = 0
+
+        # Distribution of the mean and standard deviation of each
+        # participant
+        self.participant_means = RunningStats()
+        self.participant_stds = RunningStats()
+
+        # Rows whose stored mean or standard deviation differs from the
+        # one computed from the corsi spans so far
+        self.inconsistent_rows = 0
+
+        # Corsi spans of the participants not yet added to the statistics
+        self.participant_spans = {}
+
+    def add_row(self, row):
+        """
+        Add a row of the journal.
+        :param row: list of strings | values of the columns
+        """
+
+        record = dict(zip(self.columns, row))
+        try:
+            participant_id = int(record['participant_id'])
+            trial = int(record['trial'])
+            span = int(record['corsi_span'])
+            stored = (float(record['mean_corsi_span']),
+                      float(record['std_corsi_span']))
+        except (KeyError, ValueError):
+            self.invalid_rows += 1
+            return
+
+        self.add(trial, span)
+        spans = self.participant_spans.setdefault(participant_id, [])
+        spans.append(span)
+        if stored != span_statistics(spans):
+            self.inconsistent_rows += 1
+
+    def add_participants(self):
+        """
+        Add the statistics of the participants read so far. Trials of
+        concurrent sessions are interleaved in the journal, so participants
+        are only complete once the whole journal is read.
+        """
+
+        for spans in self.participant_spans.values():
+            mean, std = span_statistics(spans)
+            self.participant_means.add(mean)
+            self.participant_stds.add(std)
+        self.participants += len(self.participant_spans)
+        self.participant_spans = {}
+
+    def merge(self, other):
+        """
+        Add the results of another StationResults object.
+        """
+
+        super().merge(other)
+        self.participants += other.participants
+        self.invalid_rows += other.invalid_rows
+        self.inconsistent_rows += other.inconsistent_rows
+        self.participant_means.merge(other.participant_means)
+        self.participant_stds.merge(other.participant_stds)
+
+    def summary(self):
+        return {'participants': self.participants,
+                'invalid_rows': self.invalid_rows,
+                'inconsistent_rows': self.inconsistent_rows,
+                'spans': self.overall.summary(),
+                'by_trial': {trial: stats.summary() for trial, stats in
+                             sorted(self.by_condition.items())},
+                'participant_means': self.participant_means.summary(),
+                'participant_stds': self.participant_stds.summary()}
+
+
+def parse_file(path):
+    """
+    Parse a trial results journal.
+    :param path: string | path of the journal file
+    :return: StationResults object
+    """
+
+    results = StationResults(path)
+    results.update()
+    results.add_participants()
+    return results
+
+
+def discover(paths, name=RESULTS_FILE):
+    """
+    Find all result files below the given paths.
+    :param paths: list of strings | result files or directories to search
+    :param name: string | file name of the result files in directories
+    :return: sorted list of absolute paths
+    """
+
+    found = set()
+    for path in paths:
+        if os.path.isfile(path):
+            found.add(os.path.abspath(path))
+            continue
+
+        for directory, _, files in os.walk(path):
+            if name in files:
+                found.add(os.path.abspath(os.path.join(directory, name)))
+
+    return sorted(found)
+
+
+def load_cache(path):
+    """
+    Read the cache of parsed result files.
+    :param path: string | path of the cache file
+    :return: dict of (mtime, size, StationResults) by path of the result file
+    """
+
+    try:
+        with open(path, 'rb') as cache_file:
+            cache = pickle.load(cache_file)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return {}
+
+    if cache.get('version') != CACHE_VERSION:
+        return {}
+    return cache['files']
+
+
+def save_cache(path, files):
+    """
+    Write the cache of parsed result files.
+    :param path: string | path of the cache file
+    :param files: dict of (mtime, size, StationResults) by path
+    """
+
+    # Replace the cache atomically so an interrupted run leaves the old one
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as cache_file:
+        pickle.dump({'version': CACHE_VERSION, 'files': files}, cache_file,
+                    protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(temporary, path)
+
+
+def analyze(paths, workers=None, cache_path=CACHE_FILE):
+    """
+    Aggregate all result files below the given paths.
+    :param paths: list of strings | result files or directories to search
+    :param workers: int | number of processes, None for one per CPU
+    :param cache_path: string | path of the cache file, None to disable the
+    cache
+    :return: tuple of StationResults object with the merged results and
+    dict with the number of files, parsed files and results per file
+    """
+
+    files = discover(paths)
+    cache = load_cache(cache_path) if cache_path else {}
+
+    # Files are identified by path, modification time and size
+    keys = {}
+    for path in files:
+        stat = os.stat(path)
+        keys[path] = (stat.st_mtime_ns, stat.st_size)
+
+    changed = [path for path in files
+               if path not in cache or cache[path][:2] != keys[path]]
+    parsed = {}
+
+    if changed:
+        workers = min(workers or os.cpu_count() or 1, len(changed))
+        if workers > 1:
+            with multiprocessing.Pool(workers) as pool:
+                parsed = dict(zip(changed, pool.map(parse_file, changed)))
+        else:
+            parsed = {path: parse_file(path) for path in changed}
+
+    # Cache only the files found in this run
+    current = {path: keys[path] + (parsed[path],) if path in parsed
+               else cache[path] for path in files}
+    if cache_path and (parsed or len(current) != len(cache)):
+        save_cache(cache_path, current)
+
+    total = StationResults()
+    for path in files:
+        total.merge(current[path][2])
+
+    return total, {'files': len(files), 'parsed': len(parsed),
+                   'by_file': {path: current[path][2].participants
+                               for path in files}}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Aggregate the result files of all stations.')
+    parser.add_argument('paths', nargs='+',
+                        help='result files or directories to search for '
+                             '{} files'.format(RESULTS_FILE))
+    parser.add_argument('--workers', type=int, default=None,
+                        help='number of processes, default one per CPU')
+    parser.add_argument('--cache', default=CACHE_FILE,
+                        help='cache file of parsed results')
+    parser.add_argument('--no-cache', action='store_true',
+                        help='parse all files and leave the cache untouched')
+    args = parser.parse_args()
+
+    cohort, run = analyze(args.paths, args.workers,
+                          None if args.no_cache else args.cache)
+    print(json.dumps({'files': run['files'], 'parsed': run['parsed'],
+                      'results': cohort.summary()}, indent=2))
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Deadline-based stimulus schedule. The onsets of all stimuli of a sequence
+are planned up front. Each change is presented on the frame closest to its
+deadline and the time at which it actually reached the screen is recorded.
+If frames were missed for a whole stimulus, the remaining stimuli are shown
+later instead of being skipped.
+"""
+
+from frame_scheduler import percentile
+
+
+class StimulusSchedule:
+
+    def __init__(self, start, length, duration):
+        """
+        Stimulus schedule class. Stimulus i is shown from start + i * duration
+        until start + (i + 1) * duration.
+        :param start: float | planned onset of the first stimulus in s
+        :param length: int | number of stimuli
+        :param duration: float | presentation time of each stimulus in s
+        """
+
+        self.start = start
+        self.length = length
+        self.duration = duration
+
+        # Planned times of all changes: onsets of all stimuli followed by the
+        # offset of the last stimulus
+        self.deadlines = [start + i * duration for i in range(length + 1)]
+
+        # Times at which the changes were presented
+        self.achieved = [None] * (length + 1)
+
+        # Index of the change drawn but not yet presented
+        self.pending = None
+
+        # Number of changes drawn so far and delay of the remaining changes
+        # after missed frames in s
+        self.current = 0
+        self.delay = 0.0
+
+    def step(self, frame_time):
+        """
+        Number of changes that are due on a frame presented at the given
+        time. A change is due if its deadline is closer to this frame than to
+        the next one. At most one change is due per frame: if more changes
+        are overdue, e.g. after a stall, the next one is due now and all
+        later ones are delayed, so that every stimulus is shown for its full
+        duration.
+        :param frame_time: float | expected presentation time of the frame
+        :return: int | 0 before the first onset, i for stimulus i - 1 and
+        length + 1 after the offset of the last stimulus
+        """
+
+        start = self.start + self.delay
+        if frame_time < start:
+            return self.current
+
+        step = min(int((frame_time - start) / self.duration) + 1,
+                   self.length + 1)
+        if step > self.current + 1:
+            self.delay = frame_time - self.deadlines[self.current]
+            step = self.current + 1
+
+        return step
+
+    def next_deadline(self):
+        """
+        Time at which the next change is due, including the delay of the
+        remaining changes after missed frames.
+        :return: float | time in s, None after the last change
+        """
+
+        if self.current > self.length:
+            return None
+        return self.deadlines[self.current] + self.delay
+
+    def drawn(self, step):
+        """
+        Mark the change of the given step as drawn in the current frame.
+        :param step: int | number of changes that are due
+        """
+
+        self.pending = step - 1
+        self.current = step
+
+    def presented(self, time):
+        """
+        Record the presentation time of the change drawn in the last frame.
+        :param time: float | time at which the frame reached the screen
+        """
+
+        if self.pending is not None:
+            self.achieved[self.pending] = time
+            self.pending = None
+
+    def errors(self):
+        """
+        Differences between achieved and planned times of all presented
+        changes. Changes delayed after missed frames count with their full
+        delay.
+        :return: list of timing errors in ms
+        """
+
+        return [(achieved - planned) * 1000.0
+                for planned, achieved in zip(self.deadlines, self.achieved)
+                if achieved is not None]
+
+
+def jitter_report(errors):
+    """
+    Summarize timing errors of stimulus changes.
+    :param errors: list of timing errors in ms
+    :return: dict with number of changes and mean, p95 and max absolute
+    timing error in ms
+    """
+
+    errors = [abs(error) for error in errors]
+    return {'changes': len(errors),
+            'mean': round(sum(errors) / len(errors), 3) if errors else 0.0,
+            'p95': round(percentile(errors, 95), 3),
+            'max': round(max(errors), 3) if errors else 0.0}
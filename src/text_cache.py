@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""
+Least-recently-used cache of rendered text surfaces. Rendering text is
+expensive compared to blitting, and most messages of the application stay
+the same for many frames.
+"""
+
+import threading
+from collections import OrderedDict
+
+
+class TextCache:
+
+    def __init__(self, max_size=64, antialias=True):
+        """
+        Text cache class. Stores rendered text surfaces keyed by text, font,
+        color and background color.
+        :param max_size: int | maximum number of cached surfaces
+        :param antialias: bool | render text with antialiasing
+        """
+
+        self.max_size = max_size
+        self.antialias = antialias
+
+        # Cached surfaces, least recently used first
+        self.surfaces = OrderedDict()
+
+        # Counters for cache performance
+        self.hits = 0
+        self.misses = 0
+
+        # Messages may be pre-rendered by a warm-up thread
+        self.lock = threading.RLock()
+
+    def render(self, text, font, color, bgcolor=None):
+        """
+        Get rendered text surface. Text is only rendered if it is not cached.
+        :param text: string to be rendered
+        :param font: PyGame font object
+        :param color: text color | RGB tuple
+        :param bgcolor: background_color | RGB tuple or None for transparent
+        :return: PyGame surface object
+        """
+
+        key = (text, font, color, bgcolor)
+
+        with self.lock:
+            surface = self.surfaces.get(key)
+
+            if surface is not None:
+                # Mark surface as most recently used
+                self.surfaces.move_to_end(key)
+                self.hits += 1
+                return surface
+
+            self.misses += 1
+            surface = font.render(text, self.antialias, color, bgcolor)
+            self.surfaces[key] = surface
+
+            # Evict least recently used surface if cache is full
+            if len(self.surfaces) > self.max_size:
+                self.surfaces.popitem(last=False)
+
+        return surface
+
+    def clear(self):
+        """
+        Remove all cached surfaces and reset the counters.
+        """
+
+        with self.lock:
+            self.surfaces.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Get cache statistics.
+        :return: dict with size, hits, misses and hit rate
+        """
+
+        lookups = self.hits + self.misses
+        return {'size': len(self.surfaces), 'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0}
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the simulated sessions.
+"""
+
+import os
+import subprocess
+import sys
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                       os.pardir, 'src')
+
+# Sessions run by the pool of workers
+RUN_SESSIONS = '''
+import simulation
+results = simulation.run_sessions(8, workers=2)
+assert len(results) == 8, len(results)
+'''
+
+
+def test_run_sessions_with_workers_exits():
+    """
+    The pool of workers shuts down once all sessions are done.
+    """
+
+    # A subprocess keeps a hanging pool from blocking the test run
+    subprocess.run([sys.executable, '-c', RUN_SESSIONS], cwd=SRC_DIR,
+                   check=True, timeout=60)